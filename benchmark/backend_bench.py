@@ -0,0 +1,42 @@
+"""
+Compare the iproute2 and rtnetlink backends on dummy interfaces.
+
+usage: python -m benchmark.backend_bench [--count N] [--type dummy]
+"""
+import argparse
+
+from benchmark.common import measure, report, run_in_netns
+from ifmanage.backend import get_backend
+
+
+def bench(backend, kind: str, count: int):
+    names = [f'bench{i}' for i in range(count)]
+    results = {
+        'create': measure(lambda i: backend.create(names[i], kind), count),
+        'set_mtu': measure(lambda i: backend.set_mtu(names[i], 1400), count),
+        'set_state': measure(lambda i: backend.set_state(names[i], True), count),
+        'set_mac': measure(lambda i: backend.set_mac(names[i], '02:00:00:00:%02x:%02x' % divmod(i, 256)), count),
+        'set_alias': measure(lambda i: backend.set_alias(names[i], f'bench {i}'), count),
+        'add_addr': measure(lambda i: backend.add_addr(names[i], '10.%d.%d.1/24' % divmod(i, 256)), count),
+        'del_addr': measure(lambda i: backend.del_addr(names[i], '10.%d.%d.1/24' % divmod(i, 256)), count),
+        'delete': measure(lambda i: backend.delete(names[i]), count),
+    }
+    for op, result in results.items():
+        report(f'{backend.name}.{op}', result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--type', default='dummy', help='link type to create')
+    args = parser.parse_args()
+
+    if run_in_netns('benchmark.backend_bench'):
+        return
+
+    for name in ['command', 'netlink']:
+        bench(get_backend(name), args.type, args.count)
+
+
+if __name__ == '__main__':
+    main()
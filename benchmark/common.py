@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import time
+
+
+def measure(func, count: int) -> dict:
+    """
+    Call func(i) count times and return throughput and latency figures.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "count": count,
+        "ops_per_sec": count / total if total else float('inf'),
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6,
+    }
+
+
+def report(name: str, result: dict):
+    print(f'{name:<40} {result["ops_per_sec"]:>12.1f} ops/s  '
+          f'p50 {result["p50_us"]:>10.1f} us  p99 {result["p99_us"]:>10.1f} us')
+
+
+def run_in_netns(module: str, netns='ifmanage-bench'):
+    """
+    Re-run a benchmark module inside a scratch network namespace so it
+    can create and destroy interfaces without touching the host. Returns
+    False if we already are inside it.
+    """
+    if os.environ.get('IFMANAGE_BENCH_NETNS'):
+        return False
+
+    subprocess.run(['ip', 'netns', 'add', netns], check=True)
+    try:
+        env = dict(os.environ, IFMANAGE_BENCH_NETNS=netns)
+        subprocess.run(['ip', 'netns', 'exec', netns, sys.executable, '-m', module] + sys.argv[1:],
+                       env=env, check=True)
+    finally:
+        subprocess.run(['ip', 'netns', 'del', netns])
+    return True
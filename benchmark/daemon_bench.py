@@ -0,0 +1,56 @@
+"""
+Per-call latency through ifmanaged against doing the same work in
+process, and the whole cost of a hook that is a fresh process asking one
+question directly or through the daemon. The daemon runs in a thread of
+this process.
+
+usage: python -m benchmark.daemon_bench [--count N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from benchmark.common import measure, report
+from ifmanage.client import Client, Interface as RemoteInterface
+from ifmanage.daemon import Server
+from ifmanage.interface import Interface
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='ifmanaged-'), 'ifmanaged.sock')
+    server = Server(path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Client(path)
+    try:
+        local = Interface('lo')
+        remote = RemoteInterface('lo', client=client)
+        report('in process exist()', measure(lambda i: local.exist(), args.count))
+        report('ifmanaged exist()', measure(lambda i: remote.exist(), args.count))
+        report('ifmanaged get_link()', measure(lambda i: remote.get_link(), args.count))
+
+        def hook(code):
+            subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                           env=dict(os.environ, IFMANAGED_SOCKET=path))
+        count = max(args.count // 50, 1)
+        report('fresh process, in process exist()',
+               measure(lambda i: hook('from ifmanage.interface import Interface; Interface("lo").exist()'), count))
+        report('fresh process, ifmanaged exist()',
+               measure(lambda i: hook('from ifmanage.client import Interface; Interface("lo").exist()'), count))
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
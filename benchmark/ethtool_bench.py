@@ -0,0 +1,47 @@
+"""
+In-process ethtool requests on veth ports in a scratch network namespace.
+Forking a do-nothing process is measured as the floor of running the
+ethtool binary once per setting.
+
+usage: python -m benchmark.ethtool_bench [--count N] [--ports N]
+"""
+import argparse
+
+from benchmark.common import measure, report, run_in_netns
+from ifmanage.ethernet import Ethernet
+from ifmanage.interface import Interface
+from util.command import popen
+from util.ethtool import get_ethtool
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--ports', type=int, default=48)
+    args = parser.parse_args()
+
+    if run_in_netns('benchmark.ethtool_bench'):
+        return
+
+    names = [f'eth{i}' for i in range(args.ports)]
+    Interface.create_many([Interface(name, backend='netlink', type='veth') for name in names])
+    try:
+        ethtool = get_ethtool()
+        report('fork /bin/true', measure(lambda i: popen(['/bin/true']), args.count // 10))
+        report('ioctl get_link_settings', measure(lambda i: ethtool.get_link_settings('eth0'), args.count))
+        report('ioctl get_offload', measure(lambda i: ethtool.get_offload('eth0', 'gro'), args.count))
+        report('ioctl set_offload', measure(lambda i: ethtool.set_offload('eth0', 'gro', i % 2), args.count))
+
+        config = {'offload': {'gro': True, 'gso': True, 'tso': True}, 'channels': {'rx': 1, 'tx': 1}}
+        ports = [Ethernet(name, **config) for name in names]
+        for port in ports:
+            port.update_ethtool()
+        # converged, every run reads and skips all settings
+        report(f'update_ethtool {args.ports} ports unchanged',
+               measure(lambda i: [port.update_ethtool() for port in ports], args.count // 20))
+    finally:
+        Interface.remove_many(names)
+
+
+if __name__ == '__main__':
+    main()
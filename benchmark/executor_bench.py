@@ -0,0 +1,41 @@
+"""
+Run a slow per-interface operation, standing in for a DHCP client restart,
+on many interfaces one after the other and through the Executor.
+
+usage: python -m benchmark.executor_bench [--interfaces 100] [--delay 0.05] [--workers 100]
+"""
+import argparse
+import time
+
+from ifmanage.executor import run
+from ifmanage.interface import Interface
+from util.command import cmd
+
+
+def restart(interface: Interface, delay: float):
+    cmd(f'sleep {delay}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--interfaces', type=int, default=100)
+    parser.add_argument('--delay', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=100)
+    args = parser.parse_args()
+
+    interfaces = [Interface(f'bench{i}') for i in range(args.interfaces)]
+
+    start = time.perf_counter()
+    for interface in interfaces:
+        restart(interface, args.delay)
+    print(f'{"sequential":<40} {time.perf_counter() - start:>8.3f} s')
+
+    start = time.perf_counter()
+    results = run(interfaces, restart, args.delay, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f'{f"executor, {args.workers} workers":<40} {elapsed:>8.3f} s  '
+          f'({sum(r.ok for r in results)}/{len(results)} ok)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Interfaces per second created and removed one at a time (the old remove():
+stop both DHCP clients, flush, delete) against create_many/remove_many, on
+dummy or veth interfaces in a scratch network namespace.
+
+usage: python -m benchmark.lifecycle_bench [--count N] [--type dummy] [--backend netlink]
+"""
+import argparse
+import time
+
+from benchmark.common import run_in_netns
+from ifmanage.interface import Interface
+
+
+def remove_one_by_one(interface: Interface):
+    interface.set_dhcp(False)
+    interface.set_dhcpv6(False)
+    interface.backend.flush_addrs(interface.ifname)
+    interface.delete()
+
+
+def timed(name: str, count: int, func):
+    start = time.perf_counter()
+    func()
+    total = time.perf_counter() - start
+    print(f'{name:<40} {count / total:>12.1f} interfaces/s  ({total:.3f} s)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--type', default='dummy', help='link type to create')
+    parser.add_argument('--backend', default='netlink')
+    args = parser.parse_args()
+
+    if run_in_netns('benchmark.lifecycle_bench'):
+        return
+
+    interfaces = [Interface(f'bench{i}', backend=args.backend, type=args.type) for i in range(args.count)]
+    prefix = f'{args.backend}.{args.type}'
+
+    def create_loop():
+        for interface in interfaces:
+            interface.create()
+
+    def remove_loop():
+        for interface in interfaces:
+            remove_one_by_one(interface)
+
+    timed(f'{prefix}.create', args.count, create_loop)
+    timed(f'{prefix}.remove', args.count, remove_loop)
+    timed(f'{prefix}.create_many', args.count, lambda: Interface.create_many(interfaces))
+    timed(f'{prefix}.remove_many', args.count, lambda: Interface.remove_many(interfaces))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Provision saved networks against a stand-in wpa_supplicant, one blocking
+round trip per command as add_profile used to do against the pipelined
+add_profiles.
+
+usage: python -m benchmark.profile_bench [--profiles 200] [--count N]
+"""
+import argparse
+import multiprocessing
+import shutil
+import time
+
+from benchmark.common import measure, report
+from ifmanage.scantable import WPA2_PSK, Profile
+from ifmanage.wifi import WiFi, network_settings
+from test.wpa_fake import FakeWpaSupplicant
+
+
+def sequential_add(wifi: WiFi, profiles: list):
+    for profile in profiles:
+        nid = wifi._send_cmd('ADD_NETWORK', True).strip()
+        for key, value in network_settings(profile).items():
+            wifi._send_cmd(f'SET_NETWORK {nid} {key} {value}')
+    wifi._send_cmd('SAVE_CONFIG')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', type=int, default=200)
+    parser.add_argument('--count', type=int, default=20)
+    args = parser.parse_args()
+
+    profiles = []
+    for i in range(args.profiles):
+        profile = Profile(ssid=f'net-{i}', akm=[WPA2_PSK])
+        profile.password = f'password-{i}'
+        profiles.append(profile)
+
+    # the stand-in runs in its own process like wpa_supplicant does, so
+    # round trips are not hidden behind the GIL
+    fake = FakeWpaSupplicant()
+    server = multiprocessing.get_context('fork').Process(target=serve, args=(fake,), daemon=True)
+    server.start()
+    try:
+        for _ in range(50):
+            try:
+                wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+                break
+            except ConnectionError:
+                time.sleep(0.05)
+
+        def fresh(func):
+            def run(i):
+                wifi.sync_profiles([], save=False)
+                func()
+            return run
+
+        report(f'{args.profiles} profiles, sequential',
+               measure(fresh(lambda: sequential_add(wifi, profiles)), args.count))
+        report(f'{args.profiles} profiles, add_profiles',
+               measure(fresh(lambda: wifi.add_profiles(profiles)), args.count))
+        wifi.sync_profiles(profiles)
+        report(f'{args.profiles} profiles, sync unchanged', measure(lambda i: wifi.sync_profiles(profiles), args.count))
+    finally:
+        server.terminate()
+        shutil.rmtree(fake.ctrl_dir, ignore_errors=True)
+
+
+def serve(fake: FakeWpaSupplicant):
+    fake.start()
+    fake._thread.join()
+
+
+if __name__ == '__main__':
+    main()
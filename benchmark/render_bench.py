@@ -0,0 +1,54 @@
+"""
+Re-rendering the DHCP client config of many interfaces when nothing
+changed, as a periodic reconcile does: the old unconditional rewrite
+against render() comparing content digests.
+
+usage: python -m benchmark.render_bench [--interfaces N] [--rounds N]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from util.template import render, render_to_string
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template')
+TEMPLATE = 'dhcp-client/daemon-options.j2'
+
+
+def legacy_render(destination, template, content):
+    rendered = render_to_string(template, content, location=TEMPLATE_DIR)
+    with open(destination, 'w') as f:
+        f.write(rendered)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--interfaces', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='ifmanage-render-')
+    try:
+        contents = [(os.path.join(folder, f'dhcp-client_eth{i}.options'),
+                     {'ifname': f'eth{i}', 'dhcp_options': {'default_route_distance': 210}})
+                    for i in range(args.interfaces)]
+
+        for name, func in (('unconditional write (before)', lambda d, c: legacy_render(d, TEMPLATE, c) or True),
+                           ('render, skip unchanged', lambda d, c: render(d, TEMPLATE, c, location=TEMPLATE_DIR))):
+            for destination, content in contents:
+                func(destination, content)
+            written = 0
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                written += sum(bool(func(d, c)) for d, c in contents)
+            elapsed = (time.perf_counter() - start) / args.rounds
+            print(f'{name:<40} {elapsed * 1e3:>8.2f} ms per pass over {args.interfaces} files, '
+                  f'{written / args.rounds:.0f} written')
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Time to push a table of static routes: every route sent one request at a
+time, every route sent in one batch, and RouteTable applying only the
+difference after 1% of the routes changed. Runs in a scratch network
+namespace on a veth pair.
+
+usage: python -m benchmark.route_bench [--count N] [--backend netlink]
+"""
+import argparse
+import time
+
+from benchmark.common import run_in_netns
+from ifmanage.backend import get_backend
+from ifmanage.route import RouteTable, route
+from util.command import cmd
+
+IFNAME = 'bench0'
+TABLE = 100
+
+
+def timed(name: str, count: int, func):
+    start = time.perf_counter()
+    ops = func()
+    total = time.perf_counter() - start
+    print(f'{name:<40} {count / total:>12.1f} routes/s  ({total:.3f} s, {len(ops)} ops)')
+
+
+def routes(count: int, gateway: str) -> list:
+    # /28s out of 10.64.0.0/10, next hop on the veth subnet
+    return [route(f'10.{64 + (i >> 12 & 0x3f)}.{i >> 4 & 0xff}.{(i & 0xf) << 4}/28', gateway, IFNAME, 0, TABLE)
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--backend', default='netlink')
+    args = parser.parse_args()
+
+    if run_in_netns('benchmark.route_bench'):
+        return
+
+    cmd(f'ip link add dev {IFNAME} type veth peer name {IFNAME}p')
+    cmd(f'ip link set dev {IFNAME} up')
+    cmd(f'ip addr add 10.0.0.1/16 dev {IFNAME}')
+
+    backend = get_backend(args.backend)
+    full = routes(args.count, '10.0.0.2')
+    changed = list(full)
+    # 1% new next hops, 1% gone, 1% new prefixes
+    step = 100
+    for i in range(0, args.count, step):
+        changed[i] = changed[i]._replace(gateway='10.0.0.3')
+    del changed[1::step]
+    changed += routes(args.count + args.count // step, '10.0.0.2')[args.count:]
+
+    def replaces(table):
+        return [('replace_route', r.ifname, (r.dst, r.gateway, r.metric, r.table, r.protocol)) for r in table]
+
+    def one_by_one():
+        for op in replaces(full):
+            backend.run(op[0], op[1], *op[2])
+        return full
+
+    def flush():
+        cmd(f'ip route flush table {TABLE}')
+
+    prefix = f'{args.backend}'
+    timed(f'{prefix}.push.one_by_one', args.count, one_by_one)
+    flush()
+    timed(f'{prefix}.push.batch', args.count, lambda: backend.run_batch(replaces(full)))
+    timed(f'{prefix}.push.batch_again', args.count, lambda: backend.run_batch(replaces(full)))
+    timed(f'{prefix}.update.batch_all', args.count, lambda: backend.run_batch(replaces(changed)))
+    flush()
+
+    timed(f'{prefix}.routetable.initial', args.count, lambda: RouteTable(backend, TABLE).apply(full))
+    timed(f'{prefix}.routetable.converged', args.count, lambda: RouteTable(backend, TABLE).apply(full))
+    table = RouteTable(backend, TABLE)
+    table.refresh()
+    timed(f'{prefix}.routetable.update', args.count, lambda: table.apply(changed))
+    timed(f'{prefix}.routetable.update_cached', args.count, lambda: table.apply(full))
+    timed(f'{prefix}.routetable.dump', args.count, lambda: backend.dump_routes())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Parse synthetic SCAN_RESULTS replies with the old decode/split parser and
+the current byte based one, and time a full scan against a stand-in
+wpa_supplicant, both with SCAN_RESULTS and incrementally with BSS RANGE=.
+
+usage: python -m benchmark.scan_bench [--bss 500] [--count N]
+"""
+import argparse
+
+from benchmark.common import measure, report
+from ifmanage.scantable import ScanTable
+from ifmanage.wifi import Profile, WiFi, iter_scan_results, parse_scan_results
+from util.wpactrl import WpaCtrlPool
+from test.wpa_fake import FakeWpaSupplicant, make_bss
+
+
+def legacy_parse_scan_results(reply: str) -> list:
+    profiles = {}
+    for line in reply[:-1].split('\n')[1:]:
+        values = line.split('\t')
+        ssid = values[4]
+        freq = []
+        if 2412 <= int(values[1]) <= 2484:
+            freq.append("2.4GHz")
+        elif 4915 <= int(values[1]) <= 5825:
+            freq.append("5GHz")
+        akm = [a for a in ('WPA-PSK', 'WPA2-PSK', 'WPA-EAP', 'WPA2-EAP') if a in values[3]]
+        p = profiles.get(ssid)
+        if p:
+            profiles[ssid] = Profile(ssid=ssid, frequency=freq + p.frequency, akm=akm + p.akm,
+                                     RSSI=max(p.RSSI, int(values[2])))
+        else:
+            profiles[ssid] = Profile(ssid=ssid, frequency=freq, akm=akm, RSSI=int(values[2]))
+    return list(profiles.values())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bss', type=int, default=500)
+    parser.add_argument('--count', type=int, default=500)
+    args = parser.parse_args()
+
+    with FakeWpaSupplicant(bss=make_bss(args.bss), scan_delay=0) as fake:
+        wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+        reply = wifi._send_cmd('SCAN_RESULTS')
+        print(f'{args.bss} BSS, {len(reply)} bytes per reply')
+
+        report('iter_scan_results', measure(lambda i: list(iter_scan_results(reply)), args.count))
+        report('legacy decode/split parse', measure(lambda i: legacy_parse_scan_results(reply.decode()), args.count))
+        report('parse_scan_results', measure(lambda i: parse_scan_results(reply), args.count))
+        report('SCAN_RESULTS round trip', measure(lambda i: wifi._send_cmd('SCAN_RESULTS'), args.count))
+        report('WiFi() with a pooled connection', measure(lambda i: WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir),
+                                                          args.count))
+        report('new connection + PING', measure(lambda i: WpaCtrlPool().get(fake.ifname, fake.ctrl_dir).close(),
+                                                args.count))
+        report('scan_table, no trigger', measure(lambda i: ScanTable.from_reply(wifi._send_cmd('SCAN_RESULTS')),
+                                                 args.count))
+
+        wifi.scan_update(trigger=False)
+        report('scan_update, nothing changed', measure(lambda i: wifi.scan_update(trigger=False), args.count))
+
+        def touch(i):
+            # a tenth of the BSSes report a new signal level each round
+            for b in fake.bss[i % 10::10]:
+                b['level'] -= 1
+                b['update_idx'] += 1
+            wifi.scan_update(trigger=False)
+        report('scan_update, 10% changed', measure(touch, args.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Cost of querying and restarting DHCP client units: forking systemctl per
+call against DBusManager on a persistent connection, with its ActiveState
+cache and batched jobs. D-Bus figures are measured against the stand-in
+systemd of the tests on a private dbus-daemon.
+
+Jobs of the stand-in finish after --job-delay seconds, standing in for the
+time a unit takes to restart.
+
+usage: python -m benchmark.service_bench [--count N] [--units N] [--job-delay S]
+"""
+import argparse
+
+from benchmark.common import measure, report
+from ifmanage.service import DBusManager
+from test.systemd_fake import FakeSystemd
+from util.command import popen
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--units', type=int, default=50)
+    parser.add_argument('--job-delay', type=float, default=0.01)
+    args = parser.parse_args()
+
+    units = [f'dhcp-client@eth{i}.service' for i in range(args.units)]
+
+    # without a running systemd this fails right after exec, a lower bound
+    report('systemctl show (fork)', measure(lambda i: popen(['systemctl', 'show', '-p', 'ActiveState', units[0]]),
+                                            args.count))
+
+    with FakeSystemd(dict.fromkeys(units, 'inactive'), job_delay=args.job_delay) as systemd:
+        manager = DBusManager(systemd.address)
+        manager.connect()
+
+        def uncached(i):
+            manager._states.clear()
+            manager.active_state(units[i % len(units)])
+        report('dbus active_state, uncached', measure(uncached, args.count))
+        report('dbus active_state, cached', measure(lambda i: manager.active_state(units[0]), args.count * 100))
+
+        count = max(args.count // 20, 1)
+        report(f'dbus restart x{len(units)}, one by one',
+               measure(lambda i: [manager.restart(unit) for unit in units], count))
+        report(f'dbus restart x{len(units)}, run_jobs',
+               measure(lambda i: manager.run_jobs([('restart', unit) for unit in units]), count))
+        manager.close()
+
+
+if __name__ == '__main__':
+    main()
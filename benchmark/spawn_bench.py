@@ -0,0 +1,47 @@
+"""
+Spawn latency of util.command: the old behaviour of going through /bin/sh
+for any command with a space, the direct argv path, the process group
+variant used with timeouts and async_cmd, and what tracing costs.
+
+usage: python -m benchmark.spawn_bench [--count N]
+"""
+import argparse
+import asyncio
+import subprocess
+
+from benchmark.common import measure, report
+from util import trace
+from util.command import async_cmd, cmd
+
+
+def legacy_cmd(command: str) -> str:
+    p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=' ' in command)
+    return p.communicate()[0].decode().strip()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=500)
+    args = parser.parse_args()
+
+    command = 'ip -V'
+    report('shell (before)', measure(lambda i: legacy_cmd(command), args.count))
+    report('argv, no shell', measure(lambda i: cmd(command), args.count))
+    report('argv, process group + timeout', measure(lambda i: cmd(command, timeout=10), args.count))
+
+    with trace.Tracer():
+        report('argv, traced', measure(lambda i: cmd(command), args.count))
+    report('trace check, disabled', measure(lambda i: trace.tracers and None, args.count * 100))
+    with trace.Tracer():
+        report('trace.emit', measure(lambda i: trace.emit(command, 0.0, 0, b'', b''), args.count * 100))
+
+    async def sequential(count):
+        for _ in range(count):
+            await async_cmd(command)
+    loop = asyncio.new_event_loop()
+    report('async_cmd', measure(lambda i: loop.run_until_complete(sequential(1)), args.count))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Process start to answer for a read-only question, as asked by a udev hook
+running a fresh interpreter per event: through ifmanage.interface against
+the ifmanage.query entry point.
+
+usage: python -m benchmark.startup_bench [--count N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from benchmark.common import measure, report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=50)
+    args = parser.parse_args()
+
+    def run(argv):
+        subprocess.run([sys.executable] + argv, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+    report('python startup', measure(lambda i: run(['-c', 'pass']), args.count))
+    report('Interface.exist()', measure(lambda i: run(['-c', 'from ifmanage.interface import Interface; '
+                                                            'Interface("lo").exist()']), args.count))
+    report('python -m ifmanage.query exists', measure(lambda i: run(['-m', 'ifmanage.query', 'exists', 'lo']),
+                                                      args.count))
+    report('python -m ifmanage.query show', measure(lambda i: run(['-m', 'ifmanage.query', 'show', 'lo']),
+                                                    args.count))
+
+
+if __name__ == '__main__':
+    main()
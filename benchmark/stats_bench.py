@@ -0,0 +1,43 @@
+"""
+Cost of sampling the counters of many interfaces, created as veth pairs
+in a scratch network namespace. CPU is process time per sample, at one
+sample per second it is the share of one core used.
+
+usage: python -m benchmark.stats_bench [--count N] [--samples N]
+"""
+import argparse
+import time
+
+from benchmark.common import measure, report, run_in_netns
+from ifmanage.interface import Interface
+from ifmanage.stats import StatsSampler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000, help='interfaces, half of them veth peers')
+    parser.add_argument('--samples', type=int, default=20)
+    args = parser.parse_args()
+
+    if run_in_netns('benchmark.stats_bench'):
+        return
+
+    pairs = [Interface(f'bench{i}', backend='netlink', type='veth') for i in range(args.count // 2)]
+    Interface.create_many(pairs)
+    try:
+        for source in ['netlink', 'sysfs']:
+            sampler = StatsSampler(size=60, source=source)
+            sampler.sample()
+            cpu = time.process_time()
+            result = measure(lambda i: sampler.sample(), args.samples)
+            cpu = (time.process_time() - cpu) / args.samples
+            report(f'{source}.sample', result)
+            print(f'{source}.sample cpu at 1 Hz: {cpu * 100:.1f}% of a core, {sampler.counts[0]} interfaces')
+            report(f'{source}.rates', measure(lambda i: sampler.rates('rx_bytes'), args.samples))
+            report(f'{source}.error_rates', measure(lambda i: sampler.error_rates(), args.samples))
+    finally:
+        Interface.remove_many(pairs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Benchmark suite tracking throughput and latency of the main paths. Cases
+run against the simulated ip/systemctl (test.fake_commands) and
+wpa_supplicant (test.wpa_fake), so results depend on the machine only.
+Cases marked netns change real dummy interfaces and only run with --netns,
+inside a scratch network namespace (needs root).
+
+Results can be saved as JSON and compared with an earlier run, the exit
+status is 1 if any case got slower than --threshold percent.
+
+usage: python -m benchmark [--filter TEXT] [--count N] [--json FILE] [--compare FILE] [--threshold PCT] [--netns]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmark.common import measure, report, run_in_netns
+
+CASES = []
+
+
+def case(name: str, netns=False):
+    """
+    Register func(count) -> measure() result as a suite case.
+    """
+    def register(func):
+        CASES.append((name, func, netns))
+        return func
+    return register
+
+
+@case('command.set_mtu')
+def command_set_mtu(count: int) -> dict:
+    from ifmanage.backend import CommandBackend
+    from test.fake_commands import FakeCommands
+
+    with FakeCommands() as fake:
+        fake.add_link('eth0')
+        backend = CommandBackend()
+        return measure(lambda i: backend.set_mtu('eth0', 1400 + i % 100), count)
+
+
+@case('command.batch_100')
+def command_batch(count: int) -> dict:
+    from ifmanage.backend import CommandBackend
+    from ifmanage.batch import Batch
+    from test.fake_commands import FakeCommands
+
+    with FakeCommands() as fake:
+        names = [fake.add_link(f'eth{i}')['ifname'] for i in range(100)]
+        backend = CommandBackend()
+
+        def apply(i):
+            batch = Batch(backend)
+            for name in names:
+                batch.set_mtu(name, 1400 + i % 100)
+            batch.apply()
+        return measure(apply, max(count // 10, 1))
+
+
+@case('command.linktable_1000')
+def command_linktable(count: int) -> dict:
+    from ifmanage.backend import CommandBackend
+    from ifmanage.linktable import LinkTable
+    from test.fake_commands import FakeCommands
+
+    with FakeCommands() as fake:
+        for i in range(1000):
+            fake.add_link(f'eth{i}')
+        table = LinkTable(CommandBackend())
+        return measure(lambda i: table.refresh(), max(count // 10, 1))
+
+
+@case('service.systemctl_jobs_50')
+def service_systemctl(count: int) -> dict:
+    from ifmanage.service import SystemctlManager
+    from test.fake_commands import FakeCommands
+
+    units = [f'dhcp-client@eth{i}.service' for i in range(50)]
+    with FakeCommands():
+        manager = SystemctlManager()
+        return measure(lambda i: manager.run_jobs([('restart', unit) for unit in units]), count)
+
+
+@case('template.render_unchanged')
+def template_render(count: int) -> dict:
+    from util.template import render
+
+    folder = tempfile.mkdtemp(prefix='ifmanage-bench-')
+    try:
+        path = os.path.join(folder, 'dhcp-client_eth0.conf')
+        content = {'ifname': 'eth0', 'dhcp_options': {'host_name': 'router'}}
+        render(path, 'dhcp-client/ipv4.j2', content)
+        return measure(lambda i: render(path, 'dhcp-client/ipv4.j2', content), count)
+    finally:
+        shutil.rmtree(folder)
+
+
+@case('scantable.from_reply_2000')
+def scantable_parse(count: int) -> dict:
+    from ifmanage.scantable import ScanTable
+    from test.wpa_fake import make_bss
+
+    lines = ['bssid / frequency / signal level / flags / ssid']
+    lines.extend(f'{b["bssid"]}\t{b["freq"]}\t{b["level"]}\t{b["flags"]}\t{b["ssid"]}' for b in make_bss(2000))
+    reply = ('\n'.join(lines) + '\n').encode()
+    return measure(lambda i: ScanTable.from_reply(reply), max(count // 10, 1))
+
+
+@case('wifi.scan_update_2000')
+def wifi_scan_update(count: int) -> dict:
+    from ifmanage.wifi import WiFi
+    from test.wpa_fake import FakeWpaSupplicant, make_bss
+
+    with FakeWpaSupplicant(bss=make_bss(2000)) as fake:
+        wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+        wifi.scan_update(trigger=False)
+        return measure(lambda i: wifi.scan_update(trigger=False), max(count // 10, 1))
+
+
+@case('wifi.list_network_500')
+def wifi_list_network(count: int) -> dict:
+    from ifmanage.wifi import WiFi
+    from test.wpa_fake import FakeWpaSupplicant, make_networks
+
+    with FakeWpaSupplicant(networks=make_networks(500)) as fake:
+        wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+        return measure(lambda i: wifi.list_network(), count)
+
+
+@case('netlink.set_mtu', netns=True)
+def netlink_set_mtu(count: int) -> dict:
+    from ifmanage.backend import get_backend
+
+    backend = get_backend('netlink')
+    backend.create('bench0', 'dummy')
+    try:
+        return measure(lambda i: backend.set_mtu('bench0', 1400 + i % 100), count)
+    finally:
+        backend.delete('bench0')
+
+
+@case('reconcile.dummy_100', netns=True)
+def reconcile_dummies(count: int) -> dict:
+    from ifmanage.backend import get_backend
+    from ifmanage.interface import Interface
+    from ifmanage.reconcile import reconcile
+
+    backend = get_backend('netlink')
+    names = [f'bench{i}' for i in range(100)]
+    for name in names:
+        backend.create(name, 'dummy')
+    try:
+        interfaces = [Interface(name, backend='netlink', mtu='1400', address=[f'10.0.{i}.1/24'])
+                      for i, name in enumerate(names)]
+        reconcile(interfaces, backend='netlink')
+        # converged, every further run only reads state
+        return measure(lambda i: reconcile(interfaces, backend='netlink'), max(count // 10, 1))
+    finally:
+        for name in names:
+            backend.delete(name)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Print the change in throughput against baseline and return the names
+    of cases more than threshold percent slower.
+    """
+    slower = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = (result['ops_per_sec'] / old['ops_per_sec'] - 1) * 100
+        flag = ''
+        if change < -threshold:
+            slower.append(name)
+            flag = '  SLOWER'
+        print(f'{name:<40} {change:>+8.1f}%{flag}')
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark')
+    parser.add_argument('--filter', default='', help='only run cases with this text in their name')
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=20.0)
+    parser.add_argument('--netns', action='store_true', help='also run the cases changing dummy interfaces')
+    args = parser.parse_args()
+
+    if args.netns and run_in_netns('benchmark'):
+        return 0
+    in_netns = bool(os.environ.get('IFMANAGE_BENCH_NETNS'))
+
+    results = {}
+    for name, func, netns in CASES:
+        if args.filter not in name or (netns and not in_netns):
+            continue
+        results[name] = func(args.count)
+        report(name, results[name])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Cold start cost of rendering a DHCP client config in a fresh process, the
+way a udev hook runs ifmanage: templates parsed from source against the
+precompiled bundle written by compile_templates().
+
+usage: python -m benchmark.template_bench [--count N]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmark.common import measure, report
+from util import template
+from util.template import TEMPLATE_DIR, compile_templates
+
+RENDER = """
+from util import template
+template.COMPILED_DIR = {bundle!r}
+template.render_to_string('dhcp-client/ipv4.j2', {{'ifname': 'eth0', 'dhcp_options': {{'host_name': 'router'}}}},
+                          location={location!r})
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=30)
+    args = parser.parse_args()
+
+    root = os.path.dirname(TEMPLATE_DIR)
+    bundle = tempfile.mkdtemp(prefix='ifmanage-templates-')
+    try:
+        compile_templates(bundle)
+
+        def run(code):
+            subprocess.run([sys.executable, '-c', code], cwd=root, check=True)
+
+        report('python startup', measure(lambda i: run('pass'), args.count))
+        report('import util.template', measure(lambda i: run('import util.template'), args.count))
+        report('render from source', measure(lambda i: run(RENDER.format(bundle=bundle, location=TEMPLATE_DIR)),
+                                             args.count))
+        report('render from bundle', measure(lambda i: run(RENDER.format(bundle=bundle, location=None)),
+                                             args.count))
+
+        # the same first render in process, jinja2 already imported
+        template.COMPILED_DIR = bundle
+        content = {'ifname': 'eth0', 'dhcp_options': {'host_name': 'router'}}
+        for name, location in (('first render in process, source', TEMPLATE_DIR),
+                               ('first render in process, bundle', None)):
+            def first_render(i):
+                template.get_environment.cache_clear()
+                template.render_to_string('dhcp-client/ipv4.j2', content, location=location)
+            report(name, measure(first_render, args.count * 10))
+    finally:
+        shutil.rmtree(bundle)
+
+
+if __name__ == '__main__':
+    main()
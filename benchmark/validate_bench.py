@@ -0,0 +1,94 @@
+"""
+Compare address assignment checks against the netifaces/IPy based
+implementation util.validate used to ship.
+
+usage: python -m benchmark.validate_bench [--count N] [--ifname lo]
+"""
+import argparse
+
+from benchmark.common import measure, report
+from util.validate import AddressTable, are_addrs_assigned, is_interface_addr_assigned
+
+
+def legacy_is_ipv4(address: str) -> bool:
+    import IPy
+
+    netmask = None
+    if '/' in address:
+        address, netmask = address.split('/')
+
+    try:
+        ip = IPy.IP(address)
+
+        if netmask and int(netmask) > 24:
+            return False
+        return ip.version() == 4
+    except ValueError:
+        return False
+
+
+def legacy_is_interface_addr_assigned(ifname: str, address: str) -> bool:
+    import netifaces
+    from netifaces import AF_INET, AF_INET6
+    from socket import inet_pton
+
+    netmask = None
+    if '/' in address:
+        address, netmask = address.split('/')
+
+    try:
+        ifaces = netifaces.ifaddresses(ifname)
+    except ValueError:
+        return False
+
+    addr_type = AF_INET if legacy_is_ipv4(address) else AF_INET6
+
+    for ip in ifaces.get(addr_type, []):
+        ip_addr = ip['addr'].split('%')[0]
+
+        type1 = AF_INET if legacy_is_ipv4(address) else AF_INET6
+        type2 = AF_INET if legacy_is_ipv4(ip_addr) else AF_INET6
+        if inet_pton(type1, address) != inet_pton(type2, ip_addr):
+            continue
+
+        if not netmask:
+            return True
+
+        if legacy_is_ipv4(ip_addr):
+            prefix = sum([bin(int(_)).count('1') for _ in ip['netmask'].split('.')])
+        else:
+            prefix = sum([bin(int(_, 16)).count('1') for _ in ip['netmask'].split('/')[0].split(':') if _])
+
+        if prefix == int(netmask):
+            return True
+
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--ifname', default='lo')
+    args = parser.parse_args()
+
+    addrs = ['127.0.0.1/8', '::1/128', '192.0.2.1/24', '127.0.0.1']
+    try:
+        report('legacy is_interface_addr_assigned',
+               measure(lambda i: legacy_is_interface_addr_assigned(args.ifname, addrs[i % 4]), args.count))
+    except ImportError as e:
+        print(f'legacy implementation skipped: {e}')
+
+    report('is_interface_addr_assigned',
+           measure(lambda i: is_interface_addr_assigned(args.ifname, addrs[i % 4]), args.count))
+    report('are_addrs_assigned (4 addrs)',
+           measure(lambda i: are_addrs_assigned(args.ifname, addrs), args.count))
+
+    table = AddressTable()
+    table.refresh()
+    report('AddressTable.is_assigned (cached)',
+           measure(lambda i: table.is_assigned(args.ifname, addrs[i % 4]), args.count))
+    report('AddressTable.refresh (all interfaces)', measure(lambda i: table.refresh(), args.count // 10))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import asyncio
+import collections
+import os
+import re
+import socket
+
+from ifmanage.wifi import (CTRL_IFACE_DIR, PING, SCAN, SCAN_RESULTS, LIST_NETWORKS, SELECT_NETWORK, DISCONNECT,
+                           Profile, parse_scan_results, parse_list_networks)
+from util.wpactrl import client_path
+
+ATTACH = 'ATTACH'
+DETACH = 'DETACH'
+
+SCAN_RESULTS_EVENT = 'CTRL-EVENT-SCAN-RESULTS'
+SCAN_FAILED_EVENT = 'CTRL-EVENT-SCAN-FAILED'
+
+# unsolicited messages are prefixed with their priority, e.g. '<3>CTRL-EVENT-...'
+EVENT_RE = re.compile(rb'^<(\d)>')
+
+
+class Event(object):
+    def __init__(self, level: int, text: str):
+        self.level = level
+        self.text = text
+        self.name = text.split(' ', 1)[0]
+
+    def __repr__(self):
+        return f'<Event {self.level} {self.text!r}>'
+
+
+class _CtrlProtocol(asyncio.DatagramProtocol):
+    def __init__(self, owner):
+        self.owner = owner
+
+    def datagram_received(self, data, addr):
+        self.owner._dispatch(data)
+
+    def error_received(self, exc):
+        self.owner._fail(exc)
+
+    def connection_lost(self, exc):
+        self.owner._fail(exc or ConnectionError('control socket closed'))
+
+
+class AsyncWiFi(object):
+    """
+    asyncio client for the wpa_supplicant control interface. Replies are
+    matched to requests in order, unsolicited events are kept apart and
+    handed to events() iterators and wait_event() callers.
+
+    usage:
+        async with AsyncWiFi('wlan0') as wifi:
+            profiles = await wifi.scan()
+    """
+
+    def __init__(self, ifname, ctrl_dir=CTRL_IFACE_DIR, timeout=5.0):
+        self.ifname = ifname
+        self.ctrl_dir = ctrl_dir
+        self.timeout = timeout
+        self._path = client_path(ifname)
+        self._transport = None
+        self._pending = collections.deque()
+        self._queues = set()
+        self._waiters = []
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self._path)
+            sock.connect(f'{self.ctrl_dir}/{self.ifname}')
+            sock.setblocking(False)
+            self._transport, _ = await loop.create_datagram_endpoint(lambda: _CtrlProtocol(self), sock=sock)
+        except OSError:
+            sock.close()
+            self._unlink()
+            raise
+
+        try:
+            if not (await self.request(PING)).startswith('PONG'):
+                raise ConnectionError(f"Connection to '{self.ctrl_dir}/{self.ifname}' is broken!")
+            await self._expect_ok(ATTACH)
+        except BaseException:
+            self._abort(ConnectionError('control socket closed'))
+            raise
+
+    async def close(self):
+        if self._transport is None:
+            return
+        try:
+            await self._expect_ok(DETACH)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        self._transport.close()
+        self._transport = None
+        self._unlink()
+
+    def _abort(self, exc):
+        """
+        Close the connection without a word to wpa_supplicant and fail
+        every request still waiting for a reply.
+        """
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+            self._unlink()
+        self._fail(exc)
+
+    def _unlink(self):
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    def _dispatch(self, data: bytes):
+        match = EVENT_RE.match(data)
+        if match:
+            event = Event(int(match.group(1)), data[match.end():].decode('utf-8', 'replace'))
+            for queue in self._queues:
+                queue.put_nowait(event)
+            for waiter in list(self._waiters):
+                names, future = waiter
+                if event.name in names and not future.done():
+                    future.set_result(event)
+            return
+
+        # wpa_supplicant answers requests strictly in order, a request that
+        # timed out closes the connection so replies can not shift
+        if self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_result(data)
+
+    def _fail(self, exc):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(exc)
+
+    async def request(self, cmd: str, timeout=None) -> str:
+        """
+        Send a command and return its reply. Replies are matched to
+        requests in order, so a timeout closes the connection.
+        """
+        return (await self._request(cmd, timeout)).decode('utf-8')
+
+    async def _request(self, cmd: str, timeout=None) -> bytes:
+        if self._transport is None:
+            raise ConnectionError('control socket is not open')
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._transport.sendto(cmd.encode('utf-8'))
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # its reply may still come and would be taken for the next one's
+            self._abort(ConnectionError(f"'{cmd}' timed out, control socket closed"))
+            raise
+
+    async def _expect_ok(self, cmd: str):
+        reply = await self.request(cmd)
+        if not reply.startswith('OK'):
+            raise OSError(f"'{cmd}' failed: {reply.strip()}")
+
+    async def events(self):
+        """
+        Async iterator over unsolicited events received from now on.
+        """
+        queue = asyncio.Queue()
+        self._queues.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._queues.discard(queue)
+
+    def _watch(self, *names):
+        future = asyncio.get_running_loop().create_future()
+        waiter = (names, future)
+        self._waiters.append(waiter)
+        future.add_done_callback(lambda _: self._waiters.remove(waiter))
+        return future
+
+    async def wait_event(self, *names, timeout=None) -> Event:
+        """
+        Wait for the next event whose name is one of names.
+        """
+        return await asyncio.wait_for(self._watch(*names), timeout or self.timeout)
+
+    async def scan(self, timeout=30.0) -> list[Profile]:
+        """
+        Trigger a scan, wait for it to complete and return the results.
+        """
+        # watch before triggering so a fast scan can not be missed
+        done = self._watch(SCAN_RESULTS_EVENT, SCAN_FAILED_EVENT)
+        try:
+            reply = await self.request(SCAN)
+            # FAIL-BUSY: a scan is already running, its results will do
+            if not reply.startswith(('OK', 'FAIL-BUSY')):
+                raise OSError(f"'{SCAN}' failed: {reply.strip()}")
+            event = await asyncio.wait_for(done, timeout)
+        finally:
+            done.cancel()
+
+        if event.name == SCAN_FAILED_EVENT:
+            raise OSError(f'scan failed: {event.text}')
+        return parse_scan_results(await self._request(SCAN_RESULTS))
+
+    async def list_network(self) -> list[dict]:
+        return parse_list_networks(await self.request(LIST_NETWORKS))
+
+    async def connect(self, profile: Profile):
+        for n in await self.list_network():
+            if n["ssid"] == profile.ssid:
+                await self._expect_ok(f'{SELECT_NETWORK} {n["id"]}')
+
+    async def disconnect(self):
+        await self._expect_ok(DISCONNECT)
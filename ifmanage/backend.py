@@ -0,0 +1,679 @@
+import errno
+import os
+import re
+import shlex
+import socket
+import threading
+from collections import namedtuple
+
+from util.command import cmd, popen
+from util import netlink as nl
+
+# RFC 2863 operational states as reported in IFLA_OPERSTATE
+OPERSTATES = ('UNKNOWN', 'NOTPRESENT', 'DOWN', 'LOWERLAYERDOWN', 'TESTING', 'DORMANT', 'UP')
+
+# where 'ip netns add' keeps its named namespaces
+NETNS_RUN_DIR = '/run/netns'
+
+# NUD_* bits by the name ip prints them with
+_NUD_STATES = {
+    'INCOMPLETE': 0x01, 'REACHABLE': 0x02, 'STALE': 0x04, 'DELAY': 0x08, 'PROBE': 0x10, 'FAILED': 0x20,
+    'NOARP': 0x40, 'PERMANENT': 0x80,
+}
+
+# first link group tried by delete_many(), groups in use are skipped
+DELETE_GROUP = 0x69666d00
+
+# iproute2 only reports error text, map it back to an errno where possible
+_STRERRORS = {os.strerror(code): code for code in errno.errorcode}
+
+
+def _link_groups() -> dict:
+    """
+    Link group of every interface, {ifname: group}.
+    """
+    groups = {}
+    for ifname in os.listdir('/sys/class/net'):
+        try:
+            with open(f'/sys/class/net/{ifname}/netdev_group') as f:
+                groups[ifname] = int(f.read())
+        except (OSError, ValueError):
+            # gone meanwhile
+            pass
+    return groups
+
+
+def parse_addr(addr: str):
+    """
+    Split an address in CIDR notation into (family, packed, prefixlen). A
+    bare address is treated as a host address (/32 or /128).
+    """
+    import ipaddress
+
+    iface = ipaddress.ip_interface(addr)
+    family = socket.AF_INET if iface.version == 4 else socket.AF_INET6
+    return family, iface.ip.packed, iface.network.prefixlen
+
+
+class Link(namedtuple('Link', 'ifindex ifname up mtu address alias operstate kind')):
+    """
+    Immutable snapshot of a single interface as seen by the kernel.
+    """
+    __slots__ = ()
+
+
+class Route(namedtuple('Route', 'dst gateway ifname metric table protocol')):
+    """
+    A unicast route. dst is a normalized prefix ('0.0.0.0/0' for the
+    default route), gateway and ifname may be None.
+    """
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """
+        What tells routes apart in the kernel: table, prefix and metric.
+        """
+        return self.table, self.dst, self.metric
+
+
+class Neighbor(namedtuple('Neighbor', 'ifname address lladdr state')):
+    """
+    A neighbour (ARP/NDP) entry, state is a NUD_* bitmask.
+    """
+    __slots__ = ()
+
+
+def parse_link(payload) -> Link:
+    """
+    Build a Link record from a RTM_NEWLINK message payload.
+    """
+    _, _, ifindex, flags, _ = nl.IFINFOMSG.unpack_from(payload)
+    attrs = nl.parse_attrs(payload, nl.IFINFOMSG.size)
+    kind = ''
+    if nl.IFLA_LINKINFO in attrs:
+        info = nl.parse_attrs(attrs[nl.IFLA_LINKINFO])
+        kind = nl.attr_str(info.get(nl.IFLA_INFO_KIND, b''))
+    operstate = attrs.get(nl.IFLA_OPERSTATE, b'\0')[0]
+    return Link(
+        ifindex,
+        nl.attr_str(attrs.get(nl.IFLA_IFNAME, b'')),
+        bool(flags & nl.IFF_UP),
+        nl.attr_u32(attrs[nl.IFLA_MTU]) if nl.IFLA_MTU in attrs else 0,
+        nl.attr_mac(attrs.get(nl.IFLA_ADDRESS, b'')),
+        nl.attr_str(attrs.get(nl.IFLA_IFALIAS, b'')),
+        OPERSTATES[operstate] if operstate < len(OPERSTATES) else 'UNKNOWN',
+        kind,
+    )
+
+
+def _prefix(packed: bytes, prefixlen: int) -> str:
+    family = socket.AF_INET if len(packed) == 4 else socket.AF_INET6
+    return f'{socket.inet_ntop(family, packed)}/{prefixlen}'
+
+
+def parse_route(payload, names: dict):
+    """
+    Build a Route record from a RTM_NEWROUTE message payload, None for
+    anything but a unicast route. names maps ifindex to name and is
+    filled in as needed.
+    """
+    family, dst_len, _, _, table, protocol, _, route_type, _ = nl.RTMSG.unpack_from(payload)
+    if route_type != nl.RTN_UNICAST or family not in (socket.AF_INET, socket.AF_INET6):
+        return None
+    attrs = nl.parse_attrs(payload, nl.RTMSG.size)
+    size = 4 if family == socket.AF_INET else 16
+    gateway = attrs.get(nl.RTA_GATEWAY)
+    ifname = None
+    if nl.RTA_OIF in attrs:
+        ifindex = nl.attr_u32(attrs[nl.RTA_OIF])
+        ifname = names.get(ifindex)
+        if ifname is None:
+            try:
+                ifname = names[ifindex] = socket.if_indextoname(ifindex)
+            except OSError:
+                pass
+    return Route(
+        _prefix(attrs.get(nl.RTA_DST, bytes(size)), dst_len),
+        socket.inet_ntop(family, gateway) if gateway else None,
+        ifname,
+        nl.attr_u32(attrs[nl.RTA_PRIORITY]) if nl.RTA_PRIORITY in attrs else 0,
+        nl.attr_u32(attrs[nl.RTA_TABLE]) if nl.RTA_TABLE in attrs else table,
+        protocol,
+    )
+
+
+class Backend(object):
+    """
+    Base class of the link/address backends used by Interface. Every
+    operation is first translated into backend specific requests by
+    build(), run() then executes them.
+    """
+    name = None
+
+    # bumped on every change made through this backend, lets caches
+    # notice that their snapshot may be outdated
+    generation = 0
+
+    def build(self, op: str, ifname: str, *args) -> list:
+        return getattr(self, f'_build_{op}')(ifname, *args)
+
+    def run(self, op: str, ifname: str, *args):
+        self.generation += 1
+        self._run(op, ifname, *args)
+
+    def run_batch(self, ops) -> list:
+        """
+        Execute many (op, ifname, args) tuples together. Every operation is
+        attempted, the result holds one OSError (or None on success) per
+        operation in the same order.
+        """
+        self.generation += 1
+        return self._run_batch(ops)
+
+    def _run(self, op: str, ifname: str, *args):
+        raise NotImplementedError
+
+    def _run_batch(self, ops) -> list:
+        raise NotImplementedError
+
+    def get_addrs(self, ifname: str) -> list:
+        """
+        Return all addresses assigned to an interface in CIDR notation.
+        """
+        raise NotImplementedError
+
+    def dump_links(self) -> list:
+        """
+        Return a Link record for every interface, read in one request.
+        """
+        raise NotImplementedError
+
+    def dump_routes(self) -> list:
+        """
+        Return a Route record for every unicast route of every table, read
+        in one request per address family at most.
+        """
+        raise NotImplementedError
+
+    def dump_neighbors(self) -> list:
+        """
+        Return a Neighbor record for every neighbour entry.
+        """
+        raise NotImplementedError
+
+    def create(self, ifname: str, kind: str, netns=None):
+        """
+        Create an interface, inside network namespace netns if given: a
+        name from 'ip netns', a path to a namespace file or a pid. Only
+        the new interface is moved, a veth peer stays in this namespace.
+        """
+        self.run('create', ifname, kind, netns)
+
+    def delete(self, ifname: str):
+        self.run('delete', ifname)
+
+    def delete_many(self, ifnames) -> list:
+        """
+        Delete many interfaces. They are moved into an unused link group
+        which is then deleted at once: the kernel unregisters a group
+        together, waiting for one RCU grace period instead of one per
+        interface. If the group can not be deleted as a whole they are
+        deleted one by one. Returns one OSError (or None on success) per
+        interface.
+        """
+        ifnames = list(ifnames)
+        groups = _link_groups()
+        group = DELETE_GROUP
+        while group in groups.values():
+            group += 1
+
+        errors = self.run_batch([('set_group', ifname, (group,)) for ifname in ifnames])
+        moved = [n for n, error in enumerate(errors) if error is None]
+        if not moved or self.run_batch([('delete_group', group, ())])[0] is None:
+            return errors
+
+        # some member refused, such as a physical interface
+        results = self.run_batch([('delete', ifnames[n], ()) for n in moved])
+        restore = []
+        for n, error in zip(moved, results):
+            errors[n] = error
+            if error is not None:
+                restore.append(('set_group', ifnames[n], (groups.get(ifnames[n], 0),)))
+        self.run_batch(restore)
+        return errors
+
+    def set_mtu(self, ifname: str, mtu: int):
+        self.run('set_mtu', ifname, mtu)
+
+    def set_state(self, ifname: str, enable: bool):
+        self.run('set_state', ifname, enable)
+
+    def set_mac(self, ifname: str, mac: str):
+        self.run('set_mac', ifname, mac)
+
+    def set_alias(self, ifname: str, alias: str):
+        self.run('set_alias', ifname, alias)
+
+    def add_addr(self, ifname: str, addr: str):
+        self.run('add_addr', ifname, addr)
+
+    def del_addr(self, ifname: str, addr: str):
+        self.run('del_addr', ifname, addr)
+
+    def flush_addrs(self, ifname: str):
+        self.run('flush_addrs', ifname)
+
+
+class CommandBackend(Backend):
+    """
+    Backend forking iproute2 for every operation.
+    """
+    name = 'command'
+
+    def _run(self, op: str, ifname: str, *args):
+        for line in self.build(op, ifname, *args):
+            cmd(['ip'] + shlex.split(line))
+
+    def _run_batch(self, ops) -> list:
+        errors = [None] * len(ops)
+        lines = []
+        owners = []
+        for index, (op, ifname, args) in enumerate(ops):
+            lines.extend(self.build(op, ifname, *args))
+            owners.extend([index] * (len(lines) - len(owners)))
+
+        if not lines:
+            return errors
+
+        # -force keeps going after a failed line, each failure is reported
+        # as 'Command failed -:<line>' preceded by the error message
+        _, _, out = popen('ip -force -batch -', input='\n'.join(lines) + '\n')
+        message = []
+        for line in out.split('\n'):
+            match = re.match(r'Command failed -:(\d+)', line)
+            if not match:
+                message.append(line)
+                continue
+            index = owners[int(match.group(1)) - 1]
+            if errors[index] is None:
+                errors[index] = self._error(' '.join(message), ops[index])
+            message = []
+        return errors
+
+    @staticmethod
+    def _error(message: str, op) -> OSError:
+        if message.startswith('Cannot find device'):
+            # ip's own lookup of the interface name, not a kernel error
+            code = errno.ENODEV
+        else:
+            code = _STRERRORS.get(message.rsplit(': ', 1)[-1], errno.EIO)
+        return OSError(code, f'{op[0]} {op[1]}: {message}')
+
+    def get_addrs(self, ifname: str) -> list:
+        import json
+
+        out = json.loads(cmd(f'ip -json addr show dev {ifname}'))
+        return [f"{a['local']}/{a['prefixlen']}" for link in out for a in link.get('addr_info', [])]
+
+    def dump_links(self) -> list:
+        import json
+
+        links = []
+        for link in json.loads(cmd('ip -json -detail link show')):
+            links.append(Link(
+                link['ifindex'],
+                link['ifname'],
+                'UP' in link.get('flags', []),
+                link.get('mtu', 0),
+                link.get('address', ''),
+                link.get('ifalias', ''),
+                link.get('operstate', 'UNKNOWN'),
+                link.get('linkinfo', {}).get('info_kind', ''),
+            ))
+        return links
+
+    def dump_routes(self) -> list:
+        import json
+
+        routes = []
+        for family, default in (('-4', '0.0.0.0/0'), ('-6', '::/0')):
+            # -N: tables, protocols and types as numbers; missing ones are
+            # main, boot and unicast
+            for route in json.loads(cmd(f'ip -N -json {family} route show table all')):
+                if route.get('type', '1') != '1':
+                    continue
+                dst = route['dst']
+                if dst == 'default':
+                    dst = default
+                elif '/' not in dst:
+                    dst += '/32' if family == '-4' else '/128'
+                routes.append(Route(dst, route.get('gateway'), route.get('dev'), route.get('metric', 0),
+                                    int(route.get('table', nl.RT_TABLE_MAIN)),
+                                    int(route.get('protocol', nl.RTPROT_BOOT))))
+        return routes
+
+    def dump_neighbors(self) -> list:
+        import json
+
+        neighbors = []
+        for neighbor in json.loads(cmd('ip -json neigh show')):
+            state = 0
+            for name in neighbor.get('state', []):
+                state |= _NUD_STATES.get(name, 0)
+            neighbors.append(Neighbor(neighbor['dev'], neighbor['dst'], neighbor.get('lladdr'), state))
+        return neighbors
+
+    def _build_replace_route(self, ifname, dst, gateway, metric, table, protocol):
+        via = f' via {gateway}' if gateway else ''
+        dev = f' dev {ifname}' if ifname else ''
+        return [f'route replace {dst}{via}{dev} metric {metric} table {table} proto {protocol}']
+
+    def _build_del_route(self, ifname, dst, gateway, metric, table, protocol):
+        via = f' via {gateway}' if gateway else ''
+        dev = f' dev {ifname}' if ifname else ''
+        return [f'route del {dst}{via}{dev} metric {metric} table {table} proto {protocol}']
+
+    def _build_replace_neigh(self, ifname, address, lladdr):
+        return [f'neigh replace {address} lladdr {lladdr} dev {ifname} nud permanent']
+
+    def _build_del_neigh(self, ifname, address):
+        return [f'neigh del {address} dev {ifname}']
+
+    def _build_create(self, ifname, kind, netns=None):
+        if kind == 'veth':
+            # name the peer like the netlink backend does, not vethN
+            kind = f'veth peer name {ifname}p'
+        if netns is not None:
+            return [f'link add dev {ifname} netns {shlex.quote(str(netns))} type {kind}']
+        return [f'link add dev {ifname} type {kind}']
+
+    def _build_delete(self, ifname):
+        return [f'link del dev {ifname}']
+
+    def _build_delete_group(self, group):
+        return [f'link del group {group}']
+
+    def _build_set_group(self, ifname, group):
+        return [f'link set dev {ifname} group {group}']
+
+    def _build_set_mtu(self, ifname, mtu):
+        return [f'link set dev {ifname} mtu {mtu}']
+
+    def _build_set_state(self, ifname, enable):
+        return ['link set dev {} {}'.format(ifname, 'up' if enable else 'down')]
+
+    def _build_set_mac(self, ifname, mac):
+        return [f'link set dev {ifname} address {mac}']
+
+    def _build_set_alias(self, ifname, alias):
+        return [f'link set dev {ifname} alias {shlex.quote(alias)}']
+
+    def _build_add_addr(self, ifname, addr):
+        return [f'addr add {addr} dev {ifname}']
+
+    def _build_del_addr(self, ifname, addr):
+        return [f'addr del {addr} dev {ifname}']
+
+    def _build_flush_addrs(self, ifname):
+        return [f'addr flush dev {ifname}']
+
+
+class NetlinkBackend(Backend):
+    """
+    Backend talking rtnetlink to the kernel in-process. A single netlink
+    socket is opened on first use and shared by every caller.
+    """
+    name = 'netlink'
+
+    def __init__(self):
+        self._netlink = None
+        self._lock = threading.Lock()
+        # namespace files opened while building a batch, per thread
+        self._local = threading.local()
+
+    @property
+    def netlink(self) -> nl.Netlink:
+        if self._netlink is None:
+            with self._lock:
+                if self._netlink is None:
+                    self._netlink = nl.Netlink()
+        return self._netlink
+
+    def close(self):
+        if self._netlink is not None:
+            self._netlink.close()
+            self._netlink = None
+
+    def _run(self, op: str, ifname: str, *args):
+        error = self._run_batch([(op, ifname, args)])[0]
+        if error:
+            raise error
+
+    def _run_batch(self, ops) -> list:
+        errors = [None] * len(ops)
+        msgs = []
+        owners = []
+        self._local.netns_fds = {}
+        try:
+            for index, (op, ifname, args) in enumerate(ops):
+                try:
+                    msgs.extend(self.build(op, ifname, *args))
+                except OSError as e:
+                    errors[index] = e
+                owners.extend([index] * (len(msgs) - len(owners)))
+
+            # all requests go out in a single send, the kernel acks each one
+            results = self.netlink.transact(msgs)
+        finally:
+            for fd in self._local.netns_fds.values():
+                os.close(fd)
+            self._local.netns_fds = {}
+
+        for owner, error in zip(owners, results):
+            op, ifname, _ = ops[owner]
+            # secondary addresses vanish together with their primary on flush
+            if not error or (op == 'flush_addrs' and error == errno.EADDRNOTAVAIL):
+                continue
+            if errors[owner] is None:
+                errors[owner] = nl.netlink_error(error, f'{op} {ifname}')
+        return errors
+
+    def _dump_addrs(self, ifname: str):
+        index = self._index(ifname)
+        for _, payload in self.netlink.dump(nl.RTM_GETADDR, nl.IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            if nl.IFADDRMSG.unpack_from(payload)[4] == index:
+                yield payload
+
+    def get_addrs(self, ifname: str) -> list:
+        addrs = []
+        for payload in self._dump_addrs(ifname):
+            _, family, packed, prefixlen = nl.parse_addr_msg(payload)
+            addrs.append(f'{socket.inet_ntop(family, packed)}/{prefixlen}')
+        return addrs
+
+    def dump_links(self) -> list:
+        links = []
+        for _, payload in self.netlink.dump(nl.RTM_GETLINK, nl.IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            links.append(parse_link(payload))
+        return links
+
+    def dump_routes(self) -> list:
+        names = {}
+        routes = []
+        for _, payload in self.netlink.dump(nl.RTM_GETROUTE, nl.RTMSG.pack(socket.AF_UNSPEC, *[0] * 8)):
+            route = parse_route(payload, names)
+            if route is not None:
+                routes.append(route)
+        return routes
+
+    def dump_neighbors(self) -> list:
+        names = {}
+        neighbors = []
+        for _, payload in self.netlink.dump(nl.RTM_GETNEIGH, nl.NDMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            family, ifindex, state, _, _ = nl.NDMSG.unpack_from(payload)
+            attrs = nl.parse_attrs(payload, nl.NDMSG.size)
+            if nl.NDA_DST not in attrs or family not in (socket.AF_INET, socket.AF_INET6):
+                continue
+            if ifindex not in names:
+                try:
+                    names[ifindex] = socket.if_indextoname(ifindex)
+                except OSError:
+                    continue
+            lladdr = attrs.get(nl.NDA_LLADDR)
+            neighbors.append(Neighbor(names[ifindex], socket.inet_ntop(family, attrs[nl.NDA_DST]),
+                                      nl.attr_mac(lladdr) if lladdr else None, state))
+        return neighbors
+
+    @staticmethod
+    def _index(ifname: str) -> int:
+        try:
+            return socket.if_nametoindex(ifname)
+        except OSError:
+            raise nl.netlink_error(errno.ENODEV, f'interface {ifname} does not exist')
+
+    def _link_msg(self, ifname, attrs=b'', flags=0, change=0, msg_type=nl.RTM_NEWLINK, msg_flags=0):
+        payload = nl.IFINFOMSG.pack(socket.AF_UNSPEC, 0, self._index(ifname), flags, change) + attrs
+        return msg_type, msg_flags, payload
+
+    def _addr_msg(self, msg_type, msg_flags, ifname, addr):
+        family, packed, prefixlen = parse_addr(addr)
+        payload = nl.IFADDRMSG.pack(family, prefixlen, 0, 0, self._index(ifname))
+        payload += nl.nla(nl.IFA_LOCAL, packed) + nl.nla(nl.IFA_ADDRESS, packed)
+        return msg_type, msg_flags, payload
+
+    def _netns_attr(self, netns) -> bytes:
+        """
+        IFLA_NET_NS_PID for a pid, else IFLA_NET_NS_FD of the namespace
+        file, kept open until the batch was sent.
+        """
+        if isinstance(netns, int):
+            return nl.nla_u32(nl.IFLA_NET_NS_PID, netns)
+        path = netns if '/' in netns else f'{NETNS_RUN_DIR}/{netns}'
+        fds = self._local.netns_fds
+        if path not in fds:
+            try:
+                fds[path] = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+            except FileNotFoundError:
+                raise nl.netlink_error(errno.ENOENT, f'network namespace {netns} does not exist') from None
+        return nl.nla_u32(nl.IFLA_NET_NS_FD, fds[path])
+
+    def _build_create(self, ifname, kind, netns=None):
+        info = nl.nla_str(nl.IFLA_INFO_KIND, kind)
+        if kind == 'veth':
+            # veth needs a peer, it is named <ifname>p
+            peer = nl.IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) + nl.nla_str(nl.IFLA_IFNAME, f'{ifname}p')
+            info += nl.nla(nl.IFLA_INFO_DATA, nl.nla(nl.VETH_INFO_PEER, peer))
+        payload = nl.IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        payload += nl.nla_str(nl.IFLA_IFNAME, ifname) + nl.nla(nl.IFLA_LINKINFO, info)
+        if netns is not None:
+            payload += self._netns_attr(netns)
+        return [(nl.RTM_NEWLINK, nl.NLM_F_CREATE | nl.NLM_F_EXCL, payload)]
+
+    def _build_delete(self, ifname):
+        return [self._link_msg(ifname, msg_type=nl.RTM_DELLINK)]
+
+    def _route_msg(self, msg_type, msg_flags, ifname, dst, gateway, metric, table, protocol):
+        family, packed, prefixlen = parse_addr(dst)
+        scope = nl.RT_SCOPE_UNIVERSE if gateway else nl.RT_SCOPE_LINK
+        # tables above 255 only fit RTA_TABLE
+        payload = nl.RTMSG.pack(family, prefixlen, 0, 0, table if table < 256 else nl.RT_TABLE_UNSPEC, protocol,
+                                scope, nl.RTN_UNICAST, 0)
+        payload += nl.nla_u32(nl.RTA_TABLE, table) + nl.nla_u32(nl.RTA_PRIORITY, metric)
+        if prefixlen:
+            payload += nl.nla(nl.RTA_DST, packed)
+        if gateway:
+            payload += nl.nla(nl.RTA_GATEWAY, socket.inet_pton(family, gateway))
+        if ifname:
+            payload += nl.nla_u32(nl.RTA_OIF, self._index(ifname))
+        return msg_type, msg_flags, payload
+
+    def _build_replace_route(self, ifname, dst, gateway, metric, table, protocol):
+        return [self._route_msg(nl.RTM_NEWROUTE, nl.NLM_F_CREATE | nl.NLM_F_REPLACE, ifname, dst, gateway, metric,
+                                table, protocol)]
+
+    def _build_del_route(self, ifname, dst, gateway, metric, table, protocol):
+        return [self._route_msg(nl.RTM_DELROUTE, 0, ifname, dst, gateway, metric, table, protocol)]
+
+    def _neigh_msg(self, msg_type, msg_flags, ifname, address, lladdr=None):
+        family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        payload = nl.NDMSG.pack(family, self._index(ifname), nl.NUD_PERMANENT, 0, 0)
+        payload += nl.nla(nl.NDA_DST, socket.inet_pton(family, address))
+        if lladdr:
+            payload += nl.nla(nl.NDA_LLADDR, bytes.fromhex(lladdr.replace(':', '')))
+        return msg_type, msg_flags, payload
+
+    def _build_replace_neigh(self, ifname, address, lladdr):
+        return [self._neigh_msg(nl.RTM_NEWNEIGH, nl.NLM_F_CREATE | nl.NLM_F_REPLACE, ifname, address, lladdr)]
+
+    def _build_del_neigh(self, ifname, address):
+        return [self._neigh_msg(nl.RTM_DELNEIGH, 0, ifname, address)]
+
+    def _build_delete_group(self, group):
+        payload = nl.IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) + nl.nla_u32(nl.IFLA_GROUP, group)
+        return [(nl.RTM_DELLINK, 0, payload)]
+
+    def _build_set_group(self, ifname, group):
+        return [self._link_msg(ifname, nl.nla_u32(nl.IFLA_GROUP, group))]
+
+    def _build_set_mtu(self, ifname, mtu):
+        return [self._link_msg(ifname, nl.nla_u32(nl.IFLA_MTU, int(mtu)))]
+
+    def _build_set_state(self, ifname, enable):
+        return [self._link_msg(ifname, flags=nl.IFF_UP if enable else 0, change=nl.IFF_UP)]
+
+    def _build_set_mac(self, ifname, mac):
+        return [self._link_msg(ifname, nl.nla(nl.IFLA_ADDRESS, bytes.fromhex(mac.replace(':', ''))))]
+
+    def _build_set_alias(self, ifname, alias):
+        return [self._link_msg(ifname, nl.nla(nl.IFLA_IFALIAS, alias.encode()))]
+
+    def _build_add_addr(self, ifname, addr):
+        return [self._addr_msg(nl.RTM_NEWADDR, nl.NLM_F_CREATE | nl.NLM_F_EXCL, ifname, addr)]
+
+    def _build_del_addr(self, ifname, addr):
+        return [self._addr_msg(nl.RTM_DELADDR, 0, ifname, addr)]
+
+    def _build_flush_addrs(self, ifname):
+        # deleting with the original header and attributes removes exactly that address
+        return [(nl.RTM_DELADDR, 0, payload) for payload in self._dump_addrs(ifname)]
+
+
+BACKENDS = {
+    CommandBackend.name: CommandBackend,
+    NetlinkBackend.name: NetlinkBackend,
+}
+
+_default_backend = None
+_instances = {}
+
+
+def get_backend(backend=None) -> Backend:
+    """
+    Resolve a backend instance. Accepts an instance, a backend name or
+    None for the process wide default. Named backends are shared.
+    """
+    global _default_backend
+
+    if isinstance(backend, Backend):
+        return backend
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend "{backend}"')
+        if backend not in _instances:
+            _instances[backend] = BACKENDS[backend]()
+        return _instances[backend]
+
+    if _default_backend is None:
+        # rtnetlink is only available on Linux, fall back to iproute2 elsewhere
+        _default_backend = get_backend('netlink' if hasattr(socket, 'AF_NETLINK') else 'command')
+    return _default_backend
+
+
+def set_default_backend(backend):
+    """
+    Select the backend used by every Interface that was not given one
+    explicitly.
+    """
+    global _default_backend
+    _default_backend = get_backend(backend)
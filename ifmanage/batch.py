@@ -0,0 +1,178 @@
+from ifmanage.backend import get_backend
+from util.validate import assert_mac
+
+IFF_UP = 0x1
+
+
+def _read_sysfs(ifname: str, attr: str) -> str:
+    with open(f'/sys/class/net/{ifname}/{attr}') as f:
+        return f.read().strip()
+
+
+class Operation(object):
+    """
+    A single queued change. After Batch.apply() error holds the OSError
+    the operation failed with, or None if it succeeded.
+    """
+
+    def __init__(self, op: str, ifname: str, *args):
+        self.op = op
+        self.ifname = ifname
+        self.args = args
+        self.error = None
+        self.applied = False
+        self.undo = None
+
+    @property
+    def ok(self) -> bool:
+        return self.applied and self.error is None
+
+    def __repr__(self):
+        args = ', '.join(repr(a) for a in (self.ifname,) + self.args)
+        state = 'pending' if not self.applied else (self.error or 'ok')
+        return f'<{self.op}({args}): {state}>'
+
+
+class Batch(object):
+    """
+    Collect link and address changes across many interfaces and apply them
+    together: one 'ip -batch' run for the command backend, a single
+    multi-message send for the netlink backend.
+
+    usage:
+        with Batch() as batch:
+            batch.set_mtu('eth0', 9000)
+            batch.add_addr('eth0', '192.0.2.1/24')
+
+    Used as a context manager the batch is applied on exit, rolled back if
+    any operation failed and the first error is raised.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = get_backend(backend)
+        self.operations = []
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            return
+        self.apply(rollback=True)
+        for operation in self.operations:
+            if operation.error:
+                raise operation.error
+
+    def add(self, op: str, interface, *args) -> Operation:
+        """
+        Queue an operation. interface can be an Interface or an interface
+        name.
+        """
+        operation = Operation(op, getattr(interface, 'ifname', interface), *args)
+        self.operations.append(operation)
+        return operation
+
+    def extend(self, operations) -> list:
+        """
+        Queue Operations built elsewhere, e.g. by RouteTable.diff().
+        """
+        operations = list(operations)
+        self.operations.extend(operations)
+        return operations
+
+    def create(self, interface, kind: str, netns=None) -> Operation:
+        return self.add('create', interface, kind, netns)
+
+    def delete(self, interface) -> Operation:
+        return self.add('delete', interface)
+
+    def set_mtu(self, interface, mtu: int) -> Operation:
+        return self.add('set_mtu', interface, mtu)
+
+    def set_state(self, interface, enable: bool) -> Operation:
+        return self.add('set_state', interface, enable)
+
+    def set_mac(self, interface, mac: str) -> Operation:
+        assert_mac(mac)
+        return self.add('set_mac', interface, mac)
+
+    def set_alias(self, interface, name: str) -> Operation:
+        if not name:
+            raise ValueError("Alias cannot be empty")
+        return self.add('set_alias', interface, name)
+
+    def add_addr(self, interface, addr: str) -> Operation:
+        return self.add('add_addr', interface, addr)
+
+    def del_addr(self, interface, addr: str) -> Operation:
+        return self.add('del_addr', interface, addr)
+
+    def flush_addrs(self, interface) -> Operation:
+        return self.add('flush_addrs', interface)
+
+    def _undo(self, operation: Operation) -> list:
+        """
+        Work out the operations reverting this one from the current state.
+        Deleting an interface can not be undone.
+        """
+        op, ifname, args = operation.op, operation.ifname, operation.args
+        try:
+            if op == 'create':
+                # an interface created in another namespace is out of reach
+                if len(args) > 1 and args[1] is not None:
+                    return []
+                return [('delete', ifname, ())]
+            if op == 'add_addr':
+                return [('del_addr', ifname, args)]
+            if op == 'del_addr':
+                return [('add_addr', ifname, args)]
+            if op == 'flush_addrs':
+                return [('add_addr', ifname, (addr,)) for addr in self.backend.get_addrs(ifname)]
+            if op == 'set_mtu':
+                return [('set_mtu', ifname, (int(_read_sysfs(ifname, 'mtu')),))]
+            if op == 'set_mac':
+                return [('set_mac', ifname, (_read_sysfs(ifname, 'address'),))]
+            if op == 'set_alias':
+                return [('set_alias', ifname, (_read_sysfs(ifname, 'ifalias'),))]
+            if op == 'set_state':
+                return [('set_state', ifname, (bool(int(_read_sysfs(ifname, 'flags'), 16) & IFF_UP),))]
+        except OSError:
+            # the interface does not exist (yet), nothing to restore
+            pass
+        return []
+
+    def apply(self, rollback=False) -> list:
+        """
+        Apply all pending operations. Every operation is attempted and
+        reports its own error. With rollback=True all successful operations
+        are reverted if any of them failed.
+        """
+        pending = [o for o in self.operations if not o.applied]
+        if not pending:
+            return []
+        for operation in pending:
+            operation.undo = self._undo(operation)
+
+        errors = self.backend.run_batch([(o.op, o.ifname, o.args) for o in pending])
+        for operation, error in zip(pending, errors):
+            operation.applied = True
+            operation.error = error
+
+        if rollback and any(errors):
+            self.rollback()
+        return pending
+
+    def rollback(self) -> list:
+        """
+        Revert every successfully applied operation, newest first. Returns
+        the list of errors raised while reverting.
+        """
+        undo = []
+        for operation in reversed(self.operations):
+            if operation.ok and operation.undo:
+                undo.extend(operation.undo)
+                operation.undo = None
+        return [e for e in self.backend.run_batch(undo) if e]
@@ -0,0 +1,219 @@
+"""
+Client stubs for ifmanaged, see ifmanage.daemon. They look like the in
+process classes, every method call is run by the daemon:
+
+    from ifmanage.client import Interface, WiFi
+    Interface('eth0').set_mtu(1400)
+    profiles = WiFi('wlan0').scan(incremental=True)
+
+Kept light to import: no ifmanage module is loaded until a Profile comes
+back or is sent.
+"""
+import json
+import os
+import socket
+import threading
+import types
+
+SOCKET_PATH = os.environ.get('IFMANAGED_SOCKET', '/run/ifmanaged.sock')
+TIMEOUT = 60.0
+
+
+def _builtin_subclasses(cls):
+    yield cls
+    for sub in cls.__subclasses__():
+        if sub.__module__ == 'builtins':
+            yield from _builtin_subclasses(sub)
+
+
+# exceptions re-raised with their own type on the client, anything else
+# becomes a RemoteError. An error carrying an errno is rebuilt by OSError,
+# which picks the subclass matching it.
+ERRORS = {cls.__name__: cls for cls in (ValueError, TypeError, KeyError, AttributeError, NotImplementedError,
+                                         *_builtin_subclasses(OSError))}
+
+# how deep results are turned into plain data
+MAX_DEPTH = 4
+
+
+def encode(value, depth=0):
+    """
+    Turn a value into something json can carry. Objects become dicts of
+    their public attributes and properties tagged with '__type__'.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    if depth >= MAX_DEPTH:
+        return repr(value)
+    if isinstance(value, dict):
+        return {str(k): encode(v, depth + 1) for k, v in value.items()}
+    if hasattr(value, '_asdict'):
+        return dict(encode(value._asdict(), depth), __type__=type(value).__name__)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [encode(v, depth + 1) for v in value]
+    if isinstance(value, BaseException):
+        return repr(value)
+
+    names = set(getattr(value, '__dict__', ()))
+    for cls in type(value).__mro__:
+        names.update(getattr(cls, '__slots__', ()))
+        names.update(k for k, v in vars(cls).items() if isinstance(v, property))
+    data = {'__type__': type(value).__name__}
+    for name in sorted(names):
+        if name.startswith('_'):
+            continue
+        attr = getattr(value, name, None)
+        if not callable(attr):
+            data[name] = encode(attr, depth + 1)
+    return data
+
+
+def decode(value):
+    """
+    Reverse of encode(): Profiles become Profile objects again, other
+    objects attribute accessible namespaces.
+    """
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get('__type__')
+    if kind == 'Profile':
+        from ifmanage.scantable import Profile
+
+        profile = Profile(ssid=value['ssid'], RSSI=value.get('RSSI'), frequency=value.get('frequency'),
+                          akm=value.get('akm'))
+        profile.password = value.get('password') or ''
+        return profile
+    data = {k: decode(v) for k, v in value.items() if k != '__type__'}
+    return types.SimpleNamespace(**data) if kind else data
+
+
+class RemoteError(RuntimeError):
+    """
+    An exception of a type the client does not re-raise as is.
+    """
+
+
+class Client(object):
+    """
+    One connection to ifmanaged, shared by every stub of a process. Calls
+    are sent one at a time; the connection is made on first use and again
+    after it broke.
+    """
+
+    def __init__(self, path=SOCKET_PATH, timeout=TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+        self._sock = self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile('rb')
+        self._pid = os.getpid()
+
+    def call(self, cls: str, ifname: str, config: dict, method: str, *args, **kwargs):
+        """
+        Call method on the daemon's cls(ifname, **config) object.
+        """
+        request = json.dumps({'class': cls, 'ifname': ifname, 'config': encode(config), 'method': method,
+                              'args': encode(args), 'kwargs': encode(kwargs)}).encode() + b'\n'
+        with self._lock:
+            # a connection can not be shared with a forked child
+            if self._sock is None or self._pid != os.getpid():
+                self._connect()
+            try:
+                self._sock.sendall(request)
+                line = self._file.readline()
+            except OSError:
+                self._disconnect()
+                raise
+            if not line:
+                self._disconnect()
+                raise ConnectionError('ifmanaged closed the connection')
+
+        reply = json.loads(line)
+        error = reply.get('error')
+        if error is not None:
+            cls = ERRORS.get(error['type'])
+            if error.get('errno') is not None and (cls is None or issubclass(cls, OSError)):
+                raise OSError(error['errno'], error['message'])
+            if cls is None:
+                raise RemoteError(f'{error["type"]}: {error["message"]}')
+            raise cls(error['message'])
+        return decode(reply['result'])
+
+
+_client = None
+
+
+def get_client() -> Client:
+    global _client
+    if _client is None:
+        _client = Client()
+    return _client
+
+
+def set_client(client: Client):
+    global _client
+    _client = client
+
+
+class Remote(object):
+    """
+    Stand-in for an object living in the daemon, public methods are
+    forwarded to it.
+    """
+    remote_class = None
+
+    def __init__(self, ifname, client=None, **kwargs):
+        self.ifname = ifname
+        self.config = kwargs
+        self._client = client
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            client = self._client or get_client()
+            return client.call(self.remote_class, self.ifname, self.config, name, *args, **kwargs)
+        method.__name__ = name
+        return method
+
+    def __repr__(self):
+        return f'<{self.remote_class} {self.ifname} via ifmanaged>'
+
+
+class Interface(Remote):
+    remote_class = 'Interface'
+
+
+class Ethernet(Remote):
+    remote_class = 'Ethernet'
+
+
+class WiFi(Remote):
+    remote_class = 'WiFi'
@@ -0,0 +1,154 @@
+"""
+ifmanaged: a long running process owning Interface and WiFi objects, so
+their caches (link table, templates, service manager state, pooled
+wpa_supplicant connections) outlive the short scripts using them. The
+same API is served over a Unix socket, see ifmanage.client for the stubs.
+
+Every request is one line of JSON:
+    {"class": "Interface", "ifname": "eth0", "config": {...}, "method": "set_mtu", "args": [1400], "kwargs": {}}
+answered by one line, {"result": ...} or {"error": {"type", "errno", "message"}}.
+
+usage: python -m ifmanage.daemon [--socket PATH]
+"""
+import argparse
+import errno
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+
+from ifmanage.client import SOCKET_PATH, decode, encode
+from ifmanage.executor import interface_lock
+
+# objects kept at most, the least recently used ones are dropped first
+MAX_OBJECTS = 1024
+
+# methods after which the objects of an interface are dropped
+REMOVING = ('remove', 'delete')
+
+
+def _classes() -> dict:
+    from ifmanage.ethernet import Ethernet
+    from ifmanage.interface import Interface
+    from ifmanage.wifi import WiFi
+    return {'Interface': Interface, 'Ethernet': Ethernet, 'WiFi': WiFi}
+
+
+def _serving(path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            reply = self.server.dispatch(line)
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serve requests from any number of clients, one thread per connection.
+    Objects are created on first use and kept, keyed by class, interface
+    name and constructor config: up to max_objects, least recently used
+    first out, and only until their interface is removed. Calls on the
+    same interface name are serialized with executor.interface_lock().
+    Raises OSError EADDRINUSE if another daemon serves path already.
+    """
+    daemon_threads = True
+
+    def __init__(self, path=SOCKET_PATH, max_objects=MAX_OBJECTS):
+        if os.path.exists(path):
+            if _serving(path):
+                raise OSError(errno.EADDRINUSE, f'ifmanaged already serves {path}')
+            # left behind by a daemon that died
+            os.remove(path)
+        self.path = path
+        self.max_objects = max_objects
+        self.objects = OrderedDict()
+        self._objects_lock = threading.Lock()
+        self._classes = None
+        super().__init__(path, _Handler)
+        # the daemon changes interfaces, only its owner may talk to it
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def get_object(self, cls: str, ifname: str, config: dict):
+        key = (cls, ifname, json.dumps(config, sort_keys=True))
+        with self._objects_lock:
+            obj = self.objects.get(key)
+            if obj is not None:
+                self.objects.move_to_end(key)
+                return obj
+            if self._classes is None:
+                self._classes = _classes()
+            if cls not in self._classes:
+                raise ValueError(f'Unknown class "{cls}"')
+            obj = self.objects[key] = self._classes[cls](ifname, **config)
+            while len(self.objects) > self.max_objects:
+                self.objects.popitem(last=False)
+            return obj
+
+    def forget(self, ifname: str):
+        """
+        Drop every object of an interface.
+        """
+        with self._objects_lock:
+            for key in [key for key in self.objects if key[1] == ifname]:
+                del self.objects[key]
+
+    def dispatch(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            method = request['method']
+            if method.startswith('_'):
+                raise AttributeError(f'{method} is not a public method')
+            with interface_lock(request['ifname']):
+                obj = self.get_object(request['class'], request['ifname'], decode(request.get('config') or {}))
+                func = getattr(obj, method)
+                if not callable(func):
+                    raise AttributeError(f'{method} is not a method')
+                try:
+                    result = func(*decode(request.get('args') or []), **decode(request.get('kwargs') or {}))
+                finally:
+                    # recreated cheaply if the interface is still there
+                    if method in REMOVING:
+                        self.forget(request['ifname'])
+            return {'result': encode(result)}
+        except Exception as e:
+            return {'error': {'type': type(e).__name__, 'errno': getattr(e, 'errno', None),
+                              'message': e.strerror if isinstance(e, OSError) and e.strerror else str(e)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='ifmanaged')
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    args = parser.parse_args()
+
+    server = Server(args.socket)
+    # shutdown() waits for serve_forever(), it can not run on the same thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,22 @@
+import errno
 import re
+import socket
 
 from ifmanage.interface import Interface
 
+# link settings of every NIC seen, {(ifname, ifindex): LinkSettings}; only
+# the supported link modes and the mask size are used from it
+_capabilities = {}
+
+
+def _ethtool():
+    from util.ethtool import get_ethtool
+    return get_ethtool()
+
 
 class Ethernet(Interface):
     def __init__(self, ifname, **kwargs):
-        if re.match("(lan|eth|eno|ens|enp|enx)[0-9]+$", ifname):
+        if not re.match(r'(lan|eth|eno|ens|enp)[0-9][0-9a-z]*$|enx[0-9a-f]{12}$', ifname):
             raise ValueError("The name of network card is not standard")
 
         default = {
@@ -27,3 +38,133 @@ class Ethernet(Interface):
         }
         default.update(kwargs)
         super().__init__(ifname,  **default)
+
+    def get_capabilities(self):
+        """
+        Return the LinkSettings the supported link modes are taken from,
+        read once per NIC.
+        """
+        key = (self.ifname, socket.if_nametoindex(self.ifname))
+        capabilities = _capabilities.get(key)
+        if capabilities is None:
+            capabilities = _capabilities[key] = _ethtool().get_link_settings(self.ifname)
+        return capabilities
+
+    def get_link_settings(self):
+        """
+        Return the current speed, duplex and autoneg state as an
+        util.ethtool.LinkSettings record.
+        """
+        return _ethtool().get_link_settings(self.ifname, self.get_capabilities().nwords)
+
+    def set_speed_duplex(self, speed, duplex) -> bool:
+        """
+        Negotiate the link if speed or duplex is 'auto', advertising every
+        supported mode, else force them. Nothing is changed if the link is
+        already set up that way or can not negotiate at all (as virtual
+        NICs). Returns True if the settings were changed.
+        """
+        current = self.get_link_settings()
+        if speed == 'auto' or duplex == 'auto':
+            if not current.can_autoneg or current.autoneg and current.advertising == current.supported:
+                return False
+            _ethtool().set_link_settings(self.ifname, autoneg=True, current=current)
+            return True
+
+        speed = int(speed)
+        modes = current.modes()
+        if modes and (speed, duplex) not in modes:
+            raise ValueError(f'{self.ifname} does not support {speed} Mb/s {duplex} duplex')
+        if not current.autoneg and (current.speed, current.duplex) == (speed, duplex):
+            return False
+        _ethtool().set_link_settings(self.ifname, speed, duplex, autoneg=False, current=current)
+        return True
+
+    def get_offload(self, name: str) -> bool:
+        return _ethtool().get_offload(self.ifname, name)
+
+    def set_offload(self, name: str, enable: bool) -> bool:
+        """
+        Enable/Disable an offload: gro, gso or tso. Returns True if it was
+        changed.
+        """
+        if self.get_offload(name) == bool(enable):
+            return False
+        _ethtool().set_offload(self.ifname, name, enable)
+        return True
+
+    def set_ring_buffer(self, rx=None, tx=None) -> bool:
+        """
+        Set the rx and/or tx ring size, up to the maximum the NIC reports.
+        Returns True if a size was changed.
+        """
+        ring = _ethtool().get_ring(self.ifname)
+        wanted = ring._replace(rx=ring.rx if rx is None else int(rx), tx=ring.tx if tx is None else int(tx))
+        if wanted.rx > ring.rx_max or wanted.tx > ring.tx_max:
+            raise ValueError(f'{self.ifname} rings hold at most rx {ring.rx_max} tx {ring.tx_max}')
+        if wanted == ring:
+            return False
+        _ethtool().set_ring(self.ifname, wanted)
+        return True
+
+    def set_channels(self, rx=None, tx=None, other=None, combined=None) -> bool:
+        """
+        Set the number of rx, tx, other and/or combined channels (queues).
+        Returns True if a count was changed.
+        """
+        channels = _ethtool().get_channels(self.ifname)
+        wanted = channels
+        for name, value in (('rx', rx), ('tx', tx), ('other', other), ('combined', combined)):
+            if value is None:
+                continue
+            if int(value) > getattr(channels, f'max_{name}'):
+                raise ValueError(f'{self.ifname} has at most {getattr(channels, f"max_{name}")} {name} channels')
+            wanted = wanted._replace(**{name: int(value)})
+        if wanted == channels:
+            return False
+        _ethtool().set_channels(self.ifname, wanted)
+        return True
+
+    def update_ethtool(self) -> list:
+        """
+        Apply the speed, duplex, offload, ring-buffer and channels config
+        keys, skipping settings that already match:
+
+            speed: 'auto' or Mb/s, duplex: 'auto', 'half' or 'full' (both
+                'auto' is skipped if the driver has no link settings)
+            offload: {'gro': True, 'gso': False, 'tso': True}
+            ring-buffer: {'rx': 4096, 'tx': 4096}
+            channels: {'combined': 8}
+
+        Returns the names of the settings that were changed.
+        """
+        config = self.config
+        changed = []
+        if 'speed' in config or 'duplex' in config:
+            speed, duplex = config.get('speed', 'auto'), config.get('duplex', 'auto')
+            try:
+                if self.set_speed_duplex(speed, duplex):
+                    changed.append('speed-duplex')
+            except OSError as e:
+                # negotiating is the default, nothing to do where the driver has no link settings
+                if e.errno != errno.EOPNOTSUPP or (speed, duplex) != ('auto', 'auto'):
+                    raise
+        for name, enable in config.get('offload', {}).items():
+            if self.set_offload(name, enable):
+                changed.append(f'offload {name}')
+        if 'ring-buffer' in config and self.set_ring_buffer(**config['ring-buffer']):
+            changed.append('ring-buffer')
+        if 'channels' in config and self.set_channels(**config['channels']):
+            changed.append('channels')
+        return changed
+
+    def apply(self, dry_run=False) -> list:
+        """
+        Converge the interface to its config dict, see Interface.apply().
+        ethtool settings are applied after the link changes, they are not
+        part of a dry run.
+        """
+        ops = super().apply(dry_run)
+        if not dry_run:
+            self.update_ethtool()
+        return ops
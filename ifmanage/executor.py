@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# operations running at the same time unless told otherwise
+MAX_WORKERS = 16
+# how often running operations are checked against their timeout
+POLL_INTERVAL = 0.05
+
+_locks = {}
+_locks_guard = threading.Lock()
+# guards results finishing while they are being timed out
+_result_lock = threading.Lock()
+
+
+def interface_lock(ifname: str) -> threading.RLock:
+    """
+    The process wide lock serializing operations on an interface.
+    """
+    with _locks_guard:
+        lock = _locks.get(ifname)
+        if lock is None:
+            lock = _locks[ifname] = threading.RLock()
+        return lock
+
+
+class Result(object):
+    """
+    Outcome of an operation on one interface: value is what the operation
+    returned, error the exception it raised (TimeoutError if it did not
+    finish in time), elapsed the seconds it ran for.
+    """
+
+    def __init__(self, interface):
+        self.interface = interface
+        self.ifname = getattr(interface, 'ifname', interface)
+        self.value = None
+        self.error = None
+        self.started = None
+        self.elapsed = None
+        self.timed_out = False
+
+    @property
+    def ok(self) -> bool:
+        return self.elapsed is not None and self.error is None
+
+    def __repr__(self):
+        state = 'pending' if self.elapsed is None else (self.error or 'ok')
+        return f'<Result {self.ifname}: {state}>'
+
+
+class Executor(object):
+    """
+    Run an operation on many interfaces at once, at most max_workers at a
+    time. Operations on the same interface name never overlap, whichever
+    Executor they come from.
+
+    usage:
+        with Executor(max_workers=32) as executor:
+            results = executor.run(interfaces, 'set_dhcp', True, timeout=30)
+        failed = [r for r in results if not r.ok]
+
+    A timed out operation is reported as failed right away, but a thread
+    can not be interrupted: it keeps its worker and the interface lock
+    until it really returns.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, timeout=None):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ifmanage')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def run(self, interfaces, operation, *args, timeout=None, **kwargs) -> list[Result]:
+        """
+        Call operation on every interface and return one Result per
+        interface, in order. operation is either the name of an Interface
+        method or a function taking the interface as first argument.
+        timeout (seconds per interface, counted from when the operation
+        holds the interface lock, waiting for it does not count) defaults
+        to the one given to the constructor.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        results = {}
+        for interface in interfaces:
+            result = Result(interface)
+            results[self._pool.submit(self._call, result, operation, args, kwargs)] = result
+
+        pending = set(results)
+        while pending:
+            if timeout is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            else:
+                done, pending = wait(pending, POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future in list(pending):
+                    result = results[future]
+                    if result.started is None or now - result.started <= timeout:
+                        continue
+                    with _result_lock:
+                        if result.elapsed is None:
+                            result.timed_out = True
+                            result.elapsed = now - result.started
+                            result.error = TimeoutError(f'{result.ifname}: operation did not finish in {timeout}s')
+                    pending.discard(future)
+
+        return list(results.values())
+
+    @staticmethod
+    def _call(result: Result, operation, args, kwargs):
+        with interface_lock(result.ifname):
+            # never timed out before it starts, but do not run what has been given up on
+            if result.timed_out:
+                return
+            result.started = time.monotonic()
+            try:
+                if isinstance(operation, str):
+                    value = getattr(result.interface, operation)(*args, **kwargs)
+                else:
+                    value = operation(result.interface, *args, **kwargs)
+            except Exception as e:
+                error = e
+                value = None
+            else:
+                error = None
+        with _result_lock:
+            # a result given up on has already been reported
+            if not result.timed_out:
+                result.value = value
+                result.error = error
+                result.elapsed = time.monotonic() - result.started
+
+
+def run(interfaces, operation, *args, max_workers=MAX_WORKERS, timeout=None, **kwargs) -> list[Result]:
+    """
+    Run operation on interfaces with a throwaway Executor, see
+    Executor.run().
+    """
+    executor = Executor(max_workers, timeout)
+    try:
+        return executor.run(interfaces, operation, *args, **kwargs)
+    finally:
+        # do not wait for operations that timed out
+        executor.shutdown(wait=False)
@@ -1,38 +1,164 @@
-import json
+import errno
 import os
 
-import jmespath
-
-from util.command import cmd, is_systemd_service_active, popen
-from util.template import render
-from util.validate import is_interface_addr_assigned
+from ifmanage.backend import get_backend
+from ifmanage.linktable import get_link_table
+from ifmanage.service import get_manager
+from util.validate import assert_mac, is_interface_addr_assigned
 from util.dictutil import dict_merge
 
+DHCP_CONFIG_BASE = '/var/lib/dhcp/dhcp-client'
+DHCPV6_CONFIG_DIR = '/run/dhcp6c'
+
+
+def _render(destination: str, template: str, content) -> bool:
+    # util.template (and hashlib) is only loaded once a DHCP client is configured
+    from util.template import render
+    return render(destination, template, content)
+
+
+def _remove_files(files):
+    for file in files:
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            # the client cleans up its own pid file on exit
+            pass
+
 
 class Interface(object):
-    def __init__(self, ifname, **kwargs):
+    def __init__(self, ifname, backend=None, services=None, **kwargs):
         self.config = kwargs
         self.config.setdefault("ifname", ifname)
         self.ifname = ifname
         self.info = {}
+        self._backend = backend
+        self._services = services
+
+    @property
+    def backend(self):
+        """
+        Backend executing link and address changes, either the one given
+        to the constructor or the process wide default.
+        """
+        return get_backend(self._backend)
+
+    @property
+    def services(self):
+        """
+        ServiceManager running the DHCP clients, either the one given to
+        the constructor or the process wide default.
+        """
+        return get_manager(self._services)
 
     def get_info(self) -> dict:
         return {}
 
     def exist(self) -> bool:
+        table = get_link_table()
+        if table.live:
+            return self.ifname in table
         return os.path.exists(f'/sys/class/net/{self.ifname}')
 
-    def create(self):
+    @staticmethod
+    def _by_backend(interfaces) -> dict:
+        groups = {}
+        for interface in interfaces:
+            groups.setdefault(interface.backend, []).append(interface)
+        return groups
+
+    @classmethod
+    def create_many(cls, interfaces, netns=None) -> list:
+        """
+        Create many interfaces with one kernel request (netlink) or one
+        'ip -batch' run (command) per backend, inside network namespace
+        netns if given, see Backend.create(). Every interface is attempted,
+        the result holds one OSError (or None on success) per interface.
+        """
+        interfaces = list(interfaces)
+        errors = [None] * len(interfaces)
+        positions = {id(interface): n for n, interface in enumerate(interfaces)}
+        for backend, group in cls._by_backend(interfaces).items():
+            ops = [('create', i.ifname, (i.config['type'], netns)) for i in group]
+            for interface, error in zip(group, backend.run_batch(ops)):
+                errors[positions[id(interface)]] = error
+        return errors
+
+    @classmethod
+    def remove_many(cls, interfaces) -> list:
+        """
+        Remove many interfaces, see remove(). DHCP clients are only looked
+        at for interfaces with client files left, all of them are stopped
+        together, then the interfaces are deleted with delete_many() of
+        their backend. Addresses are not flushed first, the kernel drops
+        them with the interface. Interfaces already gone are not an error.
+        The result holds one OSError (or None on success) per interface.
+        """
+        interfaces = [cls(i) if isinstance(i, str) else i for i in interfaces]
+        errors = cls._stop_dhcp_clients(interfaces)
+        positions = {id(interface): n for n, interface in enumerate(interfaces)}
+        for backend, group in cls._by_backend(interfaces).items():
+            for interface, error in zip(group, backend.delete_many([i.ifname for i in group])):
+                n = positions[id(interface)]
+                if error is not None and error.errno != errno.ENODEV and errors[n] is None:
+                    errors[n] = error
+        return errors
+
+    @staticmethod
+    def _stop_dhcp_clients(interfaces) -> list:
+        """
+        Stop the DHCP(v6) clients of many interfaces and remove their
+        files. Clients are only started after their config was rendered and
+        the files are removed when they are disabled, so interfaces without
+        any of them left are skipped without asking systemd. The files of a
+        client that failed to stop are kept for a retry. Returns one
+        OSError (or None) per interface.
+        """
+        errors = [None] * len(interfaces)
+        found = {}
+        for n, interface in enumerate(interfaces):
+            for unit, files in interface._dhcp_clients():
+                files = [f for f in files if os.path.isfile(f)]
+                if files:
+                    found.setdefault(interface.services, []).append((n, unit, files))
+
+        for services, clients in found.items():
+            states = services.active_states([unit for _, unit, _ in clients])
+            active = [(n, unit) for n, unit, _ in clients if states[unit] == 'active']
+            results = services.run_jobs([('stop', unit) for _, unit in active])
+            failed = set()
+            for (n, unit), error in zip(active, results):
+                if error is not None:
+                    failed.add((n, unit))
+                    if errors[n] is None:
+                        errors[n] = error
+            for n, unit, files in clients:
+                if (n, unit) not in failed:
+                    _remove_files(files)
+        return errors
+
+    def _dhcp_clients(self) -> list:
+        """
+        (systemd unit, files) of the DHCP and DHCPv6 client.
+        """
+        base = f'{DHCP_CONFIG_BASE}_{self.ifname}'
+        return [
+            (f'dhcp-client@{self.ifname}.service', [f'{base}.conf', f'{base}.options', f'{base}.pid', f'{base}.leases']),
+            (f'dhcp6c@{self.ifname}.service', [f'{DHCPV6_CONFIG_DIR}/dhcp6c.{self.ifname}.conf']),
+        ]
+
+    def create(self, netns=None):
         """
-       Create interface from operating system.
-       """
-        cmd('ip link add dev {ifname} type {type}'.format(**self.config))
+        Create interface from operating system, inside network namespace
+        netns if given.
+        """
+        self.backend.create(self.ifname, self.config['type'], netns)
 
     def delete(self):
         """
         Remove interface from operating system.
         """
-        cmd('ip link del dev {ifname}'.format(**self.config))
+        self.backend.delete(self.ifname)
 
     def remove(self):
         """
@@ -53,100 +179,79 @@ class Interface(object):
         """
         Flush all addresses from an interface, including DHCP.
         """
-        self.set_dhcp(False)
-        self.set_dhcpv6(False)
-        cmd(f'ip addr flush dev "{self.ifname}"')
+        error = self._stop_dhcp_clients([self])[0]
+        if error is not None:
+            raise error
+        self.backend.flush_addrs(self.ifname)
 
-    def set_dhcp(self, enable: bool):
+    def set_dhcp(self, enable: bool) -> bool:
         """
-        Enable/Disable DHCP client on a given interface.
+        Enable/Disable DHCP client on a given interface. The client is only
+        restarted when its configuration changed or it is not running.
+        Returns True if the client was (re)started or stopped.
         """
-        ifname = self.ifname
-        config_base = r'/var/lib/dhcp/dhcp-client'
-        config_file = f'{config_base}_{ifname}.conf'
-        options_file = f'{config_base}_{ifname}.options'
-        pid_file = f'{config_base}_{ifname}.pid'
-        lease_file = f'{config_base}_{ifname}.leases'
-        systemd_service = f'dhcp-client@{ifname}.service'
+        systemd_service, files = self._dhcp_clients()[0]
+        config_file, options_file = files[:2]
 
         if enable:
             with open('/etc/hostname', 'r') as f:
-                hostname = f.read().rsplit('\n')
+                hostname = f.read().strip()
                 self.info = dict_merge({'dhcp_options': {'host_name': hostname}}, self.info)
 
-            render(options_file, 'dhcp-client/daemon-options.j2', self.info)
-            render(config_file, 'dhcp-client/ipv4.j2', self.info)
-            cmd(f'systemctl restart {systemd_service}')
+            # both files must be rendered, | does not short-circuit
+            changed = _render(options_file, 'dhcp-client/daemon-options.j2', self.info) | \
+                _render(config_file, 'dhcp-client/ipv4.j2', self.info)
+            if not changed and self.services.is_active(systemd_service):
+                return False
+            self.services.restart(systemd_service)
+            return True
         else:
-            if is_systemd_service_active(systemd_service):
-                cmd(f'systemctl stop {systemd_service}')
+            stopped = self.services.is_active(systemd_service)
+            if stopped:
+                self.services.stop(systemd_service)
 
-            for file in [config_file, options_file, pid_file, lease_file]:
-                if os.path.isfile(file):
-                    os.remove(file)
+            _remove_files(files)
+            return stopped
 
-    def set_dhcpv6(self, enable: bool):
+    def set_dhcpv6(self, enable: bool) -> bool:
         """
-        Enable/Disable DHCPv6 client on a given interface.
+        Enable/Disable DHCPv6 client on a given interface, see set_dhcp().
         """
-        ifname = self.ifname
-        config_file = f"/run/dhcp6c/dhcp6c.{ifname}.conf"
-        systemd_service = f"dhcp6c@{ifname}.service"
+        systemd_service, (config_file,) = self._dhcp_clients()[1]
 
         if enable:
-            render(config_file, 'dhcp-client/ipv6.j2', self.info)
+            changed = _render(config_file, 'dhcp-client/ipv6.j2', self.info)
+            if not changed and self.services.is_active(systemd_service):
+                return False
             # We must ignore any return codes. This is required to enable
             # DHCPv6-PD for interfaces which are yet not up and running.
-            popen(f'systemctl restart {systemd_service}')
+            self.services.run_jobs([('restart', systemd_service)])
+            return True
         else:
-            if is_systemd_service_active(systemd_service):
-                cmd(f'systemctl stop {systemd_service}')
+            stopped = self.services.is_active(systemd_service)
+            if stopped:
+                self.services.stop(systemd_service)
 
-            if os.path.isfile(config_file):
-                os.remove(config_file)
+            _remove_files([config_file])
+            return stopped
 
     def set_mtu(self, mtu: int):
         """
         Set interface mtu value.
         """
-        cmd(f"ip link set {self.ifname} mtu {mtu}")
+        self.backend.set_mtu(self.ifname, mtu)
 
     def set_state(self, enable: bool):
-        cmd("ip link set dev {} {}".format(self.ifname, "up" if enable else "down"))
+        self.backend.set_state(self.ifname, enable)
 
     def set_alias(self, name: str):
         if not name:
             raise ValueError("Alias cannot be empty")
-        cmd(f'ip link set dev {self.ifname} alias "{name}')
+        self.backend.set_alias(self.ifname, name)
 
     def set_mac(self, mac: str):
-        split = mac.split(':')
-        size = len(split)
-
-        # a mac address consits out of 6 octets
-        if size != 6:
-            raise ValueError(f'wrong number of MAC octets ({size}): {mac}')
-
-        octets = []
-        try:
-            for octet in split:
-                octets.append(int(octet, 16))
-        except ValueError:
-            raise ValueError(f'invalid hex number "{octet}" in : {mac}')
-
-        # validate against the first mac address byte if it's a multicast
-        # address
-        if octets[0] & 1:
-            raise ValueError(f'{mac} is a multicast MAC address')
-
-        # overall mac address is not allowed to be 00:00:00:00:00:00
-        if sum(octets) == 0:
-            raise ValueError('00:00:00:00:00:00 is not a valid MAC address')
-
-        if octets[:5] == (0, 0, 94, 0, 1):
-            raise ValueError(f'{mac} is a VRRP MAC address')
-
-        cmd(f"ip link set dev {self.ifname} address {mac}")
+        assert_mac(mac)
+        self.backend.set_mac(self.ifname, mac)
 
     def add_addr(self, addr: str):
         """
@@ -160,7 +265,7 @@ class Interface(object):
         elif addr.lower() == 'dhcpv6':
             self.set_dhcpv6(True)
         elif not is_interface_addr_assigned(self.ifname, addr):
-            cmd(f"ip addr add {addr} dev {self.ifname}")
+            self.backend.add_addr(self.ifname, addr)
 
     def del_addr(self, addr: str):
         """
@@ -183,16 +288,36 @@ class Interface(object):
         elif addr.lower() == 'dhcpv6':
             self.set_dhcpv6(False)
         elif is_interface_addr_assigned(self.ifname, addr):
-            cmd(f'ip addr del {addr} dev {self.ifname}')
+            self.backend.del_addr(self.ifname, addr)
+
+    def apply(self, dry_run=False) -> list:
+        """
+        Converge the interface to its config dict, changing only what
+        differs from the current kernel state. See ifmanage.reconcile.
+        """
+        from ifmanage.reconcile import reconcile
+        return reconcile([self], self._backend, dry_run)
+
+    def get_link(self):
+        """
+        Return the Link record of this interface from the shared LinkTable
+        snapshot, raise OSError if it does not exist.
+        """
+        return get_link_table().lookup(self.ifname)
 
     def get_state(self) -> bool:
-        out = cmd(f"ip -json link show dev {self.ifname}")
-        return True if 'UP' in jmespath.search('[*].flags | [0]', json.loads(out)) else False
+        return self.get_link().up
 
     def get_alias(self) -> str:
-        out = cmd(f"ip -json -detail link list dev {self.ifname}")
-        return jmespath.search('[*].ifalias | [0]', json.loads(out)) or ''
+        return self.get_link().alias
 
     def get_mac(self) -> str:
-        out = cmd(f"ip -json -detail link list dev {self.ifname}")
-        return jmespath.search('[*].address | [0]', json.loads(out))
+        return self.get_link().address
+
+    def get_stats(self):
+        """
+        Return the interface counters as a stats.Stats record, read without
+        forking. See stats.StatsSampler for sampling every interface.
+        """
+        from ifmanage.stats import read_stats
+        return read_stats(self.ifname)
@@ -0,0 +1,96 @@
+import errno
+import time
+
+from ifmanage.backend import get_backend
+
+
+class LinkTable(object):
+    """
+    Snapshot of every link on the system, read with a single dump and
+    indexed by interface name and index. Lookups refresh the snapshot once
+    it is older than max_age seconds or a change was made through the
+    backend since it was taken.
+    """
+    # True for tables that are always current, see monitor.LinkCache
+    live = False
+
+    def __init__(self, backend=None, max_age=1.0):
+        self._backend = backend
+        self.max_age = max_age
+        self._by_name = {}
+        self._by_index = {}
+        self._stamp = None
+        self._generation = None
+
+    @property
+    def backend(self):
+        return get_backend(self._backend)
+
+    def refresh(self):
+        backend = self.backend
+        generation = backend.generation
+        links = backend.dump_links()
+        self._by_name = {link.ifname: link for link in links}
+        self._by_index = {link.ifindex: link for link in links}
+        self._generation = generation
+        self._stamp = time.monotonic()
+
+    def invalidate(self):
+        self._stamp = None
+
+    def is_stale(self) -> bool:
+        if self._stamp is None or self._generation != self.backend.generation:
+            return True
+        return time.monotonic() - self._stamp > self.max_age
+
+    def _links(self) -> dict:
+        if self.is_stale():
+            self.refresh()
+        return self._by_name
+
+    def get(self, ifname: str):
+        """
+        Return the Link record of an interface, None if it does not exist.
+        """
+        return self._links().get(ifname)
+
+    def by_index(self, ifindex: int):
+        if self.is_stale():
+            self.refresh()
+        return self._by_index.get(ifindex)
+
+    def lookup(self, ifname: str):
+        """
+        Like get() but raise OSError(ENODEV) for unknown interfaces.
+        """
+        link = self.get(ifname)
+        if link is None:
+            raise OSError(errno.ENODEV, f'Device "{ifname}" does not exist')
+        return link
+
+    def __contains__(self, ifname):
+        return ifname in self._links()
+
+    def __iter__(self):
+        return iter(list(self._links().values()))
+
+    def __len__(self):
+        return len(self._links())
+
+
+_link_table = None
+
+
+def get_link_table() -> LinkTable:
+    """
+    Return the process wide LinkTable used by Interface getters.
+    """
+    global _link_table
+    if _link_table is None:
+        _link_table = LinkTable()
+    return _link_table
+
+
+def set_link_table(table: LinkTable):
+    global _link_table
+    _link_table = table
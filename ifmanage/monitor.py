@@ -0,0 +1,187 @@
+import errno
+import logging
+import socket
+import threading
+import time
+
+from ifmanage.backend import parse_link
+from ifmanage.linktable import LinkTable, set_link_table
+from util import netlink as nl
+from util import validate
+
+LINK_NEW = 'link-new'
+LINK_DEL = 'link-del'
+ADDR_NEW = 'addr-new'
+ADDR_DEL = 'addr-del'
+
+GROUPS = nl.RTMGRP_LINK | nl.RTMGRP_IPV4_IFADDR | nl.RTMGRP_IPV6_IFADDR
+
+# max_age once the monitor thread died, lookups go back to dumping
+FALLBACK_MAX_AGE = 1.0
+
+log = logging.getLogger(__name__)
+
+
+class LinkCache(LinkTable):
+    """
+    LinkTable kept current by rtnetlink multicast notifications instead of
+    polling. After start() every lookup is served from memory.
+
+    Callbacks registered with subscribe() are called from the monitor
+    thread as callback(event, ifname, value), value being the new Link for
+    link events and the address in CIDR notation for address events. A
+    failing callback is logged and does not affect the others.
+
+    If the monitor thread fails the cache stops being live and behaves as
+    a plain LinkTable, refreshed from dumps.
+    """
+
+    def __init__(self):
+        super().__init__(max_age=float('inf'))
+        self.addrs = validate.AddressTable()
+        self._callbacks = []
+        self._events = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def live(self) -> bool:
+        return self._running
+
+    def start(self):
+        """
+        Subscribe to link and address notifications, load the initial
+        state and start the monitor thread.
+        """
+        if self._running:
+            return
+        # subscribe before dumping so no change can slip in between
+        self._events = nl.Netlink(groups=GROUPS)
+        self._events.sock.settimeout(0.5)
+        self.refresh()
+        self._running = True
+        self._thread = threading.Thread(target=self._monitor, name='ifmanage-linkcache', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+
+    def install(self):
+        """
+        Start the cache and make it the source for Interface getters and
+        util.validate.is_interface_addr_assigned.
+        """
+        self.start()
+        set_link_table(self)
+        validate.set_address_source(self)
+        return self
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self._callbacks.remove(callback)
+
+    def is_stale(self) -> bool:
+        return not self._running and super().is_stale()
+
+    def refresh(self):
+        # taken before dumping, a change made meanwhile makes it stale
+        generation = self.backend.generation
+        with nl.Netlink() as netlink:
+            links = [parse_link(p) for _, p in netlink.dump(nl.RTM_GETLINK, nl.IFINFOMSG.pack(0, 0, 0, 0, 0))]
+            addr_msgs = netlink.dump(nl.RTM_GETADDR, nl.IFADDRMSG.pack(0, 0, 0, 0, 0))
+
+        by_index = {link.ifindex: link for link in links}
+        addrs = validate.AddressTable()
+        for _, payload in addr_msgs:
+            ifindex, _, packed, prefixlen = nl.parse_addr_msg(payload)
+            if ifindex in by_index:
+                permanent = nl.parse_addr_flags(payload) & nl.IFA_F_PERMANENT
+                addrs.add(by_index[ifindex].ifname, packed, prefixlen, permanent)
+
+        self._by_name = {link.ifname: link for link in links}
+        self._by_index = by_index
+        self.addrs = addrs
+        self._generation = generation
+        self._stamp = time.monotonic()
+
+    def is_assigned(self, ifname: str, address: str) -> bool:
+        """
+        Check if an address, optionally with a prefix length, is assigned
+        to an interface.
+        """
+        return self.addrs.is_assigned(ifname, address)
+
+    def are_assigned(self, ifname: str, addresses) -> list:
+        return self.addrs.are_assigned(ifname, addresses)
+
+    def _notify(self, event, ifname, value):
+        for callback in list(self._callbacks):
+            try:
+                callback(event, ifname, value)
+            except Exception:
+                log.exception('link cache subscriber %r failed on %s %s', callback, event, ifname)
+
+    def _monitor(self):
+        try:
+            self._receive()
+        except Exception:
+            log.exception('link cache monitor failed, falling back to dumps')
+            self._running = False
+            self.max_age = FALLBACK_MAX_AGE
+            self.invalidate()
+
+    def _receive(self):
+        while self._running:
+            try:
+                data = self._events._recv()
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # notifications were dropped, start over from a fresh dump
+                    self.refresh()
+                    continue
+                if not self._running:
+                    break
+                raise
+
+            for msg_type, _, _, payload in nl.iter_msgs(data):
+                self._handle(msg_type, bytes(payload))
+
+    def _handle(self, msg_type, payload):
+        if msg_type == nl.RTM_NEWLINK:
+            link = parse_link(payload)
+            old = self._by_index.get(link.ifindex)
+            if old is not None and old.ifname != link.ifname:
+                self._by_name.pop(old.ifname, None)
+                self.addrs.rename(old.ifname, link.ifname)
+            self._by_name[link.ifname] = link
+            self._by_index[link.ifindex] = link
+            self._notify(LINK_NEW, link.ifname, link)
+        elif msg_type == nl.RTM_DELLINK:
+            link = parse_link(payload)
+            self._by_index.pop(link.ifindex, None)
+            self._by_name.pop(link.ifname, None)
+            self.addrs.pop(link.ifname)
+            self._notify(LINK_DEL, link.ifname, link)
+        elif msg_type in (nl.RTM_NEWADDR, nl.RTM_DELADDR):
+            ifindex, family, packed, prefixlen = nl.parse_addr_msg(payload)
+            link = self._by_index.get(ifindex)
+            if link is None:
+                return
+            if msg_type == nl.RTM_NEWADDR:
+                permanent = nl.parse_addr_flags(payload) & nl.IFA_F_PERMANENT
+                self.addrs.add(link.ifname, packed, prefixlen, permanent)
+                event = ADDR_NEW
+            else:
+                self.addrs.discard(link.ifname, packed, prefixlen)
+                event = ADDR_DEL
+            self._notify(event, link.ifname, f'{socket.inet_ntop(family, packed)}/{prefixlen}')
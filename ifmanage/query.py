@@ -0,0 +1,99 @@
+"""
+Read-only interface queries for short lived processes such as udev hooks.
+Everything is read from sysfs and only errno, os and sys are imported, so
+starting it takes a fraction of importing ifmanage.interface.
+
+usage: python -m ifmanage.query exists IFNAME
+       python -m ifmanage.query show IFNAME
+       python -m ifmanage.query list
+"""
+import errno
+import os
+import sys
+
+SYSFS_NET = '/sys/class/net'
+IFF_UP = 0x1
+
+
+def _valid(ifname: str) -> bool:
+    # anything else would name a path outside SYSFS_NET or the directory itself
+    return bool(ifname) and '/' not in ifname and ifname not in ('.', '..')
+
+
+def _read(ifname: str, attr: str) -> str:
+    if not _valid(ifname):
+        raise ValueError(f'Invalid interface name "{ifname}"')
+    try:
+        with open(f'{SYSFS_NET}/{ifname}/{attr}') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise OSError(errno.ENODEV, f'Device "{ifname}" does not exist') from None
+
+
+def interfaces() -> list:
+    return sorted(os.listdir(SYSFS_NET))
+
+
+def exists(ifname: str) -> bool:
+    return _valid(ifname) and os.path.exists(f'{SYSFS_NET}/{ifname}')
+
+
+def get_ifindex(ifname: str) -> int:
+    return int(_read(ifname, 'ifindex'))
+
+
+def get_state(ifname: str) -> bool:
+    """
+    True if the interface is administratively up.
+    """
+    return bool(int(_read(ifname, 'flags'), 16) & IFF_UP)
+
+
+def get_operstate(ifname: str) -> str:
+    return _read(ifname, 'operstate').upper()
+
+
+def get_mtu(ifname: str) -> int:
+    return int(_read(ifname, 'mtu'))
+
+
+def get_mac(ifname: str) -> str:
+    return _read(ifname, 'address')
+
+
+def get_alias(ifname: str) -> str:
+    return _read(ifname, 'ifalias')
+
+
+def show(ifname: str) -> dict:
+    return {
+        'ifindex': get_ifindex(ifname),
+        'ifname': ifname,
+        'up': get_state(ifname),
+        'mtu': get_mtu(ifname),
+        'address': get_mac(ifname),
+        'alias': get_alias(ifname),
+        'operstate': get_operstate(ifname),
+    }
+
+
+def main(argv) -> int:
+    if argv[:1] == ['list'] and len(argv) == 1:
+        print('\n'.join(interfaces()))
+        return 0
+    if len(argv) == 2 and argv[0] == 'exists':
+        return 0 if exists(argv[1]) else 1
+    if len(argv) == 2 and argv[0] == 'show':
+        try:
+            info = show(argv[1])
+        except (OSError, ValueError) as e:
+            print(e.strerror if isinstance(e, OSError) else e, file=sys.stderr)
+            return 1
+        print('\n'.join(f'{key}={value}' for key, value in info.items()))
+        return 0
+    print(__doc__.strip(), file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
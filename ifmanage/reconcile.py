@@ -0,0 +1,139 @@
+import errno
+import os
+import socket
+
+from ifmanage.backend import get_backend, parse_addr
+from ifmanage.batch import Batch, Operation
+from ifmanage.linktable import LinkTable
+from util.validate import AddressTable
+
+
+def dhcp_enabled(interface) -> bool:
+    """
+    True if the DHCP client of interface is configured, that is its config
+    file (see Interface.set_dhcp) exists.
+    """
+    _, files = interface._dhcp_clients()[0]
+    return os.path.isfile(files[0])
+
+
+def dhcpv6_enabled(interface) -> bool:
+    _, files = interface._dhcp_clients()[1]
+    return os.path.isfile(files[0])
+
+
+def _is_link_local(packed: bytes, prefixlen: int) -> bool:
+    return len(packed) == 16 and packed[0] == 0xfe and packed[1] & 0xc0 == 0x80
+
+
+def diff(interface, link, assigned: set, dynamic=frozenset()) -> list:
+    """
+    Compare the config dict of an interface with its current state and
+    return the Operations needed to converge. Keys missing from the config
+    are left alone, except the admin state which follows 'disable'.
+
+    Recognized keys: mtu, mac, description (interface alias), disable and
+    address (list of addresses in CIDR notation, 'dhcp' or 'dhcpv6').
+    Addresses in dynamic (leases, SLAAC) are never deleted, nor are any
+    IPv4/IPv6 addresses while dhcp/dhcpv6 is configured for that family.
+    """
+    config = interface.config
+    ifname = interface.ifname
+    ops = []
+
+    if 'mtu' in config and int(config['mtu']) != link.mtu:
+        ops.append(Operation('set_mtu', ifname, int(config['mtu'])))
+
+    if 'mac' in config and config['mac'].lower() != link.address:
+        ops.append(Operation('set_mac', ifname, config['mac']))
+
+    if 'description' in config and config['description'] != link.alias:
+        ops.append(Operation('set_alias', ifname, config['description']))
+
+    if 'address' in config:
+        wanted = config['address']
+        wanted = [wanted] if isinstance(wanted, str) else wanted
+
+        lowered = [a.lower() for a in wanted]
+        # families whose extra addresses belong to a DHCP client
+        leased = {4} if 'dhcp' in lowered else set()
+        if 'dhcpv6' in lowered:
+            leased.add(16)
+
+        static = {}
+        for addr in wanted:
+            if addr.lower() not in ('dhcp', 'dhcpv6'):
+                _, packed, prefixlen = parse_addr(addr)
+                static[(packed, prefixlen)] = addr
+
+        for key, addr in static.items():
+            if key not in assigned:
+                ops.append(Operation('add_addr', ifname, addr))
+
+        for packed, prefixlen in assigned:
+            # link-local addresses are managed by the kernel
+            if (packed, prefixlen) in static or _is_link_local(packed, prefixlen):
+                continue
+            if (packed, prefixlen) in dynamic or len(packed) in leased:
+                continue
+            family = socket.AF_INET if len(packed) == 4 else socket.AF_INET6
+            ops.append(Operation('del_addr', ifname, f'{socket.inet_ntop(family, packed)}/{prefixlen}'))
+
+        if ('dhcp' in lowered) != dhcp_enabled(interface):
+            ops.append(Operation('set_dhcp', ifname, 'dhcp' in lowered))
+        if ('dhcpv6' in lowered) != dhcpv6_enabled(interface):
+            ops.append(Operation('set_dhcpv6', ifname, 'dhcpv6' in lowered))
+
+    enable = not config.get('disable')
+    if enable != link.up:
+        ops.append(Operation('set_state', ifname, enable))
+
+    return ops
+
+
+def reconcile(interfaces, backend=None, dry_run=False) -> list:
+    """
+    Bring many interfaces in line with their config dicts. Kernel state is
+    read with one link and one address dump, only the differences are
+    written: link and address changes in a single Batch, DHCP clients
+    through the interface. Returns the list of Operations, which is empty
+    when everything was already up to date. With dry_run nothing is
+    written.
+    """
+    backend = get_backend(backend)
+    links = LinkTable(backend)
+    links.refresh()
+    addrs = AddressTable()
+    addrs.refresh()
+
+    by_name = {}
+    ops = []
+    for interface in interfaces:
+        by_name[interface.ifname] = interface
+        link = links.get(interface.ifname)
+        if link is None:
+            missing = Operation('reconcile', interface.ifname)
+            missing.applied = True
+            missing.error = OSError(errno.ENODEV, f'Device "{interface.ifname}" does not exist')
+            ops.append(missing)
+            continue
+        ops.extend(diff(interface, link, addrs.get(interface.ifname), addrs.dynamic(interface.ifname)))
+
+    if dry_run:
+        return ops
+
+    batch = Batch(backend)
+    for op in ops:
+        if not op.applied and op.op not in ('set_dhcp', 'set_dhcpv6'):
+            batch.operations.append(op)
+    batch.apply()
+
+    for op in ops:
+        if op.op in ('set_dhcp', 'set_dhcpv6'):
+            try:
+                getattr(by_name[op.ifname], op.op)(*op.args)
+            except OSError as e:
+                op.error = e
+            op.applied = True
+
+    return ops
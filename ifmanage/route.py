@@ -0,0 +1,196 @@
+"""
+Static routes and permanent neighbour entries, kept in sync with a desired
+table: the current state is read with one dump, compared in memory and
+only the difference is sent, as a single batch.
+
+    table = RouteTable()
+    table.apply(routes=[route('default', '203.0.113.1'), route('198.51.100.0/24', ifname='eth1')],
+                metrics={'eth1': 100})
+"""
+import socket
+
+from ifmanage.backend import Neighbor, Route, get_backend
+from ifmanage.batch import Batch, Operation
+from util import netlink as nl
+
+# metric the kernel gives a route added without one
+DEFAULT_METRICS = {socket.AF_INET: 0, socket.AF_INET6: 1024}
+
+
+def _family(address: str) -> int:
+    return socket.AF_INET6 if ':' in address else socket.AF_INET
+
+
+def normalize_prefix(dst: str, family=None) -> str:
+    """
+    Return a prefix in the form the dumps use: host bits cleared, an
+    explicit length and 'default' spelled out as 0.0.0.0/0 or ::/0.
+    """
+    if dst == 'default':
+        return '::/0' if family == socket.AF_INET6 else '0.0.0.0/0'
+    address, _, length = dst.partition('/')
+    family = _family(address)
+    packed = socket.inet_pton(family, address)
+    bits = len(packed) * 8
+    prefixlen = int(length) if length else bits
+    if not 0 <= prefixlen <= bits:
+        raise ValueError(f'Invalid prefix "{dst}"')
+    if prefixlen < bits:
+        value = int.from_bytes(packed, 'big') & ~((1 << (bits - prefixlen)) - 1)
+        packed = value.to_bytes(len(packed), 'big')
+    return f'{socket.inet_ntop(family, packed)}/{prefixlen}'
+
+
+def route(dst: str, gateway=None, ifname=None, metric=None, table=nl.RT_TABLE_MAIN,
+          protocol=nl.RTPROT_STATIC, family=None) -> Route:
+    """
+    Build a normalized Route. A route needs a gateway, an interface or
+    both; metric None is filled in by RouteTable.diff(). A default route
+    takes its family (AF_INET or AF_INET6) from the gateway, without one
+    family must be given.
+    """
+    if not gateway and not ifname:
+        raise ValueError(f'Route to {dst} needs a gateway or an interface')
+    if dst == 'default' and family is None:
+        if not gateway:
+            raise ValueError('Default route without a gateway needs a family')
+        family = _family(gateway)
+    dst = normalize_prefix(dst, family)
+    if family is not None and _family(dst) != family:
+        raise ValueError(f'{dst} does not match the family given')
+    family = _family(dst)
+    if gateway:
+        if _family(gateway) != family:
+            raise ValueError(f'Gateway {gateway} does not match the family of {dst}')
+        gateway = socket.inet_ntop(family, socket.inet_pton(family, gateway))
+    return Route(dst, gateway, ifname, metric, table, protocol)
+
+
+def neighbor(ifname: str, address: str, lladdr: str) -> Neighbor:
+    """
+    Build a normalized permanent Neighbor.
+    """
+    family = _family(address)
+    address = socket.inet_ntop(family, socket.inet_pton(family, address))
+    return Neighbor(ifname, address, lladdr.lower(), nl.NUD_PERMANENT)
+
+
+class RouteTable(object):
+    """
+    In-memory copy of the routes of one table and protocol, and of the
+    permanent neighbour entries. Routes of other tables or protocols (the
+    kernel's own, DHCP's) are never touched.
+
+    Routes are keyed by (table, dst, metric) as in the kernel, so the same
+    prefix may exist once per metric.
+    """
+
+    def __init__(self, backend=None, table=nl.RT_TABLE_MAIN, protocol=nl.RTPROT_STATIC):
+        self.backend = get_backend(backend)
+        self.table = table
+        self.protocol = protocol
+        self.routes = {}
+        self.neighbors = {}
+        self.loaded = False
+
+    def refresh(self):
+        """
+        Reload the routes and neighbours from the kernel.
+        """
+        self.routes = {r.key: r for r in self.backend.dump_routes()
+                       if r.table == self.table and r.protocol == self.protocol}
+        self.neighbors = {(n.ifname, n.address): n for n in self.backend.dump_neighbors()
+                          if n.state & nl.NUD_PERMANENT}
+        self.loaded = True
+
+    def _desired_routes(self, routes, metrics: dict) -> dict:
+        desired = {}
+        for r in routes:
+            if not isinstance(r, Route):
+                r = route(*r)
+            if r.metric is None:
+                metric = metrics.get(r.ifname)
+                if metric is None:
+                    metric = DEFAULT_METRICS[_family(r.dst)]
+                r = r._replace(metric=int(metric))
+            r = r._replace(table=self.table, protocol=self.protocol)
+            if r.key in desired:
+                raise ValueError(f'Route to {r.dst} with metric {r.metric} given twice')
+            desired[r.key] = r
+        return desired
+
+    def diff(self, routes=None, neighbors=None, metrics=None) -> list:
+        """
+        Return the Operations turning the current state into the desired
+        one, deletions first.
+
+        routes: Route records (see route()) or argument tuples for it, the
+        whole content of the table; None leaves the routes alone.
+        neighbors: {ifname: [(address, lladdr)]}, the permanent entries of
+        each interface given; other interfaces are left alone.
+        metrics: {ifname: metric} for routes without one naming their
+        interface, else the kernel default (0 for IPv4, 1024 for IPv6).
+        """
+        if not self.loaded:
+            self.refresh()
+        deletes = []
+        replaces = []
+
+        if routes is not None:
+            desired = self._desired_routes(routes, metrics or {})
+            for key, current in self.routes.items():
+                if key not in desired:
+                    deletes.append(Operation('del_route', current.ifname, current.dst, current.gateway,
+                                             current.metric, current.table, current.protocol))
+            for key, wanted in desired.items():
+                current = self.routes.get(key)
+                # a route given by gateway only is fine with any interface
+                if current is not None and current.gateway == wanted.gateway and \
+                        wanted.ifname in (None, current.ifname):
+                    continue
+                replaces.append(Operation('replace_route', wanted.ifname, wanted.dst, wanted.gateway,
+                                          wanted.metric, wanted.table, wanted.protocol))
+
+        if neighbors is not None:
+            desired = {}
+            for ifname, entries in neighbors.items():
+                for address, lladdr in entries:
+                    n = neighbor(ifname, address, lladdr)
+                    desired[(n.ifname, n.address)] = n
+            for key, current in self.neighbors.items():
+                if current.ifname in neighbors and key not in desired:
+                    deletes.append(Operation('del_neigh', current.ifname, current.address))
+            for key, wanted in desired.items():
+                current = self.neighbors.get(key)
+                if current is None or current.lladdr != wanted.lladdr:
+                    replaces.append(Operation('replace_neigh', wanted.ifname, wanted.address, wanted.lladdr))
+
+        return deletes + replaces
+
+    def apply(self, routes=None, neighbors=None, metrics=None, dry_run=False) -> list:
+        """
+        Converge to the desired state, see diff(), in one batch. Every
+        operation is attempted and carries its own error. The in-memory
+        table follows the successful operations, no dump is repeated.
+        """
+        ops = self.diff(routes, neighbors, metrics)
+        if dry_run or not ops:
+            return ops
+        batch = Batch(self.backend)
+        batch.extend(ops)
+        batch.apply()
+        for op in ops:
+            if op.error:
+                continue
+            if op.op in ('replace_route', 'del_route'):
+                r = Route(op.args[0], op.args[1], op.ifname, *op.args[2:])
+                if op.op == 'del_route':
+                    self.routes.pop(r.key, None)
+                else:
+                    self.routes[r.key] = r
+            elif op.op == 'del_neigh':
+                self.neighbors.pop((op.ifname, op.args[0]), None)
+            else:
+                self.neighbors[(op.ifname, op.args[0])] = Neighbor(op.ifname, op.args[0], op.args[1],
+                                                                   nl.NUD_PERMANENT)
+        return ops
@@ -0,0 +1,364 @@
+import heapq
+import re
+import time
+
+# Define auth key mgmt types.
+WPA_PSK = 'WPA-PSK'
+WPA2_PSK = 'WPA2-PSK'
+WPA_EAP = 'WPA-EAP'
+WPA2_EAP = 'WPA2-EAP'
+
+# BSS flag bits, parsed from the wpa_supplicant flags column
+FLAG_WPA_PSK = 0x01
+FLAG_WPA2_PSK = 0x02
+FLAG_WPA_EAP = 0x04
+FLAG_WPA2_EAP = 0x08
+FLAG_SAE = 0x10
+FLAG_OWE = 0x20
+FLAG_WEP = 0x40
+FLAG_ESS = 0x80
+
+# akm name for each flag bit, weakest first: Profile.akm[-1] is the strongest
+AKMS = ((FLAG_WPA_PSK, WPA_PSK), (FLAG_WPA2_PSK, WPA2_PSK), (FLAG_WPA_EAP, WPA_EAP), (FLAG_WPA2_EAP, WPA2_EAP))
+
+BAND_2G = '2.4GHz'
+BAND_5G = '5GHz'
+BAND_6G = '6GHz'
+
+SECURITY_OPEN = 'open'
+SECURITY_WEP = 'wep'
+SECURITY_PSK = 'psk'
+SECURITY_SAE = 'sae'
+SECURITY_EAP = 'eap'
+
+_flag_cache = {}
+
+_BSS_INDEX_RE = re.compile(rb'^id=(\d+)\nupdate_idx=(\d+)\n', re.M)
+
+
+def parse_flags(flags: str) -> int:
+    """
+    Turn a flags column like '[WPA2-PSK-CCMP][ESS]' into a bitmask. Only a
+    handful of distinct flag strings show up in practice, so results are
+    memoized.
+    """
+    mask = _flag_cache.get(flags)
+    if mask is None:
+        mask = 0
+        if 'WPA-PSK' in flags:
+            mask |= FLAG_WPA_PSK
+        if 'WPA2-PSK' in flags or 'RSN-PSK' in flags:
+            mask |= FLAG_WPA2_PSK
+        if 'WPA-EAP' in flags:
+            mask |= FLAG_WPA_EAP
+        if 'WPA2-EAP' in flags or 'RSN-EAP' in flags:
+            mask |= FLAG_WPA2_EAP
+        if 'SAE' in flags:
+            mask |= FLAG_SAE
+        if 'OWE' in flags:
+            mask |= FLAG_OWE
+        if 'WEP' in flags:
+            mask |= FLAG_WEP
+        if 'ESS' in flags:
+            mask |= FLAG_ESS
+        _flag_cache[flags] = mask
+    return mask
+
+
+def band(freq: int):
+    if 2412 <= freq <= 2484:
+        return BAND_2G
+    if 4915 <= freq <= 5825:
+        return BAND_5G
+    if 5925 <= freq <= 7125:
+        return BAND_6G
+    return None
+
+
+def security(flags: int) -> str:
+    if flags & (FLAG_WPA_EAP | FLAG_WPA2_EAP):
+        return SECURITY_EAP
+    if flags & FLAG_SAE:
+        return SECURITY_SAE
+    if flags & (FLAG_WPA_PSK | FLAG_WPA2_PSK):
+        return SECURITY_PSK
+    if flags & FLAG_WEP:
+        return SECURITY_WEP
+    return SECURITY_OPEN
+
+
+def iter_scan_results(reply: bytes):
+    """
+    Yield (bssid, frequency, signal, flags, ssid) for every line of a
+    SCAN_RESULTS reply. Lines are cut out of the raw reply and only the
+    returned fields get decoded, a truncated last line is skipped.
+    """
+    # the first line is the 'bssid / frequency / signal level / flags / ssid' header
+    for line in reply.split(b'\n')[1:]:
+        values = line.split(b'\t', 4)
+        if len(values) != 5:
+            continue
+        yield values[0].decode('ascii'), int(values[1]), int(values[2]), values[3].decode('ascii'), \
+            values[4].decode('utf-8', 'replace')
+
+
+def parse_bss(reply: bytes):
+    """
+    Parse a 'BSS RANGE=' reply requested with the DELIM mask bit into a list
+    of {field: value} dicts, values are left as bytes. The second value is
+    True if the reply ends with the last BSS wpa_supplicant knows about,
+    which it marks with '####' instead of '===='.
+    """
+    done = reply.endswith(b'####\n')
+    entries = []
+    for block in reply.replace(b'####\n', b'====\n').split(b'====\n'):
+        if block:
+            entries.append(dict(line.split(b'=', 1) for line in block.split(b'\n') if line))
+    return entries, done
+
+
+def parse_bss_index(reply: bytes):
+    """
+    Like parse_bss() for replies carrying only the id and update_idx
+    fields, returns a list of (id, update_idx) tuples instead of dicts.
+    """
+    return [(int(i), int(idx)) for i, idx in _BSS_INDEX_RE.findall(reply)], reply.endswith(b'####\n')
+
+
+class BSS(object):
+    """
+    A single scanned access point. id, update_idx and seen (monotonic time
+    it was last seen by wpa_supplicant) are only known for entries read
+    with the BSS command.
+    """
+    __slots__ = ('bssid', 'freq', 'signal', 'flags', 'ssid', 'id', 'update_idx', 'seen')
+
+    def __init__(self, bssid: str, freq: int, signal: int, flags: int, ssid: str, id=None, update_idx=None,
+                 seen=None):
+        self.bssid = bssid
+        self.freq = freq
+        self.signal = signal
+        self.flags = flags
+        self.ssid = ssid
+        self.id = id
+        self.update_idx = update_idx
+        self.seen = seen
+
+    @classmethod
+    def from_fields(cls, fields: dict, now: float, old=None) -> 'BSS':
+        """
+        Build an entry from a parse_bss() dict. bssid and ssid never change
+        for a BSS id, so they are taken from old if given.
+        """
+        return cls(old.bssid if old else fields[b'bssid'].decode('ascii'),
+                   int(fields[b'freq']), int(fields[b'level']), parse_flags(fields[b'flags'].decode('ascii')),
+                   old.ssid if old else fields[b'ssid'].decode('utf-8', 'replace'),
+                   int(fields[b'id']), int(fields[b'update_idx']), now - int(fields[b'age']))
+
+    @property
+    def band(self):
+        return band(self.freq)
+
+    @property
+    def security(self) -> str:
+        return security(self.flags)
+
+    def same_state(self, other: 'BSS') -> bool:
+        return (self.freq, self.signal, self.flags) == (other.freq, other.signal, other.flags)
+
+    def __repr__(self):
+        return f'<BSS {self.bssid} {self.ssid!r} {self.freq}MHz {self.signal}dBm>'
+
+
+class ScanTable(object):
+    """
+    Every BSS of a scan, indexed by BSSID, SSID, band and security type.
+    """
+
+    def __init__(self, entries=()):
+        self._by_bssid = {}
+        self._by_id = {}
+        self._by_ssid = {}
+        self._by_band = {}
+        self._by_security = {}
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def from_reply(cls, reply) -> 'ScanTable':
+        """
+        Build a table from a SCAN_RESULTS reply (bytes or str).
+        """
+        if isinstance(reply, str):
+            reply = reply.encode('utf-8')
+        table = cls()
+        for bssid, freq, signal, flags, ssid in iter_scan_results(reply):
+            table.add(BSS(bssid, freq, signal, parse_flags(flags), ssid))
+        return table
+
+    def add(self, entry: BSS):
+        bssid = entry.bssid
+        if bssid in self._by_bssid:
+            self.remove(bssid)
+        self._by_bssid[bssid] = entry
+        if entry.id is not None:
+            self._by_id[entry.id] = entry
+        for index, key in ((self._by_ssid, entry.ssid), (self._by_band, band(entry.freq)),
+                           (self._by_security, security(entry.flags))):
+            bucket = index.get(key)
+            if bucket is None:
+                index[key] = {bssid: entry}
+            else:
+                bucket[bssid] = entry
+
+    def remove(self, bssid: str):
+        entry = self._by_bssid.pop(bssid, None)
+        if entry is None:
+            return None
+        if entry.id is not None:
+            del self._by_id[entry.id]
+        for index, key in ((self._by_ssid, entry.ssid), (self._by_band, entry.band),
+                           (self._by_security, entry.security)):
+            bucket = index[key]
+            del bucket[bssid]
+            if not bucket:
+                del index[key]
+        return entry
+
+    def __len__(self):
+        return len(self._by_bssid)
+
+    def __iter__(self):
+        return iter(list(self._by_bssid.values()))
+
+    def __contains__(self, bssid):
+        return bssid in self._by_bssid
+
+    def get(self, bssid: str):
+        return self._by_bssid.get(bssid)
+
+    def by_id(self, id: int):
+        return self._by_id.get(id)
+
+    def expire(self, ttl: float, now=None) -> list:
+        """
+        Remove and return the entries not seen for more than ttl seconds.
+        """
+        deadline = (time.monotonic() if now is None else now) - ttl
+        return [self.remove(e.bssid) for e in list(self._by_bssid.values())
+                if e.seen is not None and e.seen < deadline]
+
+    def ssids(self) -> list:
+        return list(self._by_ssid)
+
+    def by_ssid(self, ssid: str) -> list:
+        return list(self._by_ssid.get(ssid, {}).values())
+
+    def by_band(self, name: str) -> list:
+        return list(self._by_band.get(name, {}).values())
+
+    def by_security(self, name: str) -> list:
+        return list(self._by_security.get(name, {}).values())
+
+    def top(self, n: int, ssid=None, band=None, security=None) -> list:
+        """
+        Return the n strongest BSSes, optionally limited to an SSID, band
+        and/or security type.
+        """
+        candidates = self._by_bssid
+        for index, key in ((self._by_ssid, ssid), (self._by_band, band), (self._by_security, security)):
+            if key is not None:
+                bucket = index.get(key, {})
+                if len(bucket) < len(candidates):
+                    candidates = bucket
+
+        entries = candidates.values()
+        if ssid is not None or band is not None or security is not None:
+            entries = [e for e in entries if (ssid is None or e.ssid == ssid) and
+                       (band is None or e.band == band) and (security is None or e.security == security)]
+        return heapq.nlargest(n, entries, key=lambda e: e.signal)
+
+    def profiles(self) -> list:
+        """
+        One Profile view per SSID.
+        """
+        return [Profile(table=self, ssid=ssid) for ssid in self._by_ssid]
+
+
+class ScanDiff(object):
+    """
+    What an incremental scan changed in a ScanTable: added and changed hold
+    the new entries, removed the dropped ones.
+    """
+
+    def __init__(self, table: ScanTable):
+        self.table = table
+        self.added = []
+        self.removed = []
+        self.changed = []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return f'<ScanDiff +{len(self.added)} -{len(self.removed)} ~{len(self.changed)}>'
+
+
+class Profile(object):
+    """
+    A network as seen by the user: all BSSes sharing an SSID. Profiles
+    returned by a scan are views over the ScanTable and read the per-BSS
+    data lazily. Profiles can also be built by hand from keyword arguments
+    (ssid, RSSI, frequency, akm) to add networks that were not scanned.
+    """
+
+    def __init__(self, table=None, **kwargs):
+        self._table = table
+        self._ssid = kwargs["ssid"]
+        self._rssi = kwargs.get("RSSI")
+        self._frequency = kwargs.get("frequency")
+        self._akm = kwargs.get("akm")
+        self._password = ""
+
+    @property
+    def ssid(self) -> str:
+        return self._ssid
+
+    @property
+    def bss(self) -> list:
+        return self._table.by_ssid(self._ssid) if self._table is not None else []
+
+    @property
+    def RSSI(self) -> int:
+        if self._rssi is None and self._table is not None:
+            # None once every BSS of the SSID left the table
+            return max((e.signal for e in self.bss), default=None)
+        return self._rssi
+
+    @property
+    def frequency(self) -> list:
+        if self._frequency is None and self._table is not None:
+            bands = {e.band for e in self.bss}
+            return [b for b in (BAND_2G, BAND_5G, BAND_6G) if b in bands]
+        return self._frequency
+
+    @frequency.setter
+    def frequency(self, freq: list):
+        self._frequency = freq
+
+    @property
+    def akm(self) -> list:
+        if self._akm is None and self._table is not None:
+            flags = 0
+            for e in self.bss:
+                flags |= e.flags
+            return [name for bit, name in AKMS if flags & bit]
+        return self._akm
+
+    @property
+    def password(self) -> str:
+        return self._password
+
+    @password.setter
+    def password(self, pwd: str):
+        self._password = pwd
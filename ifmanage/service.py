@@ -0,0 +1,326 @@
+import collections
+import os
+import threading
+import time
+
+from util import dbus
+from util.command import popen
+
+SYSTEMD = 'org.freedesktop.systemd1'
+SYSTEMD_PATH = '/org/freedesktop/systemd1'
+MANAGER_INTERFACE = 'org.freedesktop.systemd1.Manager'
+UNIT_INTERFACE = 'org.freedesktop.systemd1.Unit'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+NO_SUCH_UNIT = 'org.freedesktop.systemd1.NoSuchUnit'
+
+SYSTEM_BUS_SOCKET = '/run/dbus/system_bus_socket'
+
+ACTIONS = ('start', 'stop', 'restart', 'try-restart', 'reload')
+# systemd's default start timeout
+JOB_TIMEOUT = 90.0
+# results of finished jobs kept until their caller collects them
+FINISHED_JOBS = 1024
+
+
+class ServiceManager(object):
+    """
+    Starts and stops systemd units. Subclasses implement _run_jobs() and
+    active_states().
+    """
+    name = None
+
+    def run_jobs(self, jobs, timeout=JOB_TIMEOUT) -> list:
+        """
+        Run many (action, unit) jobs together and wait for all of them to
+        finish. Every job is attempted, jobs on the same unit run in the
+        given order. The result holds one OSError (or None on success) per
+        job in the same order.
+        """
+        jobs = list(jobs)
+        for action, unit in jobs:
+            if action not in ACTIONS:
+                raise ValueError(f'Unknown job "{action}" for {unit}')
+        return self._run_jobs(jobs, timeout)
+
+    def _run_jobs(self, jobs: list, timeout: float) -> list:
+        raise NotImplementedError
+
+    def _run_job(self, action: str, unit: str):
+        error = self.run_jobs([(action, unit)])[0]
+        if error is not None:
+            raise error
+
+    def start(self, unit: str):
+        self._run_job('start', unit)
+
+    def stop(self, unit: str):
+        self._run_job('stop', unit)
+
+    def restart(self, unit: str):
+        self._run_job('restart', unit)
+
+    def active_states(self, units) -> dict:
+        """
+        Return the ActiveState ('active', 'inactive', 'failed', ...) of
+        every unit, units systemd does not know about are 'inactive'.
+        """
+        raise NotImplementedError
+
+    def active_state(self, unit: str) -> str:
+        return self.active_states([unit])[unit]
+
+    def is_active(self, unit: str) -> bool:
+        return self.active_state(unit) == 'active'
+
+
+def _job_error(action: str, unit: str, result: str) -> OSError:
+    return OSError(f'{action} {unit}: job {result}')
+
+
+def _rounds(jobs: list):
+    """
+    Split jobs into rounds of (index, action, unit) touching every unit at
+    most once, so later jobs on a unit do not replace earlier ones.
+    """
+    rounds = []
+    seen = {}
+    for index, (action, unit) in enumerate(jobs):
+        n = seen.get(unit, -1) + 1
+        seen[unit] = n
+        if n == len(rounds):
+            rounds.append([])
+        rounds[n].append((index, action, unit))
+    return rounds
+
+
+class SystemctlManager(ServiceManager):
+    """
+    Forks systemctl, one process per run of jobs with the same action.
+    """
+    name = 'systemctl'
+
+    def _run_jobs(self, jobs: list, timeout: float) -> list:
+        errors = [None] * len(jobs)
+        for batch in _rounds(jobs):
+            groups = {}
+            for index, action, unit in batch:
+                groups.setdefault(action, []).append((index, unit))
+            for action, members in groups.items():
+                units = [unit for _, unit in members]
+                code, _, err = popen(['systemctl', action] + units, timeout=timeout)
+                if code == 0:
+                    continue
+                # one failed unit fails the whole command, find out which
+                if len(units) == 1:
+                    errors[members[0][0]] = OSError(code, f'systemctl {action} {units[0]}: {err}')
+                    continue
+                wanted = ('inactive', 'failed') if action == 'stop' else ('active', 'activating', 'reloading')
+                states = self.active_states(units)
+                for index, unit in members:
+                    if states[unit] not in wanted:
+                        errors[index] = _job_error(action, unit, states[unit])
+        return errors
+
+    def active_states(self, units) -> dict:
+        units = list(units)
+        states = dict.fromkeys(units, 'inactive')
+        _, out, _ = popen(['systemctl', 'show', '-p', 'Id,ActiveState'] + units)
+        # one 'Id=...\nActiveState=...' block per unit, in order
+        for unit, block in zip(units, out.split('\n\n')):
+            for line in block.split('\n'):
+                if line.startswith('ActiveState='):
+                    states[unit] = line[12:]
+        return states
+
+
+class DBusManager(ServiceManager):
+    """
+    Talks to systemd over one persistent D-Bus connection. Jobs are all
+    queued before waiting on their JobRemoved signals, ActiveState is
+    cached and kept up to date from PropertiesChanged signals.
+    """
+    name = 'dbus'
+
+    METHODS = {
+        'start': 'StartUnit',
+        'stop': 'StopUnit',
+        'restart': 'RestartUnit',
+        'try-restart': 'TryRestartUnit',
+        'reload': 'ReloadUnit',
+    }
+
+    def __init__(self, address=None):
+        self.address = address
+        self._bus = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._finished = collections.OrderedDict()
+        self._job_done = threading.Condition()
+        self._states = {}
+        self._paths = {}
+
+    @property
+    def bus(self) -> dbus.Connection:
+        with self._lock:
+            # a connection can not be shared with a forked child
+            if self._bus is None or self._bus.closed or self._pid != os.getpid():
+                self._connect()
+            return self._bus
+
+    def connect(self):
+        """
+        Connect now instead of on first use, raises OSError if systemd can
+        not be reached.
+        """
+        return self.bus
+
+    def close(self):
+        with self._lock:
+            if self._bus is not None and self._pid == os.getpid():
+                self._bus.close()
+            self._bus = None
+
+    def _connect(self):
+        self._states.clear()
+        self._paths.clear()
+        bus = dbus.Connection(self.address)
+        try:
+            bus.add_signal_handler(self._on_signal)
+            bus.add_match(f"type='signal',sender='{SYSTEMD}',interface='{MANAGER_INTERFACE}'")
+            bus.add_match(f"type='signal',sender='{SYSTEMD}',interface='{PROPERTIES_INTERFACE}',"
+                          f"member='PropertiesChanged'")
+            # without a subscriber systemd does not send unit and job signals
+            bus.call(SYSTEMD, SYSTEMD_PATH, MANAGER_INTERFACE, 'Subscribe')
+        except OSError:
+            bus.close()
+            raise
+        self._bus = bus
+        self._pid = os.getpid()
+
+    def _on_signal(self, msg: dbus.Message):
+        if msg.interface == MANAGER_INTERFACE:
+            if msg.member == 'JobRemoved':
+                _, job, unit, result = msg.body
+                # the state change may be signalled after the job, ask again
+                self._states.pop(unit, None)
+                with self._job_done:
+                    self._finished[job] = result
+                    while len(self._finished) > FINISHED_JOBS:
+                        self._finished.popitem(last=False)
+                    self._job_done.notify_all()
+            elif msg.member in ('UnitNew', 'UnitRemoved'):
+                unit, path = msg.body
+                self._states.pop(unit, None)
+                if msg.member == 'UnitRemoved':
+                    self._paths.pop(path, None)
+        elif msg.member == 'PropertiesChanged' and msg.body[0] == UNIT_INTERFACE:
+            unit = self._paths.get(msg.path)
+            if unit is None:
+                return
+            _, changed, invalidated = msg.body
+            if 'ActiveState' in changed:
+                self._states[unit] = changed['ActiveState']
+            elif 'ActiveState' in invalidated:
+                self._states.pop(unit, None)
+
+    def _run_jobs(self, jobs: list, timeout: float) -> list:
+        bus = self.bus
+        errors = [None] * len(jobs)
+        deadline = time.monotonic() + timeout
+        for batch in _rounds(jobs):
+            calls = [(index, action, unit, bus.send_call(SYSTEMD, SYSTEMD_PATH, MANAGER_INTERFACE,
+                                                         self.METHODS[action], 'ss', (unit, 'replace')))
+                     for index, action, unit in batch]
+            queued = []
+            for index, action, unit, call in calls:
+                try:
+                    queued.append((index, action, unit, call.result(max(deadline - time.monotonic(), 0))[0]))
+                except OSError as e:
+                    errors[index] = e
+
+            with self._job_done:
+                for index, action, unit, job in queued:
+                    while job not in self._finished:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or bus.closed:
+                            errors[index] = TimeoutError(f'{action} {unit}: job did not finish in {timeout}s')
+                            break
+                        # wake up now and then to notice a lost connection
+                        self._job_done.wait(min(remaining, 1.0))
+                    else:
+                        result = self._finished.pop(job)
+                        if result != 'done':
+                            errors[index] = _job_error(action, unit, result)
+        return errors
+
+    def active_states(self, units) -> dict:
+        units = list(units)
+        missing = [unit for unit in units if unit not in self._states]
+        if missing:
+            bus = self.bus
+            calls = [(unit, bus.send_call(SYSTEMD, SYSTEMD_PATH, MANAGER_INTERFACE, 'GetUnit', 's', (unit,)))
+                     for unit in missing]
+            lookups = []
+            for unit, call in calls:
+                try:
+                    path = call.result(bus.timeout)[0]
+                except dbus.DBusError as e:
+                    if e.name != NO_SUCH_UNIT:
+                        raise
+                    # not loaded, UnitNew drops this once it is
+                    self._states.setdefault(unit, 'inactive')
+                    continue
+                self._paths[path] = unit
+                lookups.append((unit, bus.send_call(SYSTEMD, path, PROPERTIES_INTERFACE, 'Get', 'ss',
+                                                    (UNIT_INTERFACE, 'ActiveState'))))
+            for unit, call in lookups:
+                # a PropertiesChanged signal that came in meanwhile is newer
+                self._states.setdefault(unit, call.result(bus.timeout)[0])
+        return {unit: self._states.get(unit, 'inactive') for unit in units}
+
+
+MANAGERS = {
+    SystemctlManager.name: SystemctlManager,
+    DBusManager.name: DBusManager,
+}
+
+_default_manager = None
+_instances = {}
+
+
+def get_manager(manager=None) -> ServiceManager:
+    """
+    Resolve a service manager instance. Accepts an instance, a manager
+    name or None for the process wide default: D-Bus when the system bus
+    can be reached, systemctl otherwise. Named managers are shared.
+    """
+    global _default_manager
+
+    if isinstance(manager, ServiceManager):
+        return manager
+    if manager is not None:
+        if manager not in MANAGERS:
+            raise ValueError(f'Unknown service manager "{manager}"')
+        if manager not in _instances:
+            _instances[manager] = MANAGERS[manager]()
+        return _instances[manager]
+
+    if _default_manager is None:
+        default = get_manager('systemctl')
+        if os.path.exists(SYSTEM_BUS_SOCKET):
+            try:
+                get_manager('dbus').connect()
+                default = get_manager('dbus')
+            except OSError:
+                pass
+        _default_manager = default
+    return _default_manager
+
+
+def set_default_manager(manager):
+    """
+    Select the service manager used by every Interface that was not given
+    one explicitly.
+    """
+    global _default_manager
+    _default_manager = get_manager(manager)
@@ -0,0 +1,320 @@
+"""
+Interface counters, read for every interface in one pass without forking:
+a RTM_GETSTATS dump limited to rtnl_link_stats64, or sysfs where netlink
+is not available.
+
+    sampler = StatsSampler()
+    while True:
+        sampler.sample()
+        print(sampler.rates('rx_bytes'), sampler.error_rates())
+        time.sleep(1)
+"""
+import errno
+import os
+import socket
+import time
+from array import array
+from collections import namedtuple
+
+from util import netlink as nl
+
+SYSFS_NET = '/sys/class/net'
+
+# struct rtnl_link_stats64, in kernel order, also the names of the files in
+# /sys/class/net/<ifname>/statistics
+FIELDS = (
+    'rx_packets', 'tx_packets', 'rx_bytes', 'tx_bytes', 'rx_errors', 'tx_errors', 'rx_dropped', 'tx_dropped',
+    'multicast', 'collisions', 'rx_length_errors', 'rx_over_errors', 'rx_crc_errors', 'rx_frame_errors',
+    'rx_fifo_errors', 'rx_missed_errors', 'tx_aborted_errors', 'tx_carrier_errors', 'tx_fifo_errors',
+    'tx_heartbeat_errors', 'tx_window_errors', 'rx_compressed', 'tx_compressed', 'rx_nohandler',
+)
+STATS64_SIZE = len(FIELDS) * 8
+
+# what StatsSampler keeps by default, enough for traffic and error rates
+RATE_FIELDS = ('rx_packets', 'tx_packets', 'rx_bytes', 'tx_bytes', 'rx_errors', 'tx_errors', 'rx_dropped',
+               'tx_dropped')
+
+
+class Stats(namedtuple('Stats', FIELDS)):
+    """
+    Counters of a single interface.
+    """
+    __slots__ = ()
+
+
+def _stats_payload(ifindex=0) -> bytes:
+    # only IFLA_STATS_LINK_64, replies stay small
+    return nl.IF_STATS_MSG.pack(socket.AF_UNSPEC, ifindex, 1 << (nl.IFLA_STATS_LINK_64 - 1))
+
+
+def _stats64(payload) -> bytes:
+    """
+    The rtnl_link_stats64 of a RTM_NEWSTATS payload, cut or zero padded to
+    the fields known here.
+    """
+    data = nl.parse_attrs(payload, nl.IF_STATS_MSG.size).get(nl.IFLA_STATS_LINK_64, b'')
+    return data[:STATS64_SIZE].ljust(STATS64_SIZE, b'\0')
+
+
+def _netlink():
+    from ifmanage.backend import get_backend
+    return get_backend('netlink').netlink
+
+
+def _read_sysfs(ifname: str, field: str) -> int:
+    try:
+        with open(f'{SYSFS_NET}/{ifname}/statistics/{field}') as f:
+            return int(f.read())
+    except FileNotFoundError:
+        if not os.path.exists(f'{SYSFS_NET}/{ifname}'):
+            raise OSError(errno.ENODEV, f'Device "{ifname}" does not exist') from None
+        # counter unknown to this kernel
+        return 0
+
+
+def dump_netlink(fields=FIELDS):
+    """
+    Read the counters of every interface with one RTM_GETSTATS dump.
+    Returns (ifindexes, {field: counters}) as arrays in the same order.
+    """
+    indexes = array('i')
+    blobs = []
+    for _, payload in _netlink().dump(nl.RTM_GETSTATS, _stats_payload()):
+        indexes.append(nl.IF_STATS_MSG.unpack_from(payload)[1])
+        blobs.append(_stats64(payload))
+    flat = array('Q')
+    flat.frombytes(b''.join(blobs))
+    # every field is a strided slice, copied at C speed
+    return indexes, {field: flat[FIELDS.index(field)::len(FIELDS)] for field in fields}
+
+
+def dump_sysfs(fields=FIELDS):
+    """
+    Like dump_netlink() but reading sysfs, one file per counter.
+    """
+    indexes = array('i')
+    columns = {field: array('Q') for field in fields}
+    for ifname in os.listdir(SYSFS_NET):
+        try:
+            with open(f'{SYSFS_NET}/{ifname}/ifindex') as f:
+                ifindex = int(f.read())
+            values = [_read_sysfs(ifname, field) for field in fields]
+        except OSError:
+            # removed meanwhile
+            continue
+        indexes.append(ifindex)
+        for field, value in zip(fields, values):
+            columns[field].append(value)
+    return indexes, columns
+
+
+SOURCES = {
+    'netlink': dump_netlink,
+    'sysfs': dump_sysfs,
+}
+
+
+def default_source() -> str:
+    return 'netlink' if hasattr(socket, 'AF_NETLINK') else 'sysfs'
+
+
+def read_stats(ifname: str, source=None) -> Stats:
+    """
+    Return the counters of a single interface.
+    """
+    if (source or default_source()) == 'sysfs':
+        return Stats(*[_read_sysfs(ifname, field) for field in FIELDS])
+    try:
+        ifindex = socket.if_nametoindex(ifname)
+    except OSError:
+        raise OSError(errno.ENODEV, f'Device "{ifname}" does not exist') from None
+    counters = array('Q')
+    counters.frombytes(_stats64(_netlink().get(nl.RTM_GETSTATS, _stats_payload(ifindex), ifname)))
+    return Stats(*counters)
+
+
+_np = False
+
+
+def _numpy():
+    """
+    The numpy module if it is installed, else None.
+    """
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
+
+
+class StatsSampler(object):
+    """
+    Samples the counters of every interface into ring buffers keeping the
+    last size samples. Storage is one preallocated array per field, a row
+    of capacity interface slots per sample; it only grows when more
+    interfaces show up than ever before. Rates are computed over whole
+    rows at once, with numpy if it is installed.
+
+    source is a name from SOURCES or a callable with the same signature,
+    clock returns the time of a sample in seconds. Interface names are
+    looked up once per ifindex, an interface renamed in place keeps its
+    old name here.
+    """
+
+    def __init__(self, size=60, fields=RATE_FIELDS, source=None, clock=time.monotonic):
+        if size < 2:
+            raise ValueError('A sampler needs room for at least two samples')
+        self.size = size
+        self.fields = tuple(fields)
+        source = source or default_source()
+        self._source = SOURCES[source] if isinstance(source, str) else source
+        self.samples = 0
+        self.capacity = 0
+        self.times = array('d', bytes(8 * size))
+        # number of interfaces in each sample
+        self.counts = array('I', bytes(4 * size))
+        self.indexes = array('i')
+        self.data = {field: array('Q') for field in self.fields}
+        self._names = {}
+        self._clock = clock
+
+    def _grow(self, capacity: int):
+        old = self.capacity
+        indexes = array('i', bytes(4 * self.size * capacity))
+        data = {field: array('Q', bytes(8 * self.size * capacity)) for field in self.fields}
+        for row in range(self.size):
+            count = self.counts[row]
+            indexes[row * capacity:row * capacity + count] = self.indexes[row * old:row * old + count]
+            for field in self.fields:
+                data[field][row * capacity:row * capacity + count] = self.data[field][row * old:row * old + count]
+        self.capacity = capacity
+        self.indexes = indexes
+        self.data = data
+
+    def sample(self) -> int:
+        """
+        Read every interface's counters into the next row. Returns the
+        number of interfaces sampled.
+        """
+        indexes, columns = self._source(self.fields)
+        count = len(indexes)
+        if count > self.capacity:
+            self._grow(max(count, self.capacity * 2))
+        row = self.samples % self.size
+        start = row * self.capacity
+        self.indexes[start:start + count] = indexes
+        for field in self.fields:
+            self.data[field][start:start + count] = columns[field]
+        self.counts[row] = count
+        self.times[row] = self._clock()
+        self.samples += 1
+        return count
+
+    def _rows(self, window: int):
+        if not 0 < window < self.size:
+            raise ValueError(f'window must be between 1 and {self.size - 1}')
+        if self.samples <= window:
+            return None
+        new = (self.samples - 1) % self.size
+        return new, (self.samples - 1 - window) % self.size
+
+    def _row(self, array_, row: int):
+        start = row * self.capacity
+        return array_[start:start + self.counts[row]]
+
+    def _name(self, ifindex: int) -> str:
+        name = self._names.get(ifindex)
+        if name is None:
+            try:
+                name = self._names[ifindex] = socket.if_indextoname(ifindex)
+            except OSError:
+                name = str(ifindex)
+        return name
+
+    def _deltas(self, fields, window: int):
+        """
+        Return (ifindexes, [deltas per field], seconds) between the newest
+        sample and the one window samples before it, for interfaces present
+        in both. A counter that went backwards was reset, its delta is 0.
+        """
+        for field in fields:
+            if field not in self.data:
+                raise ValueError(f'{field} is not sampled')
+        rows = self._rows(window)
+        if rows is None:
+            return array('i'), [[] for _ in fields], 0.0
+        new, old = rows
+        indexes = self._row(self.indexes, new)
+        old_indexes = self._row(self.indexes, old)
+        seconds = self.times[new] - self.times[old]
+
+        take = None
+        if indexes != old_indexes:
+            # the interface set changed, line old counters up by ifindex
+            position = {ifindex: n for n, ifindex in enumerate(old_indexes)}
+            take = [(n, position[i]) for n, i in enumerate(indexes) if i in position]
+            indexes = array('i', [indexes[n] for n, _ in take])
+
+        np = _numpy()
+        deltas = []
+        for field in fields:
+            current = self._row(self.data[field], new)
+            previous = self._row(self.data[field], old)
+            if take is not None:
+                current = array('Q', [current[n] for n, _ in take])
+                previous = array('Q', [previous[m] for _, m in take])
+            if np is not None:
+                current = np.frombuffer(current, dtype=np.uint64)
+                previous = np.frombuffer(previous, dtype=np.uint64)
+                deltas.append(np.where(current >= previous, current - previous, 0).astype(np.float64))
+            else:
+                deltas.append([float(c - p) if c >= p else 0.0 for c, p in zip(current, previous)])
+        return indexes, deltas, seconds
+
+    def _by_name(self, indexes, values) -> dict:
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        return {self._name(ifindex): value for ifindex, value in zip(indexes, values)}
+
+    def rates(self, field: str, window=1) -> dict:
+        """
+        Per second change of a counter over the last window samples,
+        {ifname: rate}. Empty until enough samples were taken.
+        """
+        indexes, (delta,), seconds = self._deltas([field], window)
+        if not seconds:
+            return {}
+        if hasattr(delta, 'dtype'):
+            return self._by_name(indexes, delta / seconds)
+        return self._by_name(indexes, [d / seconds for d in delta])
+
+    def error_rates(self, window=1) -> dict:
+        """
+        Share of packets received or sent with errors over the last window
+        samples, {ifname: ratio}. Interfaces without traffic have 0.0.
+        """
+        indexes, (rx_errors, tx_errors, rx_packets, tx_packets), _ = self._deltas(
+            ('rx_errors', 'tx_errors', 'rx_packets', 'tx_packets'), window)
+        if hasattr(rx_errors, 'dtype'):
+            np = _numpy()
+            errors = rx_errors + tx_errors
+            # the packet counters only count packets that went through
+            total = errors + rx_packets + tx_packets
+            return self._by_name(indexes, np.divide(errors, total, out=np.zeros_like(errors), where=total > 0))
+        ratios = []
+        for values in zip(rx_errors, tx_errors, rx_packets, tx_packets):
+            total = sum(values)
+            ratios.append((values[0] + values[1]) / total if total else 0.0)
+        return self._by_name(indexes, ratios)
+
+    def latest(self, field: str) -> dict:
+        """
+        Counter values of the newest sample, {ifname: value}.
+        """
+        if not self.samples:
+            return {}
+        row = (self.samples - 1) % self.size
+        return self._by_name(self._row(self.indexes, row), self._row(self.data[field], row))
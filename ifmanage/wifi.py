@@ -1,11 +1,12 @@
-import os.path
-import socket
-import stat
+import hashlib
+import time
 
 from ifmanage.interface import Interface
+from ifmanage.scantable import (WPA_PSK, WPA2_PSK, WPA_EAP, WPA2_EAP, BSS as BSSEntry, Profile, ScanDiff, ScanTable,
+                                iter_scan_results, parse_bss, parse_bss_index)
+from util.wpactrl import WpaCtrl, get_pool
 
 CTRL_IFACE_DIR = '/var/run/wpa_supplicant'
-BUFF_SIZE = 4096
 
 PING = 'PING'
 SCAN = 'SCAN'
@@ -16,197 +17,398 @@ SELECT_NETWORK = 'SELECT_NETWORK'
 LIST_NETWORKS = 'LIST_NETWORKS'
 DISCONNECT = 'DISCONNECT'
 REMOVE_NETWORK = 'REMOVE_NETWORK'
+GET_NETWORK = 'GET_NETWORK'
+SAVE_CONFIG = 'SAVE_CONFIG'
+BSS = 'BSS'
+
+# fields of a BSS reply, see WPA_BSS_MASK_* in wpa_supplicant
+BSS_MASK_ID = 1 << 0
+BSS_MASK_BSSID = 1 << 1
+BSS_MASK_FREQ = 1 << 2
+BSS_MASK_LEVEL = 1 << 7
+BSS_MASK_AGE = 1 << 9
+BSS_MASK_FLAGS = 1 << 11
+BSS_MASK_SSID = 1 << 12
+BSS_MASK_DELIM = 1 << 17
+BSS_MASK_UPDATE_IDX = 1 << 22
+
+# enough to tell new and updated entries apart
+BSS_MASK_INDEX = BSS_MASK_ID | BSS_MASK_UPDATE_IDX | BSS_MASK_DELIM
+# what can change for a known entry
+BSS_MASK_STATE = BSS_MASK_INDEX | BSS_MASK_FREQ | BSS_MASK_LEVEL | BSS_MASK_AGE | BSS_MASK_FLAGS
+BSS_MASK_FULL = BSS_MASK_STATE | BSS_MASK_BSSID | BSS_MASK_SSID
+
+# fetching a few unwanted BSSes is cheaper than another round trip
+BSS_FETCH_GAP = 16
+
+# entries not seen by wpa_supplicant for this many seconds are dropped
+SCAN_TTL = 60.0
+
+
+def parse_scan_results(reply) -> list[Profile]:
+    """
+    Parse a SCAN_RESULTS reply (bytes or str) into one Profile per SSID.
+    """
+    return ScanTable.from_reply(reply).profiles()
+
+
+# key_mgmt and proto for each akm
+AKM_CONFIG = {
+    WPA_PSK: ('WPA-PSK', 'WPA'),
+    WPA2_PSK: ('WPA-PSK', 'RSN'),
+    WPA_EAP: ('WPA-EAP', 'WPA'),
+    WPA2_EAP: ('WPA-EAP', 'RSN'),
+}
+
+
+def quote_ssid(ssid: str) -> str:
+    """
+    SET_NETWORK value for an SSID, hex encoded if it can not be quoted.
+    """
+    if '"' in ssid or not ssid.isprintable():
+        return ssid.encode('utf-8').hex()
+    return f'"{ssid}"'
+
+
+def network_settings(profile: Profile) -> dict:
+    """
+    SET_NETWORK values for a profile, the strongest akm wins.
+    """
+    akm = profile.akm[-1] if profile.akm else None
+    key_mgmt, proto = AKM_CONFIG.get(akm, ('NONE', None))
+    settings = {"ssid": quote_ssid(profile.ssid), "key_mgmt": key_mgmt}
+    if proto:
+        settings["proto"] = proto
+    if akm in (WPA_PSK, WPA2_PSK):
+        password = profile.password
+        # 64 hex digits are a raw PSK, anything else a passphrase
+        if len(password) == 64 and all(c in '0123456789abcdefABCDEF' for c in password):
+            settings["psk"] = password
+        else:
+            settings["psk"] = f'"{password}"'
+    return settings
 
-# Define auth key mgmt types.
-WPA_PSK = 'WPA-PSK'
-WPA2_PSK = 'WPA2-PSK'
-WPA_EAP = 'WPA-EAP'
-WPA2_EAP = 'WPA2-EAP'
-
-
-class Profile(object):
-    def __init__(self, **kwargs):
-        self._ssid = kwargs["ssid"]
-        self._rssi = kwargs["RSSI"]
-        self._frequency = kwargs["frequency"]
-        self._akm = kwargs["akm"]
-        self._password = ""
 
-    @property
-    def ssid(self) -> str:
-        return self._ssid
+def _psk_digest(value: str) -> str:
+    # only a digest of the PSKs written is kept in memory
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
 
-    @property
-    def RSSI(self) -> int:
-        return self._rssi
 
-    @property
-    def frequency(self) -> list:
-        return self._frequency
+def parse_list_networks(reply: str) -> list[dict]:
+    """
+    Parse a LIST_NETWORKS reply into a list of dicts.
+    """
+    networks = reply[:-1].split('\n')
+    if len(networks) == 1:
+        return []
 
-    @frequency.setter
-    def frequency(self, freq: list):
-        self._frequency = freq
+    res = []
+    for n in networks[1:]:
+        values = n.split('\t')
+        res.append({
+            "id": int(values[0]),
+            "ssid": values[1],
+            "bssid": values[2],
+            "flags": values[3]
+        })
 
-    @property
-    def akm(self) -> list:
-        return self._akm
-
-    @property
-    def password(self) -> str:
-        return self.password
-
-    @password.setter
-    def password(self, pwd: str):
-        self._password = pwd
+    return res
 
 
 class WiFi(Interface):
-    def __init__(self, ifname, **kwargs):
+    def __init__(self, ifname, ctrl_dir=CTRL_IFACE_DIR, scan_ttl=SCAN_TTL, **kwargs):
         super().__init__(ifname, **kwargs)
         self.ifname = ifname
-        self._sock = self._init_socket()
-
-    def _init_socket(self) -> socket.socket:
-        sock_file = '{}/{}_{}'.format("/tmp", "ifmanage", self.ifname)
-        control_file = "{}/{}".format(CTRL_IFACE_DIR, self.ifname)
-        self._remove_existed_sock(sock_file)
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
-        sock.bind(sock_file)
-        sock.connect(control_file)
-
-        sock.send(PING.encode("utf-8"))
-        retry = 0
-        while retry <= 5:
-            reply = sock.recv(BUFF_SIZE)
-            if reply == '':
-                raise ConnectionError(f"Connection to '{control_file}' is broken!")
-
-            if reply.startswith(b'PONG'):
-                print("init complete")
-                return sock
-
-        raise ConnectionError(f"Connection to '{control_file}' is broken!")
-
-    def scan(self) -> list[Profile]:
+        self.ctrl_dir = ctrl_dir
+        self.scan_ttl = scan_ttl
+        # kept across scan_update() calls
+        self.scan_results = ScanTable()
+        self._expired = {}
+        # network id -> ssid and ssid -> first network id, loaded on first use
+        self._networks = None
+        self._ssids = {}
+        # network id -> digest of the PSK last written by us
+        self._psks = {}
+        # fail early if wpa_supplicant can not be reached
+        get_pool().get(self.ifname, self.ctrl_dir)
+
+    @property
+    def _ctrl(self) -> WpaCtrl:
+        """
+        The pooled control connection shared by all WiFi objects of this
+        interface.
+        """
+        return get_pool().get(self.ifname, self.ctrl_dir)
+
+    def scan(self, incremental=False) -> list[Profile]:
+        if incremental:
+            self.scan_update()
+            return self.scan_results.profiles()
+        return self.scan_table().profiles()
+
+    def scan_table(self) -> ScanTable:
+        """
+        Like scan(), but return every BSS seen instead of one Profile per SSID.
+        """
         self._send_cmd(SCAN)
-        print("wait scan...")
-        profile_dict = {}
-        reply = self._send_cmd(SCAN_RESULTS, decode=True)
-        for line in reply[:-1].split('\n')[1:]:
-            values = line.split('\t')
-            ssid = values[4]
-            freq = []
-            if 2412 <= int(values[1]) <= 2484:
-                freq.append("2.4GHz")
-            elif 4915 <= int(values[1]) <= 5825:
-                freq.append("5GHz")
-
-            akm = []
-            if WPA_PSK in values[3]:
-                akm.append(WPA_PSK)
-            if WPA2_PSK in values[3]:
-                akm.append(WPA2_PSK)
-            if WPA_EAP in values[3]:
-                akm.append(WPA_EAP)
-            if WPA2_EAP in values[3]:
-                akm.append(WPA2_EAP)
-
-            p = profile_dict.get(ssid)
-            if p:
-                freq.extend(p.frequency)
-                akm.extend(p.akm)
-                profile_dict[ssid] = Profile(**{
-                    "ssid": ssid,
-                    "frequency": freq,
-                    "akm": akm,
-                    "RSSI": max(p.RSSI, int(values[2]))
-                })
-            else:
-                profile_dict[ssid] = Profile(**{
-                    "ssid": ssid,
-                    "frequency": freq,
-                    "akm": akm,
-                    "RSSI": int(values[2]),
-                })
-
-        return list(profile_dict.values())
+        return ScanTable.from_reply(self._send_cmd(SCAN_RESULTS))
+
+    def scan_update(self, trigger=True) -> ScanDiff:
+        """
+        Merge the BSS list of wpa_supplicant into scan_results and return
+        what changed. Only ids and update counters are read for every BSS,
+        full entries are fetched for new BSSes and the state (signal,
+        frequency, flags, age) for updated ones. Entries wpa_supplicant
+        dropped or has not seen for scan_ttl seconds are removed.
+        """
+        if trigger:
+            self._send_cmd(SCAN)
+
+        table = self.scan_results
+        diff = ScanDiff(table)
+        now = time.monotonic()
+        index = dict(self._bss_range(BSS_MASK_INDEX, parse=parse_bss_index))
+
+        for entry in table:
+            if entry.id not in index:
+                diff.removed.append(table.remove(entry.bssid))
+        # expired entries come back only once wpa_supplicant sees them again
+        self._expired = {i: idx for i, idx in self._expired.items() if index.get(i) == idx}
+
+        new, updated = [], []
+        for i, idx in index.items():
+            entry = table.by_id(i)
+            if entry is None:
+                if i not in self._expired:
+                    new.append(i)
+            elif entry.update_idx != idx:
+                updated.append(i)
+
+        for fields in self._bss_fetch(index, new, BSS_MASK_FULL):
+            entry = BSSEntry.from_fields(fields, now)
+            table.add(entry)
+            diff.added.append(entry)
+
+        for fields in self._bss_fetch(index, updated, BSS_MASK_STATE):
+            old = table.by_id(int(fields[b'id']))
+            entry = BSSEntry.from_fields(fields, now, old)
+            table.add(entry)
+            if not entry.same_state(old):
+                diff.changed.append(entry)
+
+        if self.scan_ttl:
+            for entry in table.expire(self.scan_ttl, now):
+                self._expired[entry.id] = entry.update_idx
+                diff.removed.append(entry)
+        return diff
+
+    def _bss_range(self, mask: int, first=0, last=None, parse=parse_bss) -> list:
+        """
+        Read the BSSes with ids first..last (to the end if last is None).
+        wpa_supplicant stops at its reply size limit, the rest is read with
+        further requests.
+        """
+        entries = []
+        while True:
+            reply = self._send_cmd(f'{BSS} RANGE={first}-{"" if last is None else last} MASK=0x{mask:x}')
+            page, done = parse(reply)
+            entries.extend(page)
+            if done or not page:
+                return entries
+            last_entry = page[-1]
+            first = (last_entry[0] if isinstance(last_entry, tuple) else int(last_entry[b'id'])) + 1
+            if last is not None and first > last:
+                return entries
+
+    def _bss_fetch(self, index: dict, ids: list, mask: int) -> list[dict]:
+        """
+        Read the given BSS ids with as few range requests as possible, ids
+        less than BSS_FETCH_GAP entries apart in index share a request.
+        BSSes added since index was read are skipped.
+        """
+        wanted = set(ids)
+        entries = []
+        run = []
+        last = 0
+        for pos, i in enumerate(sorted(index)):
+            if i not in wanted:
+                continue
+            if run and pos - last > BSS_FETCH_GAP:
+                entries.extend(self._bss_range(mask, run[0], run[-1]))
+                run = []
+            run.append(i)
+            last = pos
+        if run:
+            entries.extend(self._bss_range(mask, run[0], run[-1]))
+        return [e for e in entries if int(e[b'id']) in wanted]
 
     def connect(self, profile: Profile):
-        networks = self.list_network()
-        for n in networks:
-            if n["ssid"] == profile.ssid:
-                self._send_cmd("{} {}".format(SELECT_NETWORK, n["id"]))
+        nid = self.network_id(profile.ssid)
+        if nid is None:
+            return
+        if not self._send_cmd(f'{SELECT_NETWORK} {nid}').startswith(b'OK'):
+            # the cached id is stale, someone else changed the networks
+            nid = self.network_id(profile.ssid, refresh=True)
+            if nid is not None:
+                self._send_cmd(f'{SELECT_NETWORK} {nid}')
 
     def disconnect(self):
         self._send_cmd(DISCONNECT)
 
-    def add_profile(self, profile: Profile):
-        reply = self._send_cmd(ADD_NETWORK, True)
-        nid = reply.strip()
-
-        self._send_cmd('{} {} ssid "{}"'.format(SET_NETWORK, nid, profile.ssid))
-
-        akms = {
-            WPA_PSK: ['WPA-PSK', 'WPA'],
-            WPA2_PSK: ['WPA-PSK', 'WPA'],
-            WPA_EAP: ['WPA-EAP', 'RSN'],
-            WPA2_EAP: ['WPA-EAP', 'RSN'],
+    def add_profile(self, profile: Profile) -> int:
+        return self.add_profiles([profile], save=False)[0]
+
+    def add_profiles(self, profiles: list[Profile], save=True) -> list[int]:
+        """
+        Add a network for every profile and return their ids. All
+        ADD_NETWORK and all SET_NETWORK commands are pipelined, the
+        configuration is saved once at the end. If any command fails the
+        networks just added are removed again and OSError is raised.
+        """
+        if not profiles:
+            return []
+        replies = self._pipeline([ADD_NETWORK] * len(profiles))
+        failed = [r for r in replies if not r.strip().isdigit()]
+        nids = [int(r) for r in replies if r.strip().isdigit()]
+        if not failed:
+            cmds = []
+            for nid, profile in zip(nids, profiles):
+                cmds.extend(f'{SET_NETWORK} {nid} {key} {value}' for key, value in network_settings(profile).items())
+            failed = self._failed(cmds, self._pipeline(cmds))
+        if failed:
+            self._pipeline([f'{REMOVE_NETWORK} {nid}' for nid in nids])
+            raise OSError(f'adding networks failed: {failed[0]}')
+
+        self._load_networks()
+        for nid, profile in zip(nids, profiles):
+            self._cache_network(nid, profile.ssid)
+            psk = network_settings(profile).get('psk')
+            if psk is not None:
+                self._psks[nid] = _psk_digest(psk)
+        if save:
+            self.save_config()
+        return nids
+
+    def sync_profiles(self, profiles: list[Profile], remove=True, save=True) -> dict:
+        """
+        Make the configured networks match profiles: add the missing ones,
+        update settings that differ on the existing ones and, with remove,
+        delete networks (including duplicates) that are not in profiles.
+        PSKs can not be read back, they are written unless this object
+        wrote the same one before. Returns the SSIDs that were 'added',
+        'updated' and 'removed'.
+        """
+        networks = self.list_network()
+        wanted = {p.ssid: p for p in profiles}
+        by_ssid = {}
+        extra = []
+        for n in networks:
+            if n["ssid"] not in by_ssid and (n["ssid"] in wanted or not remove):
+                by_ssid[n["ssid"]] = n["id"]
+            elif remove:
+                extra.append(n)
+
+        missing = [p for ssid, p in wanted.items() if ssid not in by_ssid]
+        existing = [(by_ssid[ssid], network_settings(p)) for ssid, p in wanted.items() if ssid in by_ssid]
+
+        # read back everything but the PSK in one go
+        get = [(nid, key, value) for nid, settings in existing for key, value in settings.items() if key != 'psk']
+        current = self._pipeline([f'{GET_NETWORK} {nid} {key}' for nid, key, _ in get])
+        cmds = [f'{SET_NETWORK} {nid} {key} {value}' for (nid, key, value), reply in zip(get, current)
+                if reply.rstrip('\n') != value]
+        updated = {int(cmd.split(' ')[1]) for cmd in cmds}
+        psks = {nid: _psk_digest(settings['psk']) for nid, settings in existing
+                if 'psk' in settings and self._psks.get(nid) != _psk_digest(settings['psk'])}
+        updated.update(nid for nid in psks if nid in self._psks)
+        cmds.extend(f'{SET_NETWORK} {nid} psk {settings["psk"]}' for nid, settings in existing if nid in psks)
+        cmds.extend(f'{REMOVE_NETWORK} {n["id"]}' for n in extra)
+        failed = self._failed(cmds, self._pipeline(cmds))
+        if failed:
+            self._networks = None
+            self._psks = {}
+            raise OSError(f'syncing networks failed: {failed[0]}')
+        self._psks.update(psks)
+
+        for n in extra:
+            self._uncache_network(n["id"])
+        self.add_profiles(missing, save=False)
+        if save and (cmds or missing):
+            self.save_config()
+        return {
+            "added": [p.ssid for p in missing],
+            "updated": [n["ssid"] for n in networks if n["id"] in updated],
+            "removed": [n["ssid"] for n in extra],
         }
 
-        key_mgmt = akms.get(profile.akm[-1], ['None', ''])[0]
-        self._send_cmd('{} {} key_mgmt {}'.format(SET_NETWORK, nid, key_mgmt))
-
-        proto = akms.get(profile.akm[-1], ['None', ''])[1]
-        if proto:
-            self._send_cmd('{} {} proto {}'.format(SET_NETWORK, nid, proto))
-
-        if profile.akm[-1] in [WPA2_PSK, WPA2_PSK]:
-            self._send_cmd('{} {} psk "{}"'.format(SET_NETWORK, nid, profile.ssid))
-
     def remove_profile(self, nid):
-        flag = False
-        for i in self.list_network():
-            if i["id"] == nid:
-                flag = True
-                break
-
-        if flag:
-            self._send_cmd("{} {}".format(REMOVE_NETWORK, nid))
-        else:
+        self._load_networks()
+        if nid not in self._networks:
+            self._networks = None
+            self._load_networks()
+        if nid not in self._networks:
             raise ValueError("Unknown network id")
 
-    def list_network(self) -> list[dict]:
-        networks = self._send_cmd(LIST_NETWORKS, decode=True)
-        networks = networks[:-1].split('\n')
-        if len(networks) == 1:
-            return []
+        self._send_cmd("{} {}".format(REMOVE_NETWORK, nid))
+        self._uncache_network(nid)
 
-        res = []
-        for n in networks[1:]:
-            values = n.split('\t')
-            res.append({
-                "id": int(values[0]),
-                "ssid": values[1],
-                "bssid": values[2],
-                "flags": values[3]
-            })
+    def save_config(self):
+        reply = self._send_cmd(SAVE_CONFIG, True)
+        if not reply.startswith('OK'):
+            raise OSError(f"'{SAVE_CONFIG}' failed: {reply.strip()}")
 
-        return res
+    def list_network(self) -> list[dict]:
+        networks = parse_list_networks(self._send_cmd(LIST_NETWORKS, decode=True))
+        old = self._networks or {}
+        self._networks = {}
+        self._ssids = {}
+        for n in networks:
+            self._cache_network(n["id"], n["ssid"])
+        # a PSK is only known for a network id still holding the same SSID
+        self._psks = {nid: psk for nid, psk in self._psks.items()
+                      if nid in old and self._networks.get(nid) == old[nid]}
+        return networks
+
+    def network_id(self, ssid: str, refresh=False):
+        """
+        Id of the first network configured for ssid, from a cache loaded
+        with LIST_NETWORKS on first use.
+        """
+        if refresh:
+            self._networks = None
+        self._load_networks()
+        return self._ssids.get(ssid)
+
+    def _load_networks(self):
+        if self._networks is None:
+            self.list_network()
+
+    def _cache_network(self, nid: int, ssid: str):
+        self._networks[nid] = ssid
+        self._ssids.setdefault(ssid, nid)
+
+    def _uncache_network(self, nid: int):
+        if self._networks is None:
+            return
+        ssid = self._networks.pop(nid, None)
+        self._psks.pop(nid, None)
+        if self._ssids.get(ssid) == nid:
+            del self._ssids[ssid]
+            for other, other_ssid in self._networks.items():
+                if other_ssid == ssid:
+                    self._ssids[ssid] = other
+                    break
+
+    def _pipeline(self, cmds: list[str]) -> list[str]:
+        return [reply.decode('utf-8') for reply in self._ctrl.pipeline(cmds)]
+
+    @staticmethod
+    def _failed(cmds: list[str], replies: list[str]) -> list[str]:
+        return [f"'{cmd}': {reply.strip()}" for cmd, reply in zip(cmds, replies) if not reply.startswith('OK')]
 
     def _send_cmd(self, cmd: str, decode=False):
-        self._sock.send(cmd.encode("utf-8"))
-        reply = self._sock.recv(BUFF_SIZE)
+        reply = self._ctrl.request(cmd)
 
         if decode:
             return reply.decode("utf-8")
         else:
             return reply
-
-    def _remove_existed_sock(self, file):
-        if os.path.exists(file):
-            mode = os.stat(file).st_mode
-            if stat.S_ISSOCK(mode):
-                os.remove(file)
-
-
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+import unittest
+
+from ifmanage.asyncwifi import AsyncWiFi
+from .wpa_fake import FakeWpaSupplicant, make_bss
+
+
+class TestAsyncWiFi(unittest.TestCase):
+    def test_scan(self):
+        async def run(fake):
+            async with AsyncWiFi(fake.ifname, ctrl_dir=fake.ctrl_dir) as wifi:
+                events = []
+
+                async def collect():
+                    async for event in wifi.events():
+                        events.append(event.name)
+
+                task = asyncio.create_task(collect())
+                profiles = await wifi.scan()
+                task.cancel()
+            return profiles, events
+
+        with FakeWpaSupplicant(bss=make_bss(9), scan_delay=0.1) as fake:
+            profiles, events = asyncio.run(run(fake))
+            # results are only fetched once the scan completed
+            self.assertEqual(fake.commands[-2:], ['SCAN_RESULTS', 'DETACH'])
+        self.assertEqual(sorted(p.ssid for p in profiles), ['net-0', 'net-1', 'net-2'])
+        self.assertEqual(events, ['CTRL-EVENT-SCAN-STARTED', 'CTRL-EVENT-SCAN-RESULTS'])
+
+    def test_concurrent(self):
+        async def run(fakes):
+            radios = [AsyncWiFi(f.ifname, ctrl_dir=f.ctrl_dir) for f in fakes]
+            await asyncio.gather(*(r.open() for r in radios))
+            results = await asyncio.gather(*(r.scan() for r in radios))
+            await asyncio.gather(*(r.close() for r in radios))
+            return results
+
+        fakes = [FakeWpaSupplicant(f'wlan{i}', scan_delay=0.2) for i in range(5)]
+        for fake in fakes:
+            fake.start()
+        try:
+            start = time.monotonic()
+            results = asyncio.run(run(fakes))
+            elapsed = time.monotonic() - start
+        finally:
+            for fake in fakes:
+                fake.stop()
+        self.assertEqual([len(r) for r in results], [2] * 5)
+        # the scans ran side by side, not one after the other
+        self.assertLess(elapsed, 5 * 0.2)
+
+    def test_timeout_closes(self):
+        class SlowWpaSupplicant(FakeWpaSupplicant):
+            def handle(self, command, addr):
+                if command == 'SLOW':
+                    time.sleep(0.3)
+                return super().handle(command, addr)
+
+        async def run(fake):
+            wifi = AsyncWiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            await wifi.open()
+            with self.assertRaises(asyncio.TimeoutError):
+                await wifi.request('SLOW', timeout=0.1)
+            # the late reply to SLOW can not be taken for PING's
+            with self.assertRaises(ConnectionError):
+                await wifi.request('PING')
+            self.assertFalse(os.path.exists(wifi._path))
+
+        with SlowWpaSupplicant() as fake:
+            asyncio.run(run(fake))
+
+    def test_open_failure(self):
+        async def run(fake):
+            wifi = AsyncWiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            with self.assertRaises(OSError):
+                await wifi.open()
+            self.assertIsNone(wifi._transport)
+            self.assertFalse(os.path.exists(wifi._path))
+
+        with FakeWpaSupplicant(replies={'ATTACH': 'FAIL\n'}) as fake:
+            asyncio.run(run(fake))
+
+
+if __name__ == '__main__':
+    unittest.main()
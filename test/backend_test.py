@@ -0,0 +1,84 @@
+import os
+import unittest
+
+from ifmanage.backend import get_backend
+from ifmanage.interface import Interface
+from util.command import cmd
+
+
+def sysfs(ifname, attr):
+    with open(f'/sys/class/net/{ifname}/{attr}') as f:
+        return f.read().strip()
+
+
+@unittest.skipUnless(os.geteuid() == 0, "requires root")
+class TestBackend(unittest.TestCase):
+    def check_backend(self, name):
+        ifname = f'ifmt{name[:3]}0'
+        obj = Interface(ifname, backend=name, type='veth')
+        self.assertIs(obj.backend, get_backend(name))
+        obj.create()
+        try:
+            self.assertTrue(obj.exist())
+            obj.set_mtu(1400)
+            self.assertEqual(sysfs(ifname, 'mtu'), '1400')
+            obj.set_mac('02:00:00:00:10:01')
+            self.assertEqual(sysfs(ifname, 'address'), '02:00:00:00:10:01')
+            obj.set_alias('uplink to core')
+            self.assertEqual(sysfs(ifname, 'ifalias'), 'uplink to core')
+            obj.set_state(True)
+            self.assertEqual(int(sysfs(ifname, 'flags'), 16) & 1, 1)
+            obj.backend.add_addr(ifname, '192.0.2.1/24')
+            obj.backend.add_addr(ifname, '192.0.2.2/24')
+            with self.assertRaises(OSError):
+                obj.backend.add_addr(ifname, '192.0.2.1/24')
+            obj.backend.del_addr(ifname, '192.0.2.2/24')
+            self.assertIn('192.0.2.1/24', cmd(f'ip -o addr show dev {ifname}'))
+            self.assertNotIn('192.0.2.2/24', cmd(f'ip -o addr show dev {ifname}'))
+            obj.backend.flush_addrs(ifname)
+            self.assertNotIn('192.0.2.1/24', cmd(f'ip -o addr show dev {ifname}'))
+        finally:
+            obj.delete()
+        self.assertFalse(obj.exist())
+
+    def check_many(self, name):
+        backend = get_backend(name)
+        netns = f'ifmt-{name}'
+        names = [f'ifmt{name[:3]}{i}' for i in range(3)]
+        inside = f'ifmt{name[:3]}ns'
+        cmd(f'ip netns add {netns}')
+        try:
+            for ifname in names + [inside]:
+                backend.create(ifname, 'veth', netns=netns if ifname == inside else None)
+            self.assertIn(inside, cmd(f'ip netns exec {netns} ip -o link show'))
+            # the peer stays in this namespace
+            self.assertTrue(os.path.exists(f'/sys/class/net/{inside}p'))
+
+            errors = backend.delete_many(names + [f'{inside}p', 'lo'])
+            self.assertEqual(errors[:4], [None] * 4)
+            self.assertIsInstance(errors[4], OSError)
+            for ifname in names:
+                self.assertFalse(os.path.exists(f'/sys/class/net/{ifname}'))
+                self.assertFalse(os.path.exists(f'/sys/class/net/{ifname}p'))
+            self.assertEqual(sysfs('lo', 'netdev_group'), '0')
+        finally:
+            cmd(f'ip netns del {netns}')
+            for ifname in names:
+                if os.path.exists(f'/sys/class/net/{ifname}'):
+                    cmd(f'ip link del dev {ifname}')
+
+    def test_netlink(self):
+        self.check_backend('netlink')
+
+    def test_command(self):
+        self.check_backend('command')
+
+    def test_many_netlink(self):
+        self.check_many('netlink')
+
+    def test_many_command(self):
+        self.check_many('command')
+
+
+if __name__ == '__main__':
+    unittest.main()
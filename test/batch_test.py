@@ -0,0 +1,55 @@
+import os
+import unittest
+
+from ifmanage.backend import get_backend
+from ifmanage.batch import Batch
+from util.command import cmd
+
+
+def sysfs(ifname, attr):
+    with open(f'/sys/class/net/{ifname}/{attr}') as f:
+        return f.read().strip()
+
+
+@unittest.skipUnless(os.geteuid() == 0, "requires root")
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        cmd('ip link add dev ifmtb0 type veth peer name ifmtb1')
+
+    def tearDown(self):
+        cmd('ip link del dev ifmtb0')
+
+    def check_rollback(self, backend):
+        batch = Batch(backend)
+        batch.set_mtu('ifmtb0', 1400)
+        batch.set_alias('ifmtb0', 'batched')
+        batch.add_addr('ifmtb1', '192.0.2.1/24')
+        failed = batch.set_mtu('ifmtnope', 1400)
+        batch.apply()
+
+        self.assertEqual([o.ok for o in batch.operations], [True, True, True, False])
+        self.assertIsInstance(failed.error, OSError)
+        self.assertEqual(sysfs('ifmtb0', 'mtu'), '1400')
+        self.assertEqual(get_backend(backend).get_addrs('ifmtb1'), ['192.0.2.1/24'])
+
+        self.assertEqual(batch.rollback(), [])
+        self.assertEqual(sysfs('ifmtb0', 'mtu'), '1500')
+        self.assertEqual(sysfs('ifmtb0', 'ifalias'), '')
+        self.assertEqual(get_backend(backend).get_addrs('ifmtb1'), [])
+
+    def test_netlink(self):
+        self.check_rollback('netlink')
+
+    def test_command(self):
+        self.check_rollback('command')
+
+    def test_context(self):
+        with self.assertRaises(OSError):
+            with Batch() as batch:
+                batch.set_mtu('ifmtb0', 1400)
+                batch.del_addr('ifmtb0', '192.0.2.1/24')
+        self.assertEqual(sysfs('ifmtb0', 'mtu'), '1500')
+
+
+if __name__ == '__main__':
+    unittest.main()
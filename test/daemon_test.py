@@ -0,0 +1,101 @@
+import errno
+import os
+import tempfile
+import threading
+import unittest
+
+from ifmanage.client import Client, Interface, WiFi
+from ifmanage.daemon import Server
+from ifmanage.scantable import Profile
+from test.wpa_fake import FakeWpaSupplicant
+
+
+class Missing(object):
+    def __init__(self, ifname):
+        self.ifname = ifname
+
+    def read(self):
+        raise FileNotFoundError(errno.ENOENT, 'No such file or directory', self.ifname)
+
+    def lookup(self):
+        raise type('LookupFailed', (OSError,), {})(errno.ENOENT, 'not found')
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(prefix='ifmanaged-'), 'ifmanaged.sock')
+        self.server = Server(self.path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = Client(self.path)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.rmdir(os.path.dirname(self.path))
+
+    def test_calls(self):
+        lo = Interface('lo', client=self.client)
+        self.assertTrue(lo.exist())
+        self.assertEqual(lo.get_link().ifname, 'lo')
+        self.assertFalse(Interface('ifmdnope', client=self.client).exist())
+        # objects are kept between calls
+        self.assertEqual(len(self.server.objects), 2)
+        lo.exist()
+        self.assertEqual(len(self.server.objects), 2)
+
+    def test_objects_bounded(self):
+        self.server.max_objects = 3
+        for i in range(5):
+            Interface(f'ifmdnope{i}', client=self.client).exist()
+        self.assertEqual(sorted(key[1] for key in self.server.objects), ['ifmdnope2', 'ifmdnope3', 'ifmdnope4'])
+        # an interface removed through the daemon leaves nothing behind
+        with self.assertRaises(OSError):
+            Interface('ifmdnope4', client=self.client).delete()
+        self.assertEqual(sorted(key[1] for key in self.server.objects), ['ifmdnope2', 'ifmdnope3'])
+
+    def test_single_daemon(self):
+        with self.assertRaises(OSError):
+            Server(self.path)
+        # the running daemon still owns the socket
+        self.assertTrue(Interface('lo', client=self.client).exist())
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            Interface('ifmd0', client=self.client).set_alias('')
+        with self.assertRaises(OSError) as ctx:
+            Interface('ifmdnope', client=self.client).get_link()
+        self.assertIsNotNone(ctx.exception.errno)
+        with self.assertRaises(AttributeError):
+            self.client.call('Interface', 'lo', {}, '_backend')
+        with self.assertRaises(AttributeError):
+            Interface('lo', client=self.client).nonexistent()
+        with self.assertRaises(ValueError):
+            self.client.call('Bridge', 'br0', {}, 'exist')
+
+    def test_errno(self):
+        self.server._classes = {'Missing': Missing}
+        with self.assertRaises(FileNotFoundError) as ctx:
+            self.client.call('Missing', 'ifmd0', {}, 'read')
+        self.assertEqual(ctx.exception.errno, errno.ENOENT)
+        self.assertEqual(ctx.exception.strerror, 'No such file or directory')
+        # an OSError subclass the client does not know keeps its errno
+        with self.assertRaises(FileNotFoundError):
+            self.client.call('Missing', 'ifmd0', {}, 'lookup')
+
+    def test_wifi(self):
+        with FakeWpaSupplicant('wlan0') as fake:
+            wifi = WiFi('wlan0', client=self.client, ctrl_dir=fake.ctrl_dir)
+            profiles = wifi.scan(incremental=True)
+            self.assertEqual(sorted(p.ssid for p in profiles), ['net-0', 'net-1'])
+            self.assertIsInstance(profiles[0], Profile)
+
+            profile = Profile(ssid='home', akm=['WPA2-PSK'])
+            profile.password = 'secret123'
+            nid = wifi.add_profile(profile)
+            self.assertEqual(fake.networks[nid]['psk'], '"secret123"')
+
+
+if __name__ == '__main__':
+    unittest.main()
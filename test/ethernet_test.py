@@ -0,0 +1,80 @@
+import errno
+import os
+import socket
+import unittest
+
+from ifmanage import ethernet
+from ifmanage.ethernet import Ethernet
+from util.command import cmd
+
+
+class TestEthernet(unittest.TestCase):
+    def test_names(self):
+        for ifname in ['eth0', 'lan1', 'eno1', 'ens3', 'enp1s0', 'enp5s0f1np0', 'enx001122aabbcc']:
+            self.assertEqual(Ethernet(ifname).ifname, ifname)
+        for ifname in ['wlan0', 'veth0', 'eth', 'ethx', 'enxzz', 'eth0.10']:
+            with self.assertRaises(ValueError):
+                Ethernet(ifname)
+
+
+@unittest.skipUnless(os.geteuid() == 0, "requires root")
+class TestEthtool(unittest.TestCase):
+    def setUp(self):
+        # veth knows link settings, offloads and channels but no rings
+        cmd('ip link add dev eth4242 type veth peer name eth4242p')
+        self.obj = Ethernet('eth4242', offload={'gro': True, 'gso': False}, channels={'rx': 1})
+
+    def tearDown(self):
+        cmd('ip link del dev eth4242')
+
+    def test_link_settings(self):
+        settings = self.obj.get_link_settings()
+        self.assertEqual((settings.speed, settings.duplex, settings.autoneg), (10000, 'full', False))
+        # supported modes are read once per NIC
+        self.assertIn(('eth4242', socket.if_nametoindex('eth4242')), ethernet._capabilities)
+        # nothing to negotiate on a virtual NIC
+        self.assertFalse(self.obj.set_speed_duplex('auto', 'auto'))
+        self.assertFalse(self.obj.set_speed_duplex(10000, 'full'))
+        with self.assertRaises(OSError):
+            self.obj.set_speed_duplex(1000, 'full')
+
+    def test_set_link_settings_reuses_current(self):
+        tool = ethernet._ethtool()
+        current = self.obj.get_link_settings()
+        requests = []
+        request = tool.request
+        tool.request = lambda *args: requests.append(args[2]) or request(*args)
+        try:
+            with self.assertRaises(OSError):
+                tool.set_link_settings('eth4242', 1000, 'full', autoneg=False, current=current)
+        finally:
+            del tool.request
+        self.assertEqual(requests, ['set link settings'])
+
+    def test_no_link_settings(self):
+        # ifb has no link settings at all
+        cmd('ip link add dev eth4243 type ifb')
+        try:
+            self.assertEqual(Ethernet('eth4243').update_ethtool(), [])
+            with self.assertRaises(OSError) as cm:
+                Ethernet('eth4243', speed='1000', duplex='full').update_ethtool()
+            self.assertEqual(cm.exception.errno, errno.EOPNOTSUPP)
+        finally:
+            cmd('ip link del dev eth4243')
+
+    def test_update(self):
+        self.obj.set_offload('gro', False)
+        self.assertEqual(self.obj.update_ethtool(), ['offload gro', 'offload gso'])
+        self.assertTrue(self.obj.get_offload('gro'))
+        self.assertFalse(self.obj.get_offload('gso'))
+        self.assertEqual(self.obj.update_ethtool(), [])
+
+        with self.assertRaises(ValueError):
+            self.obj.set_channels(rx=64)
+        with self.assertRaises(OSError) as cm:
+            self.obj.set_ring_buffer(rx=4096)
+        self.assertEqual(cm.exception.errno, errno.EOPNOTSUPP)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from ifmanage.executor import Executor, interface_lock, run
+from ifmanage.interface import Interface
+
+
+class TestExecutor(unittest.TestCase):
+    def test_concurrent(self):
+        interfaces = [Interface(f'ifx{i}') for i in range(20)]
+        start = time.monotonic()
+        results = run(interfaces, lambda interface, delay: time.sleep(delay) or interface.ifname, 0.2,
+                      max_workers=20)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual([r.value for r in results], [i.ifname for i in interfaces])
+        self.assertTrue(all(r.ok for r in results))
+
+    def test_errors_and_methods(self):
+        results = run([Interface('ifx0'), Interface('ifx1')], 'set_alias', '')
+        self.assertEqual([type(r.error) for r in results], [ValueError, ValueError])
+        self.assertFalse(any(r.ok for r in results))
+        self.assertEqual(run([Interface('ifx0')], 'get_info')[0].value, {})
+
+    def test_same_interface_serialized(self):
+        running = []
+        overlap = []
+        lock = threading.Lock()
+
+        def op(interface):
+            with lock:
+                running.append(interface.ifname)
+                overlap.append(running.count(interface.ifname) > 1)
+            time.sleep(0.02)
+            with lock:
+                running.remove(interface.ifname)
+
+        with Executor(max_workers=8) as executor:
+            results = executor.run([Interface('ifx0') for _ in range(4)] + [Interface('ifx1')] * 4, op)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(len(overlap), 8)
+        self.assertFalse(any(overlap))
+
+    def test_timeout(self):
+        start = time.monotonic()
+        results = run([Interface('ifx0'), Interface('ifx1')],
+                      lambda interface: time.sleep(0.5 if interface.ifname == 'ifx0' else 0), timeout=0.1)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertTrue(results[0].timed_out)
+        self.assertIsInstance(results[0].error, TimeoutError)
+        self.assertTrue(results[1].ok)
+
+    def test_timeout_excludes_lock_wait(self):
+        held = threading.Event()
+
+        def hold():
+            with interface_lock('ifx0'):
+                held.set()
+                time.sleep(0.3)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        results = run([Interface('ifx0')], lambda interface: time.sleep(0.05), timeout=0.2)
+        thread.join()
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[0].timed_out)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import json
+import shlex
+
+from util import command
+
+SYSTEMCTL_JOBS = ('start', 'stop', 'restart', 'try-restart', 'reload')
+
+
+class CommandFailed(Exception):
+    def __init__(self, message: str, code=2):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeCommands(object):
+    """
+    Simulated ip and systemctl for util.command: while started, commands
+    never fork but change an in memory set of links and unit states, so
+    the command backend and SystemctlManager can be run reproducibly.
+    Every argv is appended to commands.
+
+    usage:
+        with FakeCommands() as fake:
+            fake.add_link('eth0')
+            get_backend('command').set_mtu('eth0', 1400)
+    """
+
+    def __init__(self, units=None, failing=()):
+        self.links = {}
+        # links created in other namespaces, {netns: {ifname: link}}
+        self.netns = {}
+        self.units = dict(units or {})
+        self.failing = set(failing)
+        self.commands = []
+        self._next_index = 1
+        self._saved = None
+        self.add_link('lo', kind='', up=True, mtu=65536, address='00:00:00:00:00:00')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._saved = command.runner
+        command.runner = self
+
+    def stop(self):
+        command.runner = self._saved
+
+    def add_link(self, ifname: str, kind='dummy', up=False, mtu=1500, address=None, netns=None) -> dict:
+        index = self._next_index
+        self._next_index += 1
+        links = self.links if netns is None else self.netns.setdefault(netns, {})
+        link = links[ifname] = {
+            'ifindex': index,
+            'ifname': ifname,
+            'up': up,
+            'mtu': mtu,
+            'address': address or '02:00:00:%02x:%02x:%02x' % (index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff),
+            'alias': '',
+            'kind': kind,
+            'group': 0,
+            'addrs': [],
+        }
+        return link
+
+    def __call__(self, args, input):
+        if isinstance(args, str):
+            return 127, b'', b'fake: shell commands are not simulated'
+        self.commands.append(list(args))
+        program = args[0].rsplit('/', 1)[-1]
+        try:
+            if program == 'ip':
+                return self._ip(args[1:], input)
+            if program == 'systemctl':
+                return self._systemctl(args[1:])
+        except CommandFailed as e:
+            return e.code, b'', f'{e}\n'.encode()
+        return 127, b'', f'{program}: command not found\n'.encode()
+
+    def _link(self, ifname: str) -> dict:
+        link = self.links.get(ifname)
+        if link is None:
+            raise CommandFailed(f'Cannot find device "{ifname}"', 1)
+        return link
+
+    def _deletable(self, ifname: str):
+        # like physical interfaces, links without a kind can not be deleted
+        if not self._link(ifname)['kind']:
+            raise CommandFailed('RTNETLINK answers: Operation not supported')
+
+    def _ip(self, argv: list, input):
+        if argv == ['-V']:
+            return 0, b'ip utility, iproute2-fake\n', b''
+        if argv[:3] == ['-force', '-batch', '-']:
+            errors = []
+            lines = (input or b'').decode().splitlines()
+            for number, line in enumerate(lines, 1):
+                try:
+                    self._ip_command(shlex.split(line))
+                except CommandFailed as e:
+                    errors.append(f'{e}\nCommand failed -:{number}')
+            return (1 if errors else 0), b'', ''.join(f'{e}\n' for e in errors).encode()
+        if argv[:1] == ['-json']:
+            return 0, json.dumps(self._ip_json(argv[1:])).encode(), b''
+        self._ip_command(argv)
+        return 0, b'', b''
+
+    def _ip_json(self, argv: list) -> list:
+        if argv == ['-detail', 'link', 'show']:
+            return [{'ifindex': l['ifindex'], 'ifname': l['ifname'], 'flags': ['UP'] if l['up'] else [],
+                     'mtu': l['mtu'], 'address': l['address'], 'ifalias': l['alias'],
+                     'operstate': 'UNKNOWN' if l['up'] else 'DOWN', 'linkinfo': {'info_kind': l['kind']}}
+                    for l in self.links.values()]
+        if argv[:3] == ['addr', 'show', 'dev']:
+            link = self._link(argv[3])
+            return [{'ifname': link['ifname'], 'addr_info': [
+                {'local': addr.split('/')[0], 'prefixlen': int(addr.split('/')[1])} for addr in link['addrs']]}]
+        raise CommandFailed(f'fake: ip -json {" ".join(argv)} is not simulated', 1)
+
+    def _ip_command(self, argv: list):
+        obj, verb = argv[0], argv[1]
+        if obj == 'link' and verb == 'add':
+            # link add dev NAME [netns NS] type KIND [peer name PEER]
+            options = dict(zip(argv[4::2], argv[5::2]))
+            netns = options.get('netns')
+            links = self.links if netns is None else self.netns.setdefault(netns, {})
+            peer = argv[-1] if options['type'] == 'veth' and 'peer' in options else None
+            if argv[3] in links or peer in self.links:
+                raise CommandFailed('RTNETLINK answers: File exists')
+            self.add_link(argv[3], kind=options['type'], netns=netns)
+            if peer is not None:
+                # the peer stays in this namespace
+                self.add_link(peer, kind='veth')
+        elif obj == 'link' and verb == 'del' and argv[2] == 'group':
+            members = [name for name, link in self.links.items() if link['group'] == int(argv[3])]
+            for name in members:
+                self._deletable(name)
+            for name in members:
+                del self.links[name]
+        elif obj == 'link' and verb == 'del':
+            self._deletable(argv[3])
+            del self.links[argv[3]]
+        elif obj == 'link' and verb == 'set':
+            link = self._link(argv[3])
+            rest = argv[4:]
+            if rest == ['up'] or rest == ['down']:
+                link['up'] = rest[0] == 'up'
+            elif rest[0] == 'mtu':
+                link['mtu'] = int(rest[1])
+            elif rest[0] == 'address':
+                link['address'] = rest[1].lower()
+            elif rest[0] == 'alias':
+                link['alias'] = rest[1]
+            elif rest[0] == 'group':
+                link['group'] = int(rest[1])
+            else:
+                raise CommandFailed(f'fake: link set {" ".join(rest)} is not simulated', 1)
+        elif obj == 'addr' and verb in ('add', 'del'):
+            # addr add|del ADDR dev NAME
+            addr = argv[2] if '/' in argv[2] else argv[2] + ('/128' if ':' in argv[2] else '/32')
+            link = self._link(argv[4])
+            if verb == 'add':
+                if addr in link['addrs']:
+                    raise CommandFailed('RTNETLINK answers: File exists')
+                link['addrs'].append(addr)
+            else:
+                if addr not in link['addrs']:
+                    raise CommandFailed('RTNETLINK answers: Cannot assign requested address')
+                link['addrs'].remove(addr)
+        elif obj == 'addr' and verb == 'flush':
+            self._link(argv[3])['addrs'] = []
+        else:
+            raise CommandFailed(f'fake: ip {" ".join(argv)} is not simulated', 1)
+
+    def _systemctl(self, argv: list):
+        if argv[0] in SYSTEMCTL_JOBS:
+            failed = []
+            for unit in argv[1:]:
+                if unit in self.failing:
+                    self.units[unit] = 'failed'
+                    failed.append(unit)
+                elif argv[0] == 'stop':
+                    self.units[unit] = 'inactive'
+                elif argv[0] in ('start', 'restart') or self.units.get(unit) == 'active':
+                    self.units[unit] = 'active'
+            if failed:
+                raise CommandFailed(''.join(f'Job for {unit} failed.' for unit in failed), 1)
+            return 0, b'', b''
+        if argv[0] == 'show':
+            # show -p Id,ActiveState UNIT...
+            blocks = [f'Id={unit}\nActiveState={self.units.get(unit, "inactive")}' for unit in argv[3:]]
+            return 0, '\n\n'.join(blocks).encode() + b'\n', b''
+        if argv[0] == 'is-active':
+            state = self.units.get(argv[1], 'inactive')
+            return (0 if state == 'active' else 3), f'{state}\n'.encode(), b''
+        raise CommandFailed(f'fake: systemctl {argv[0]} is not simulated', 1)
@@ -0,0 +1,52 @@
+import unittest
+
+from ifmanage.backend import CommandBackend
+from ifmanage.batch import Batch
+from ifmanage.linktable import LinkTable
+from ifmanage.service import SystemctlManager
+from test.fake_commands import FakeCommands
+from util import command
+
+
+class TestFakeCommands(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeCommands(units={'a.service': 'active'}, failing={'bad.service'})
+        self.fake.start()
+        self.fake.add_link('ifmtf0')
+        self.backend = CommandBackend()
+
+    def tearDown(self):
+        self.fake.stop()
+        self.assertIsNone(command.runner)
+
+    def test_backend(self):
+        self.backend.set_mtu('ifmtf0', 1400)
+        self.backend.set_state('ifmtf0', True)
+        self.backend.add_addr('ifmtf0', '192.0.2.1/24')
+        link = self.fake.links['ifmtf0']
+        self.assertEqual((link['mtu'], link['up'], link['addrs']), (1400, True, ['192.0.2.1/24']))
+        self.assertEqual(self.fake.commands[0], ['ip', 'link', 'set', 'dev', 'ifmtf0', 'mtu', '1400'])
+        with self.assertRaises(OSError):
+            self.backend.set_mtu('ifmtnope', 1400)
+
+    def test_batch(self):
+        batch = Batch(self.backend)
+        batch.set_mtu('ifmtf0', 1400)
+        batch.set_alias('ifmtf0', 'batched')
+        batch.set_mtu('ifmtnope', 1400)
+        batch.apply()
+        self.assertEqual([o.ok for o in batch.operations], [True, True, False])
+        self.assertEqual(self.fake.links['ifmtf0']['alias'], 'batched')
+
+    def test_link_table(self):
+        table = LinkTable(self.backend)
+        self.assertIn('ifmtf0', table)
+        self.assertEqual(table.get('ifmtf0').mtu, 1500)
+
+    def test_systemctl(self):
+        manager = SystemctlManager()
+        errors = manager.run_jobs([('stop', 'a.service'), ('start', 'b.service'), ('start', 'bad.service')])
+        self.assertEqual(errors[:2], [None, None])
+        self.assertIsInstance(errors[2], OSError)
+        self.assertEqual(manager.active_states(['a.service', 'b.service', 'bad.service']),
+                         {'a.service': 'inactive', 'b.service': 'active', 'bad.service': 'failed'})
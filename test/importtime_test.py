@@ -0,0 +1,45 @@
+import subprocess
+import sys
+import unittest
+
+# cumulative import time ceilings in microseconds, about twice what they
+# measure on a laptop with byte-compiled sources
+BUDGETS = {
+    'ifmanage.query': 5000,
+    'ifmanage.interface': 60000,
+}
+# only loaded once a feature needing them is used
+LAZY = ('jinja2', 'asyncio', 'json', 'ipaddress', 'concurrent.futures', 'tempfile', 'hashlib')
+
+
+def import_times(module: str) -> dict:
+    """
+    {module: cumulative microseconds} as reported by python -X importtime
+    for a fresh interpreter importing module.
+    """
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[12:].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_lazy(self):
+        for module in BUDGETS:
+            loaded = import_times(module)
+            self.assertEqual([name for name in LAZY if name in loaded], [], module)
+
+    def test_budget(self):
+        for module, budget in BUDGETS.items():
+            # the best of a few runs, to not fail on a busy machine
+            best = min(import_times(module)[module] for _ in range(3))
+            self.assertLess(best, budget, module)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
 
+from ifmanage import interface
+from ifmanage.backend import DELETE_GROUP, CommandBackend, Link
 from ifmanage.interface import Interface
+from ifmanage.reconcile import diff
+from test.fake_commands import FakeCommands
+from test.systemd_fake import FakeManager
 
 
 class TestInterface(unittest.TestCase):
@@ -15,5 +23,108 @@ class TestInterface(unittest.TestCase):
         self.assertEqual(obj.exist(), False)
 
 
+class TestLifecycle(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='ifmanage-dhcp-')
+        self.saved = interface.DHCP_CONFIG_BASE, interface.DHCPV6_CONFIG_DIR
+        interface.DHCP_CONFIG_BASE = f'{self.dir}/dhcp-client'
+        interface.DHCPV6_CONFIG_DIR = self.dir
+        self.fake = FakeCommands()
+        self.fake.start()
+        self.backend = CommandBackend()
+        self.manager = FakeManager({'dhcp-client@ifmtl1.service': 'active'})
+
+    def tearDown(self):
+        self.fake.stop()
+        interface.DHCP_CONFIG_BASE, interface.DHCPV6_CONFIG_DIR = self.saved
+        shutil.rmtree(self.dir)
+
+    def interfaces(self, count):
+        return [Interface(f'ifmtl{i}', backend=self.backend, services=self.manager, type='dummy')
+                for i in range(count)]
+
+    def test_create_many(self):
+        self.fake.add_link('ifmtl2')
+        errors = Interface.create_many(self.interfaces(3))
+        self.assertEqual(errors[:2], [None, None])
+        self.assertIsInstance(errors[2], OSError)
+        self.assertEqual(len([c for c in self.fake.commands if c[0] == 'ip']), 1)
+
+        Interface.create_many(self.interfaces(2), netns='blue')
+        self.assertEqual(sorted(self.fake.netns['blue']), ['ifmtl0', 'ifmtl1'])
+
+    def test_create_veth(self):
+        # the peer is named as with the netlink backend
+        Interface('ifmtl0', backend=self.backend, type='veth').create()
+        self.assertEqual(self.fake.links['ifmtl0p']['kind'], 'veth')
+
+    def test_remove_many(self):
+        interfaces = self.interfaces(3)
+        Interface.create_many(interfaces)
+        with open(f'{self.dir}/dhcp-client_ifmtl1.conf', 'w'):
+            pass
+        with open(f'{self.dir}/dhcp-client_ifmtl1.pid', 'w'):
+            pass
+        del self.fake.links['ifmtl2']
+
+        # ifmtl2 is already gone, that is what was asked for
+        self.assertEqual(Interface.remove_many(interfaces), [None, None, None])
+        self.assertEqual(self.fake.links.keys(), {'lo'})
+        # create, move into the group and delete the group
+        self.assertEqual(len([c for c in self.fake.commands if c[0] == 'ip']), 3)
+        # only the interface with client files left was looked at
+        self.assertEqual(self.manager.jobs, [('stop', 'dhcp-client@ifmtl1.service')])
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_remove_many_dhcp_stop(self):
+        interfaces = self.interfaces(3)
+        Interface.create_many(interfaces)
+        for name in ('dhcp-client_ifmtl1.conf', 'dhcp-client_ifmtl1.pid', 'dhcp-client_ifmtl2.conf'):
+            with open(f'{self.dir}/{name}', 'w'):
+                pass
+        self.manager.states['dhcp-client@ifmtl2.service'] = 'active'
+        self.manager.failing.add('dhcp-client@ifmtl2.service')
+        run_jobs = self.manager._run_jobs
+
+        def exiting_client(jobs, timeout):
+            # dhclient removes its pid file on exit
+            os.remove(f'{self.dir}/dhcp-client_ifmtl1.pid')
+            return run_jobs(jobs, timeout)
+        self.manager._run_jobs = exiting_client
+
+        errors = Interface.remove_many(interfaces)
+        self.assertEqual(errors[:2], [None, None])
+        self.assertIsInstance(errors[2], OSError)
+        self.assertEqual(self.fake.links.keys(), {'lo'})
+        # kept for a retry of the client that did not stop
+        self.assertEqual(os.listdir(self.dir), ['dhcp-client_ifmtl2.conf'])
+
+    def test_reconcile_dhcp_files(self):
+        obj = Interface('ifmtl0', address=['dhcp', 'dhcpv6'])
+        link = Link(42, 'ifmtl0', True, 1500, '02:00:00:00:00:01', '', 'up', 'dummy')
+        self.assertEqual([o.op for o in diff(obj, link, set())], ['set_dhcp', 'set_dhcpv6'])
+        for file in (f'{self.dir}/dhcp-client_ifmtl0.conf', f'{self.dir}/dhcp6c.ifmtl0.conf'):
+            with open(file, 'w'):
+                pass
+        self.assertEqual(diff(obj, link, set()), [])
+
+    def test_delete_many_fallback(self):
+        Interface.create_many(self.interfaces(2))
+        self.fake.links['lo']['group'] = 5
+        errors = self.backend.delete_many(['ifmtl0', 'lo', 'ifmtl1'])
+        self.assertEqual(errors[0::2], [None, None])
+        self.assertIsInstance(errors[1], OSError)
+        self.assertEqual(self.fake.links.keys(), {'lo'})
+        # fake links are not in sysfs, lo's group is restored from there
+        self.assertNotEqual(self.fake.links['lo']['group'], DELETE_GROUP)
+
+    def test_remove_without_dhcp(self):
+        obj = self.interfaces(1)[0]
+        obj.create()
+        obj.remove()
+        self.assertEqual(self.manager.jobs, [])
+        self.assertEqual(self.fake.links.keys(), {'lo'})
+
+
 if __name__ == '__main__':
     unittest.main()
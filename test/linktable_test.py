@@ -0,0 +1,40 @@
+import os
+import unittest
+
+from ifmanage.backend import get_backend
+from ifmanage.linktable import LinkTable
+
+
+class TestLinkTable(unittest.TestCase):
+    def test_lookup(self):
+        table = LinkTable(max_age=60)
+        lo = table.get("lo")
+        self.assertEqual(lo.ifindex, 1)
+        self.assertTrue(lo.up)
+        self.assertIs(table.by_index(1), lo)
+        self.assertIn("lo", table)
+        self.assertIsNone(table.get("esfd"))
+        with self.assertRaises(OSError):
+            table.lookup("esfd")
+
+    def test_backends_agree(self):
+        netlink = {link.ifname: link for link in get_backend('netlink').dump_links()}
+        command = {link.ifname: link for link in get_backend('command').dump_links()}
+        self.assertEqual(netlink, command)
+
+    @unittest.skipUnless(os.geteuid() == 0, "requires root")
+    def test_generation(self):
+        backend = get_backend('netlink')
+        table = LinkTable(backend, max_age=60)
+        self.assertNotIn("ifmtl0", table)
+        backend.create("ifmtl0", "veth")
+        try:
+            self.assertIn("ifmtl0", table)
+            backend.set_mtu("ifmtl0", 1400)
+            self.assertEqual(table.get("ifmtl0").mtu, 1400)
+        finally:
+            backend.delete("ifmtl0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import errno
+import os
+import threading
+import unittest
+
+from ifmanage.backend import get_backend
+from ifmanage.interface import Interface
+from ifmanage.linktable import get_link_table, set_link_table
+from ifmanage.monitor import FALLBACK_MAX_AGE, LinkCache, LINK_NEW, ADDR_NEW
+from util import validate
+
+
+@unittest.skipUnless(os.geteuid() == 0, "requires root")
+class TestLinkCache(unittest.TestCase):
+    def setUp(self):
+        self.previous = get_link_table()
+        self.cache = LinkCache().install()
+
+    def tearDown(self):
+        self.cache.stop()
+        set_link_table(self.previous)
+        validate.set_address_source(None)
+
+    def wait_for(self, event, ifname):
+        done = threading.Event()
+
+        def callback(e, name, value):
+            if e == event and name == ifname:
+                done.set()
+        self.cache.subscribe(callback)
+        return done
+
+    def test_events(self):
+        obj = Interface("ifmtm0", backend='netlink', type='veth')
+        self.assertFalse(obj.exist())
+
+        created = self.wait_for(LINK_NEW, "ifmtm0")
+        obj.create()
+        try:
+            self.assertTrue(created.wait(2))
+            self.assertTrue(obj.exist())
+
+            added = self.wait_for(ADDR_NEW, "ifmtm0")
+            get_backend('netlink').add_addr("ifmtm0", "192.0.2.1/24")
+            self.assertTrue(added.wait(2))
+            self.assertTrue(validate.is_interface_addr_assigned("ifmtm0", "192.0.2.1/24"))
+            self.assertTrue(validate.is_interface_addr_assigned("ifmtm0", "192.0.2.1"))
+            self.assertFalse(validate.is_interface_addr_assigned("ifmtm0", "192.0.2.1/25"))
+        finally:
+            obj.delete()
+
+    def test_failing_callback(self):
+        def broken(event, ifname, value):
+            raise RuntimeError('subscriber bug')
+        self.cache.subscribe(broken)
+        created = self.wait_for(LINK_NEW, "ifmtm1")
+        obj = Interface("ifmtm1", backend='netlink', type='veth')
+        with self.assertLogs('ifmanage.monitor', 'ERROR'):
+            obj.create()
+            try:
+                self.assertTrue(created.wait(2))
+            finally:
+                obj.delete()
+        self.assertTrue(self.cache.live)
+        self.assertFalse(self.cache.is_stale())
+
+    def test_monitor_failure(self):
+        def recv():
+            raise OSError(errno.EBADF, 'socket gone')
+        self.cache._events._recv = recv
+        with self.assertLogs('ifmanage.monitor', 'ERROR'):
+            # the thread is sitting in recv(), the next one fails
+            self.cache._thread.join(2)
+        self.assertFalse(self.cache.live)
+        self.assertTrue(self.cache.is_stale())
+        self.assertEqual(self.cache.max_age, FALLBACK_MAX_AGE)
+
+        # one dump, then lookups are served from it for max_age
+        dumps = []
+        refresh = self.cache.refresh
+
+        def counting_refresh():
+            dumps.append(1)
+            refresh()
+        self.cache.refresh = counting_refresh
+        self.assertEqual(Interface("lo").get_link().ifname, "lo")
+        self.assertEqual(Interface("lo").get_link().ifname, "lo")
+        self.assertFalse(self.cache.is_stale())
+        self.assertEqual(len(dumps), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from ifmanage import query
+from ifmanage.linktable import LinkTable
+
+
+class TestQuery(unittest.TestCase):
+    def test_show(self):
+        link = LinkTable().get('lo')
+        expected = link._asdict()
+        del expected['kind']
+        self.assertEqual(query.show('lo'), expected)
+        self.assertIn('lo', query.interfaces())
+        self.assertTrue(query.exists('lo'))
+
+    def test_missing(self):
+        self.assertFalse(query.exists('ifmqnope'))
+        # invalid names do not exist, whatever their path points to
+        for ifname in ('', '.', '../net', 'lo/..'):
+            self.assertFalse(query.exists(ifname), ifname)
+        with self.assertRaises(OSError):
+            query.get_mtu('ifmqnope')
+        with self.assertRaises(ValueError):
+            query.get_mtu('../lo')
+        self.assertEqual(query.main(['exists', 'ifmqnope']), 1)
+        self.assertEqual(query.main(['frobnicate']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import unittest
+
+from socket import inet_pton, AF_INET, AF_INET6
+
+from ifmanage.backend import Link, get_backend
+from ifmanage.interface import Interface
+from ifmanage.reconcile import diff, reconcile
+from util.command import cmd
+
+
+class TestDiff(unittest.TestCase):
+    def test_dynamic_addresses(self):
+        link = Link(42, 'ifmtr0', True, 1500, '02:00:00:00:00:01', '', 'up', 'veth')
+        lease = (inet_pton(AF_INET, '203.0.113.7'), 24)
+        slaac = (inet_pton(AF_INET6, '2001:db8::5054:ff:fe00:1'), 64)
+        stale = (inet_pton(AF_INET, '198.51.100.1'), 24)
+        assigned = {lease, slaac, stale}
+
+        # lifetimes mark the lease and the SLAAC address, only the rest goes
+        ops = diff(Interface('ifmtr0', address=['198.51.100.2/24']), link, assigned, {lease, slaac})
+        self.assertEqual([o.args for o in ops if o.op == 'del_addr'], [('198.51.100.1/24',)])
+
+        # with dhcp configured a permanent lease stays too
+        ops = diff(Interface('ifmtr0', address=['dhcp']), link, assigned, {slaac})
+        self.assertEqual([o for o in ops if o.op == 'del_addr'], [])
+
+
+@unittest.skipUnless(os.geteuid() == 0, "requires root")
+class TestReconcile(unittest.TestCase):
+    def setUp(self):
+        cmd('ip link add dev ifmtr0 type veth peer name ifmtr1')
+        cmd('ip addr add 198.51.100.1/24 dev ifmtr0')
+
+    def tearDown(self):
+        cmd('ip link del dev ifmtr0')
+
+    def test_apply(self):
+        obj = Interface("ifmtr0", backend='netlink', mtu="1400", description="uplink",
+                        address=["192.0.2.1/24", "2001:db8::1/64"])
+        ops = obj.apply()
+        self.assertEqual(sorted(o.op for o in ops),
+                         ['add_addr', 'add_addr', 'del_addr', 'set_alias', 'set_mtu', 'set_state'])
+        self.assertTrue(all(o.ok for o in ops), ops)
+
+        self.assertEqual(obj.get_alias(), "uplink")
+        self.assertEqual(sorted(get_backend('netlink').get_addrs("ifmtr0"))[:2], ["192.0.2.1/24", "2001:db8::1/64"])
+
+        generation = get_backend('netlink').generation
+        self.assertEqual(obj.apply(), [])
+        self.assertEqual(get_backend('netlink').generation, generation)
+
+        # an address with a lifetime is not ours to remove
+        cmd('ip addr add 203.0.113.7/24 dev ifmtr0 valid_lft 300 preferred_lft 300')
+        self.assertEqual(obj.apply(), [])
+
+    def test_fleet(self):
+        objs = [Interface("ifmtr0", disable=True), Interface("ifmtr1", disable=True), Interface("ifmtnope")]
+        ops = reconcile(objs, dry_run=True)
+        self.assertEqual([o.ifname for o in ops if o.error], ["ifmtnope"])
+        self.assertEqual(reconcile(objs[:2]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import socket
+import unittest
+
+from ifmanage.backend import Backend, Neighbor, Route, get_backend
+from ifmanage.route import RouteTable, neighbor, normalize_prefix, route
+from util.command import cmd
+
+TABLE = 4242
+
+
+class FakeBackend(Backend):
+    def __init__(self, routes=(), neighbors=()):
+        self.routes = list(routes)
+        self.neighbors = list(neighbors)
+        self.ops = []
+
+    def dump_routes(self):
+        return self.routes
+
+    def dump_neighbors(self):
+        return self.neighbors
+
+    def run_batch(self, ops):
+        self.ops.extend(ops)
+        return [None] * len(ops)
+
+
+class TestRouteTable(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize_prefix('default'), '0.0.0.0/0')
+        self.assertEqual(normalize_prefix('default', 10), '::/0')
+        self.assertEqual(normalize_prefix('198.51.100.77/24'), '198.51.100.0/24')
+        self.assertEqual(normalize_prefix('2001:DB8:0::1/32'), '2001:db8::/32')
+        self.assertEqual(normalize_prefix('198.51.100.7'), '198.51.100.7/32')
+        with self.assertRaises(ValueError):
+            normalize_prefix('198.51.100.0/33')
+        with self.assertRaises(ValueError):
+            route('198.51.100.0/24')
+        with self.assertRaises(ValueError):
+            route('198.51.100.0/24', 'fd00::1')
+        self.assertEqual(route('default', 'FD00::1').dst, '::/0')
+        # without a gateway the family of a default route is not implied
+        with self.assertRaises(ValueError):
+            route('default', ifname='eth1')
+        self.assertEqual(route('default', ifname='eth1', family=socket.AF_INET6).dst, '::/0')
+        with self.assertRaises(ValueError):
+            route('198.51.100.0/24', ifname='eth1', family=socket.AF_INET6)
+        self.assertEqual(neighbor('eth1', '203.0.113.9', '02:AA:00:00:00:01').lladdr, '02:aa:00:00:00:01')
+
+    def test_diff(self):
+        current = [
+            Route('198.51.100.0/24', '203.0.113.1', 'eth1', 0, 254, 4),
+            Route('198.51.101.0/24', '203.0.113.1', 'eth1', 0, 254, 4),
+            Route('2001:db8::/32', None, 'eth1', 1024, 254, 4),
+            # not ours: other protocol and other table
+            Route('203.0.113.0/24', None, 'eth1', 0, 254, 2),
+            Route('198.51.102.0/24', '203.0.113.1', 'eth1', 0, 100, 4),
+        ]
+        neighbors = [
+            Neighbor('eth1', '203.0.113.9', '02:00:00:00:00:09', 0x80),
+            Neighbor('eth1', '203.0.113.1', '02:00:00:00:00:01', 0x02),
+            Neighbor('eth2', '203.0.113.10', '02:00:00:00:00:10', 0x80),
+        ]
+        backend = FakeBackend(current, neighbors)
+        table = RouteTable(backend)
+        desired = [
+            route('198.51.100.0/24', '203.0.113.1'),
+            ('198.51.101.0/24', '203.0.113.2'),
+            route('2001:db8::/32', ifname='eth1', metric=1024),
+            route('198.51.103.0/24', ifname='eth1'),
+        ]
+        ops = table.diff(desired, {'eth1': [('203.0.113.9', '02:00:00:00:00:19')]}, metrics={'eth1': 10})
+        self.assertEqual([(o.op, o.ifname) + o.args for o in ops], [
+            ('replace_route', None, '198.51.101.0/24', '203.0.113.2', 0, 254, 4),
+            ('replace_route', 'eth1', '198.51.103.0/24', None, 10, 254, 4),
+            ('replace_neigh', 'eth1', '203.0.113.9', '02:00:00:00:00:19'),
+        ])
+
+        # the metric is part of the key, a new metric replaces the old route
+        ops = table.diff([route('198.51.100.0/24', '203.0.113.1', metric=5)], {'eth1': []})
+        self.assertEqual([(o.op,) + o.args[:1] for o in ops], [
+            ('del_route', '198.51.100.0/24'), ('del_route', '198.51.101.0/24'), ('del_route', '2001:db8::/32'),
+            ('del_neigh', '203.0.113.9'), ('replace_route', '198.51.100.0/24'),
+        ])
+        with self.assertRaises(ValueError):
+            table.diff([route('198.51.100.0/24', '203.0.113.1'), route('198.51.100.0/24', '203.0.113.2')])
+
+        table.apply(desired, metrics={'eth1': 10})
+        self.assertEqual(len(backend.ops), 2)
+        self.assertEqual(table.diff(desired, metrics={'eth1': 10}), [])
+
+
+@unittest.skipUnless(os.geteuid() == 0, "requires root")
+class TestRouteBackend(unittest.TestCase):
+    def check_backend(self, name):
+        ifname = f'ifmtrt{name[:3]}'
+        cmd(f'ip link add dev {ifname} type veth peer name {ifname}p')
+        try:
+            cmd(f'ip link set dev {ifname} up')
+            cmd(f'ip addr add 203.0.113.2/24 dev {ifname}')
+            cmd(f'ip -6 addr add 2001:db8:42::2/64 dev {ifname} nodad')
+            table = RouteTable(name, table=TABLE)
+            desired = [route(f'198.51.100.{i * 4}/30', '203.0.113.1') for i in range(20)]
+            desired += [route('default', ifname=ifname, family=socket.AF_INET), route('2001:db8:1::/48', '2001:db8:42::1', ifname)]
+            neighbors = {ifname: [('203.0.113.1', '02:00:00:00:42:01'), ('2001:db8:42::1', '02:00:00:00:42:02')]}
+            ops = table.apply(desired, neighbors, metrics={ifname: 7})
+            self.assertEqual(len(ops), 24)
+            self.assertEqual([o.error for o in ops], [None] * 24)
+            self.assertIn('198.51.100.4/30 via 203.0.113.1', cmd(f'ip route show table {TABLE}'))
+            self.assertIn('metric 7', cmd(f'ip -6 route show table {TABLE}'))
+            self.assertIn('PERMANENT', cmd(f'ip neigh show 203.0.113.1 dev {ifname}'))
+
+            # a fresh table read from the kernel agrees, nothing to do
+            self.assertEqual(RouteTable(name, table=TABLE).diff(desired, neighbors, {ifname: 7}), [])
+
+            desired[0] = route('198.51.100.0/30', '203.0.113.3')
+            del desired[1]
+            ops = table.apply(desired, {ifname: []}, metrics={ifname: 7})
+            self.assertEqual(sorted(o.op for o in ops), ['del_neigh', 'del_neigh', 'del_route', 'replace_route'])
+            self.assertEqual([o.error for o in ops], [None] * 4)
+            routes = cmd(f'ip route show table {TABLE}')
+            self.assertIn('198.51.100.0/30 via 203.0.113.3', routes)
+            self.assertNotIn('198.51.100.4/30', routes)
+            self.assertEqual(RouteTable(name, table=TABLE).diff(desired, {ifname: []}, {ifname: 7}), [])
+
+            # errors stay with their operation
+            ops = table.apply(desired + [route('198.51.101.0/24', ifname='ifmtnone')], metrics={ifname: 7})
+            self.assertIsInstance(ops[0].error, OSError)
+            self.assertEqual(len(table.routes), len(desired))
+        finally:
+            cmd(f'ip link del dev {ifname}')
+            cmd(f'ip route flush table {TABLE}')
+            cmd(f'ip -6 route flush table {TABLE}')
+        self.assertIs(table.backend, get_backend(name))
+
+    def test_netlink(self):
+        self.check_backend('netlink')
+
+    def test_command(self):
+        self.check_backend('command')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from ifmanage.scantable import (BAND_2G, BAND_5G, SECURITY_EAP, SECURITY_OPEN, SECURITY_PSK, WPA2_PSK, Profile,
+                                ScanTable)
+
+REPLY = ("bssid / frequency / signal level / flags / ssid\n"
+         "02:00:00:00:00:01\t2412\t-40\t[WPA2-PSK-CCMP][ESS]\thome\n"
+         "02:00:00:00:00:02\t5180\t-60\t[WPA2-PSK-CCMP][ESS]\thome\n"
+         "02:00:00:00:00:03\t5200\t-50\t[WPA2-EAP-CCMP][ESS]\twork\n"
+         "02:00:00:00:00:04\t2437\t-70\t[ESS]\tcafe\n")
+
+
+class TestScanTable(unittest.TestCase):
+    def test_indexes(self):
+        table = ScanTable.from_reply(REPLY)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(sorted(table.ssids()), ['cafe', 'home', 'work'])
+        self.assertEqual(len(table.by_ssid('home')), 2)
+        self.assertEqual({e.bssid for e in table.by_band(BAND_5G)}, {'02:00:00:00:00:02', '02:00:00:00:00:03'})
+        self.assertEqual([e.ssid for e in table.by_security(SECURITY_EAP)], ['work'])
+        self.assertEqual([e.ssid for e in table.by_security(SECURITY_OPEN)], ['cafe'])
+
+    def test_top(self):
+        table = ScanTable.from_reply(REPLY)
+        self.assertEqual([e.signal for e in table.top(2)], [-40, -50])
+        self.assertEqual([e.signal for e in table.top(5, band=BAND_5G, security=SECURITY_PSK)], [-60])
+        self.assertEqual(table.top(1, ssid='missing'), [])
+
+    def test_remove(self):
+        table = ScanTable.from_reply(REPLY)
+        table.remove('02:00:00:00:00:04')
+        self.assertNotIn('02:00:00:00:00:04', table)
+        self.assertEqual(table.by_security(SECURITY_OPEN), [])
+        self.assertEqual(table.by_band(BAND_2G)[0].ssid, 'home')
+
+    def test_profile_view(self):
+        table = ScanTable.from_reply(REPLY)
+        home = [p for p in table.profiles() if p.ssid == 'home'][0]
+        self.assertEqual(home.RSSI, -40)
+        self.assertEqual(home.frequency, [BAND_2G, BAND_5G])
+        self.assertEqual(home.akm, [WPA2_PSK])
+        self.assertEqual(len(home.bss), 2)
+
+        table.remove('02:00:00:00:00:01')
+        table.remove('02:00:00:00:00:02')
+        self.assertIsNone(home.RSSI)
+        self.assertEqual(home.frequency, [])
+
+    def test_profile_kwargs(self):
+        profile = Profile(ssid='manual', RSSI=-30, frequency=[BAND_2G], akm=[WPA2_PSK])
+        profile.password = 'secret'
+        self.assertEqual(profile.password, 'secret')
+        self.assertEqual(profile.akm, [WPA2_PSK])
+        self.assertEqual(profile.bss, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from ifmanage.interface import Interface
+from ifmanage.service import DBusManager, get_manager
+from test.systemd_fake import FakeManager, FakeSystemd
+from util import dbus
+
+
+class TestDBus(unittest.TestCase):
+    def test_marshal(self):
+        msg = dbus.Message(dbus.SIGNAL, serial=7, path='/a', interface='a.b', member='C', signature='ya{sv}(xd)as',
+                           body=(3, {'x': ('u', 1), 'y': ('as', ['p', 'q'])}, (-2, 0.5), ['', 'z']))
+        data = msg.pack()
+        self.assertEqual(dbus.Message.size(data), len(data))
+        parsed = dbus.Message.unpack(data)
+        self.assertEqual((parsed.serial, parsed.path, parsed.member), (7, '/a', 'C'))
+        self.assertEqual(parsed.body, [3, {'x': 1, 'y': ['p', 'q']}, (-2, 0.5), ['', 'z']])
+
+
+@unittest.skipUnless(FakeSystemd.available(), 'needs dbus-daemon')
+class TestDBusManager(unittest.TestCase):
+    def setUp(self):
+        self.systemd = FakeSystemd({'a.service': 'inactive'}, failing={'bad.service'})
+        self.systemd.start()
+        self.manager = DBusManager(self.systemd.address)
+
+    def tearDown(self):
+        self.manager.close()
+        self.systemd.stop()
+
+    def test_jobs(self):
+        errors = self.manager.run_jobs([('restart', 'a.service'), ('start', 'b.service'), ('start', 'bad.service')])
+        self.assertEqual(errors[:2], [None, None])
+        self.assertIsInstance(errors[2], OSError)
+        self.assertEqual(self.manager.active_states(['a.service', 'b.service', 'bad.service', 'c.service']),
+                         {'a.service': 'active', 'b.service': 'active', 'bad.service': 'failed',
+                          'c.service': 'inactive'})
+        with self.assertRaises(OSError):
+            self.manager.start('bad.service')
+
+    def test_order(self):
+        # the start must not replace the stop queued before it
+        self.assertEqual(self.manager.run_jobs([('stop', 'a.service'), ('start', 'a.service')]), [None, None])
+        self.assertEqual(self.systemd.calls.count('StopUnit'), 1)
+        self.assertTrue(self.manager.is_active('a.service'))
+
+    def test_state_cache(self):
+        self.assertFalse(self.manager.is_active('a.service'))
+        self.assertFalse(self.manager.is_active('a.service'))
+        self.assertEqual(self.systemd.calls.count('Get'), 1)
+
+        # updated by PropertiesChanged without asking again
+        self.systemd.set_state('a.service', 'active')
+        self.manager.run_jobs([('start', 'b.service')])
+        self.assertTrue(self.manager.is_active('a.service'))
+        self.assertEqual(self.systemd.calls.count('Get'), 1)
+
+
+class TestInterfaceServices(unittest.TestCase):
+    def test_dhcp_stop(self):
+        manager = FakeManager({'dhcp6c@ifx0.service': 'active'})
+        interface = Interface('ifx0', services=manager)
+        self.assertIs(interface.services, manager)
+        interface.set_dhcpv6(False)
+        interface.set_dhcp(False)
+        # dhcp-client was not running, nothing to stop
+        self.assertEqual(manager.jobs, [('stop', 'dhcp6c@ifx0.service')])
+
+    def test_get_manager(self):
+        manager = FakeManager()
+        self.assertIs(get_manager(manager), manager)
+        self.assertIs(get_manager('systemctl'), get_manager('systemctl'))
+        with self.assertRaises(ValueError):
+            get_manager('upstart')
+
+
+if __name__ == '__main__':
+    unittest.main()
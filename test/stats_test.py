@@ -0,0 +1,73 @@
+import unittest
+from array import array
+
+from ifmanage.interface import Interface
+from ifmanage.stats import FIELDS, RATE_FIELDS, StatsSampler, dump_netlink, dump_sysfs, read_stats
+
+
+class FakeCounters(object):
+    """
+    Source for StatsSampler returning counters set by the test, keyed by
+    ifindex.
+    """
+
+    def __init__(self):
+        self.counters = {}
+
+    def __call__(self, fields):
+        indexes = array('i', self.counters)
+        return indexes, {field: array('Q', [self.counters[i].get(field, 0) for i in indexes]) for field in fields}
+
+
+class TestStats(unittest.TestCase):
+    def test_sources_agree(self):
+        lo = Interface('lo').get_stats()
+        self.assertEqual(lo._fields, FIELDS)
+        sysfs = read_stats('lo', 'sysfs')
+        self.assertLessEqual(lo.rx_packets, sysfs.rx_packets)
+        with self.assertRaises(OSError):
+            read_stats('esfd')
+        with self.assertRaises(OSError):
+            read_stats('esfd', 'sysfs')
+
+        netlink_indexes, netlink = dump_netlink(RATE_FIELDS)
+        sysfs_indexes, sysfs = dump_sysfs(RATE_FIELDS)
+        self.assertEqual(sorted(netlink_indexes), sorted(sysfs_indexes))
+        self.assertEqual(len(netlink['rx_bytes']), len(netlink_indexes))
+
+    def test_rates(self):
+        fake = FakeCounters()
+        clock = iter(range(100))
+        sampler = StatsSampler(size=3, source=fake, clock=lambda: float(next(clock)))
+        # 1 is lo, the others do not exist and are named by their ifindex
+        fake.counters = {1: {'rx_bytes': 100, 'rx_packets': 10}, 99002: {'rx_bytes': 0}}
+        sampler.sample()
+        self.assertEqual(sampler.rates('rx_bytes'), {})
+
+        fake.counters = {1: {'rx_bytes': 300, 'rx_packets': 18, 'rx_errors': 2}, 99002: {'rx_bytes': 50}}
+        sampler.sample()
+        self.assertEqual(sampler.rates('rx_bytes'), {'lo': 200.0, '99002': 50.0})
+        self.assertEqual(sampler.error_rates(), {'lo': 0.2, '99002': 0.0})
+
+        # 99002 is gone, 99003 is new and the counters of lo were reset
+        fake.counters = {99003: {'rx_bytes': 10}, 1: {'rx_bytes': 5}}
+        sampler.sample()
+        self.assertEqual(sampler.rates('rx_bytes'), {'lo': 0.0})
+        self.assertEqual(sampler.rates('rx_bytes', window=2), {'lo': 0.0})
+
+        # more interfaces than ever, the ring grows and wraps
+        fake.counters = {i: {'rx_bytes': 1000} for i in [1] + list(range(99003, 99012))}
+        sampler.sample()
+        self.assertEqual(sampler.capacity, 10)
+        self.assertEqual(sampler.rates('rx_bytes'), {'lo': 995.0, '99003': 990.0})
+        self.assertEqual(sampler.rates('rx_bytes', window=2)['lo'], 350.0)
+        self.assertEqual(len(sampler.latest('rx_bytes')), 10)
+
+        with self.assertRaises(ValueError):
+            sampler.rates('rx_bytes', window=3)
+        with self.assertRaises(ValueError):
+            sampler.rates('collisions')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import itertools
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from ifmanage.service import (MANAGER_INTERFACE, NO_SUCH_UNIT, PROPERTIES_INTERFACE, SYSTEMD, SYSTEMD_PATH,
+                              UNIT_INTERFACE, ServiceManager)
+from util import dbus
+
+# a bus without service activation, anyone may own and call anything
+BUS_CONFIG = """<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>custom</type>
+  <listen>unix:dir={dir}</listen>
+  <auth>EXTERNAL</auth>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+"""
+
+
+def unit_path(unit: str) -> str:
+    escaped = ''.join(c if c.isalnum() else f'_{ord(c):02x}' for c in unit)
+    return f'{SYSTEMD_PATH}/unit/{escaped}'
+
+
+class FakeManager(ServiceManager):
+    """
+    In memory ServiceManager recording the jobs it is asked to run. Jobs on
+    units in failing fail and leave them 'failed'.
+    """
+    name = 'fake'
+
+    def __init__(self, states=None, failing=()):
+        self.states = dict(states or {})
+        self.failing = set(failing)
+        self.jobs = []
+
+    def _run_jobs(self, jobs: list, timeout: float) -> list:
+        errors = []
+        for action, unit in jobs:
+            self.jobs.append((action, unit))
+            if unit in self.failing:
+                self.states[unit] = 'failed'
+                errors.append(OSError(f'{action} {unit}: job failed'))
+                continue
+            if action == 'stop':
+                self.states[unit] = 'inactive'
+            elif action in ('start', 'restart') or self.states.get(unit) == 'active':
+                self.states[unit] = 'active'
+            errors.append(None)
+        return errors
+
+    def active_states(self, units) -> dict:
+        return {unit: self.states.get(unit, 'inactive') for unit in units}
+
+
+class FakeSystemd(object):
+    """
+    Stand-in for systemd's D-Bus API, served on a private dbus-daemon.
+    Units in states are loaded, others get loaded by their first job.
+    Every method call name is appended to calls.
+    """
+
+    def __init__(self, states=None, failing=(), job_delay=0.01):
+        self.states = dict(states or {})
+        self.failing = set(failing)
+        self.job_delay = job_delay
+        self.calls = []
+        self.address = None
+        self._dir = None
+        self._daemon = None
+        self._bus = None
+        self._jobs = itertools.count(1)
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which('dbus-daemon') is not None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._dir = tempfile.mkdtemp(prefix='ifmanage-dbus-')
+        config = os.path.join(self._dir, 'bus.conf')
+        with open(config, 'w') as f:
+            f.write(BUS_CONFIG.format(dir=self._dir))
+        self._daemon = subprocess.Popen(['dbus-daemon', f'--config-file={config}', '--print-address=1', '--nofork'],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.address = self._daemon.stdout.readline().decode().strip()
+        self._bus = dbus.Connection(self.address)
+        self._bus.on_call = self._handle
+        self._bus.request_name(SYSTEMD)
+
+    def stop(self):
+        self._bus.close()
+        self._daemon.kill()
+        self._daemon.wait()
+        self._daemon.stdout.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def set_state(self, unit: str, state: str):
+        """
+        Change a unit behind the clients' back, like a crashing daemon.
+        """
+        self.states[unit] = state
+        self._bus.emit(unit_path(unit), PROPERTIES_INTERFACE, 'PropertiesChanged', 'sa{sv}as',
+                       (UNIT_INTERFACE, {'ActiveState': ('s', state)}, []))
+
+    def _handle(self, msg: dbus.Message):
+        self.calls.append(msg.member)
+        if msg.member == 'Subscribe':
+            self._bus.reply(msg)
+        elif msg.member == 'GetUnit':
+            unit = msg.body[0]
+            if unit not in self.states:
+                self._bus.reply_error(msg, NO_SUCH_UNIT, f'Unit {unit} not loaded.')
+            else:
+                self._bus.reply(msg, 'o', (unit_path(unit),))
+        elif msg.member == 'Get' and msg.interface == PROPERTIES_INTERFACE:
+            unit = next(u for u in self.states if unit_path(u) == msg.path)
+            self._bus.reply(msg, 'v', (('s', self.states[unit]),))
+        elif msg.member in ('StartUnit', 'StopUnit', 'RestartUnit', 'TryRestartUnit', 'ReloadUnit'):
+            job_id = next(self._jobs)
+            job = f'{SYSTEMD_PATH}/job/{job_id}'
+            self._bus.reply(msg, 'o', (job,))
+            threading.Timer(self.job_delay, self._finish, (job_id, job, msg.member, msg.body[0])).start()
+        else:
+            self._bus.reply_error(msg, 'org.freedesktop.DBus.Error.UnknownMethod', msg.member)
+
+    def _finish(self, job_id: int, job: str, method: str, unit: str):
+        if unit not in self.states:
+            self.states[unit] = 'inactive'
+            self._bus.emit(SYSTEMD_PATH, MANAGER_INTERFACE, 'UnitNew', 'so', (unit, unit_path(unit)))
+        if unit in self.failing:
+            state, result = 'failed', 'failed'
+        elif method == 'StopUnit':
+            state, result = 'inactive', 'done'
+        else:
+            state, result = 'active', 'done'
+        self.set_state(unit, state)
+        self._bus.emit(SYSTEMD_PATH, MANAGER_INTERFACE, 'JobRemoved', 'uoss', (job_id, job, unit, result))
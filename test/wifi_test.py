@@ -0,0 +1,178 @@
+import threading
+import time
+import unittest
+
+from ifmanage.scantable import WPA2_PSK, Profile
+from ifmanage.wifi import WiFi, iter_scan_results, parse_scan_results
+from util.wpactrl import WpaCtrlPool, get_pool
+from .wpa_fake import FakeWpaSupplicant, make_bss
+
+
+class TestWiFi(unittest.TestCase):
+    def test_large_scan(self):
+        with FakeWpaSupplicant(bss=make_bss(500)) as fake:
+            wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            reply = wifi._send_cmd("SCAN_RESULTS")
+            self.assertGreater(len(reply), 4096)
+            self.assertEqual(len(list(iter_scan_results(reply))), 500)
+            self.assertEqual(len(wifi.scan()), 167)
+
+    def test_parse_scan_results(self):
+        reply = ("bssid / frequency / signal level / flags / ssid\n"
+                 "02:00:00:00:00:01\t2412\t-40\t[WPA2-PSK-CCMP][ESS]\thome\n"
+                 "02:00:00:00:00:02\t5180\t-60\t[WPA2-PSK-CCMP][ESS]\thome\n"
+                 "02:00:00:00:00:03\t5180\t-6")
+        profiles = parse_scan_results(reply)
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0].RSSI, -40)
+        self.assertEqual(sorted(profiles[0].frequency), ["2.4GHz", "5GHz"])
+
+    def test_scan_update(self):
+        with FakeWpaSupplicant(bss=make_bss(200)) as fake:
+            wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir, scan_ttl=30)
+            diff = wifi.scan_update(trigger=False)
+            self.assertEqual(len(diff.added), 200)
+            self.assertEqual(len(wifi.scan_results), 200)
+            self.assertEqual(wifi.scan_results.by_id(7).bssid, fake.bss[7]["bssid"])
+
+            # nothing changed: only the id/update_idx listing is read
+            del fake.commands[:]
+            self.assertFalse(wifi.scan_update(trigger=False))
+            self.assertTrue(all('MASK=0x420001' in c for c in fake.commands))
+
+            fake.bss[3].update(level=-20, update_idx=2)
+            fake.bss[4].update(update_idx=2)
+            fake.bss[5].update(update_idx=2, age=100)
+            del fake.bss[0]
+            fake.bss.extend(make_bss(201)[200:])
+            fake.bss[-1].update(id=500, bssid='02:00:00:ff:ff:ff')
+            diff = wifi.scan_update(trigger=False)
+            self.assertEqual([e.bssid for e in diff.added], ['02:00:00:ff:ff:ff'])
+            self.assertEqual([e.signal for e in diff.changed], [-20])
+            self.assertEqual(sorted(e.id for e in diff.removed), [0, 5])
+            self.assertEqual(len(wifi.scan_results), 199)
+
+            # expired entries stay out until wpa_supplicant updates them
+            self.assertFalse(wifi.scan_update(trigger=False))
+            fake.bss[4].update(update_idx=3, age=0)
+            self.assertEqual([e.id for e in wifi.scan_update(trigger=False).added], [5])
+
+    def test_shared_connection(self):
+        with FakeWpaSupplicant() as fake:
+            first = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            second = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            self.assertIs(first._ctrl, second._ctrl)
+            self.assertEqual(fake.commands.count('PING'), 1)
+            get_pool().close(fake.ifname, fake.ctrl_dir)
+
+    def test_pool(self):
+        with FakeWpaSupplicant() as fake:
+            pool = WpaCtrlPool(idle_check=0.05)
+            ctrl = pool.get(fake.ifname, fake.ctrl_dir)
+            self.assertIs(pool.get(fake.ifname, fake.ctrl_dir), ctrl)
+            self.assertEqual(fake.commands, ['PING'])
+
+            # idle connections are checked before reuse
+            time.sleep(0.06)
+            self.assertIs(pool.get(fake.ifname, fake.ctrl_dir), ctrl)
+            self.assertEqual(fake.commands, ['PING', 'PING'])
+
+            # broken connections are replaced with one on a new path
+            ctrl.broken = True
+            replacement = pool.get(fake.ifname, fake.ctrl_dir)
+            self.assertIsNot(replacement, ctrl)
+            self.assertNotEqual(replacement.local_path, ctrl.local_path)
+
+            replies = []
+
+            def scan():
+                for _ in range(20):
+                    replies.append(replacement.request('SCAN_RESULTS').startswith(b'bssid'))
+                    replies.append(replacement.request('PING') == b'PONG\n')
+            threads = [threading.Thread(target=scan) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(replies, [True] * 160)
+
+            pool.close_all()
+            self.assertEqual(len(pool), 0)
+
+        with self.assertRaises(ConnectionError):
+            WpaCtrlPool(retries=2).get(fake.ifname, fake.ctrl_dir)
+
+    def test_add_profiles(self):
+        with FakeWpaSupplicant() as fake:
+            wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            profiles = []
+            for i in range(20):
+                profile = Profile(ssid=f'net-{i}', akm=[WPA2_PSK] if i % 2 else [])
+                profile.password = f'secret-{i}'
+                profiles.append(profile)
+            del fake.commands[:]
+            nids = wifi.add_profiles(profiles)
+
+            self.assertEqual(len(nids), 20)
+            self.assertEqual(fake.networks[nids[1]], {"ssid": '"net-1"', "key_mgmt": 'WPA-PSK', "proto": 'RSN',
+                                                      "psk": '"secret-1"'})
+            self.assertEqual(fake.networks[nids[0]], {"ssid": '"net-0"', "key_mgmt": 'NONE'})
+            self.assertEqual(fake.commands.count('SAVE_CONFIG'), 1)
+
+            # connecting and removing use the cached ids
+            del fake.commands[:]
+            wifi.connect(profiles[3])
+            wifi.remove_profile(nids[4])
+            self.assertEqual(fake.commands, [f'SELECT_NETWORK {nids[3]}', f'REMOVE_NETWORK {nids[4]}'])
+            with self.assertRaises(ValueError):
+                wifi.remove_profile(1000)
+
+    def test_sync_profiles(self):
+        with FakeWpaSupplicant() as fake:
+            wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            profiles = [Profile(ssid=f'net-{i}', akm=[]) for i in range(5)]
+            wifi.add_profiles(profiles[:3] + [Profile(ssid='old', akm=[])] + profiles[:1])
+            fake.networks[1]["key_mgmt"] = 'WPA-PSK'
+
+            result = wifi.sync_profiles(profiles)
+            self.assertEqual(result, {"added": ['net-3', 'net-4'], "updated": ['net-1'], "removed": ['old', 'net-0']})
+            self.assertEqual(sorted(n["ssid"] for n in wifi.list_network()), [p.ssid for p in profiles])
+            self.assertEqual(fake.networks[1]["key_mgmt"], 'NONE')
+
+            del fake.commands[:]
+            self.assertEqual(wifi.sync_profiles(profiles), {"added": [], "updated": [], "removed": []})
+            self.assertNotIn('SAVE_CONFIG', fake.commands)
+
+    def test_sync_psk_profiles(self):
+        with FakeWpaSupplicant() as fake:
+            wifi = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            profiles = [Profile(ssid=f'psk-{i}', akm=[WPA2_PSK]) for i in range(3)]
+            for i, profile in enumerate(profiles):
+                profile.password = f'password-{i}'
+            wifi.add_profiles(profiles)
+
+            # the PSKs just written are known, nothing to send
+            del fake.commands[:]
+            self.assertEqual(wifi.sync_profiles(profiles), {"added": [], "updated": [], "removed": []})
+            self.assertFalse([c for c in fake.commands if c.startswith('SET_NETWORK')])
+            self.assertNotIn('SAVE_CONFIG', fake.commands)
+
+            # a new password is written and saved, once
+            profiles[1].password = 'changed'
+            self.assertEqual(wifi.sync_profiles(profiles)["updated"], ['psk-1'])
+            self.assertEqual(fake.networks[1]["psk"], '"changed"')
+            del fake.commands[:]
+            wifi.sync_profiles(profiles)
+            self.assertFalse([c for c in fake.commands if c.startswith('SET_NETWORK')])
+            self.assertNotIn('SAVE_CONFIG', fake.commands)
+
+            # another object can not know the PSKs and writes them
+            other = WiFi(fake.ifname, ctrl_dir=fake.ctrl_dir)
+            del fake.commands[:]
+            other.sync_profiles(profiles)
+            self.assertEqual(len([c for c in fake.commands if ' psk ' in c]), 3)
+            self.assertIn('SAVE_CONFIG', fake.commands)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+
+def make_bss(count: int) -> list:
+    """
+    Synthetic scan results: count BSSes spread over count // 3 SSIDs and
+    both bands.
+    """
+    flags = ['[WPA2-PSK-CCMP][ESS]', '[WPA-PSK-TKIP][WPA2-PSK-CCMP][ESS]', '[WPA2-EAP-CCMP][ESS]', '[ESS]']
+    bss = []
+    for i in range(count):
+        bss.append({
+            "bssid": '02:00:00:%02x:%02x:%02x' % (i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+            "freq": 2412 + 5 * (i % 13) if i % 2 else 5180 + 20 * (i % 8),
+            "level": -30 - i % 60,
+            "flags": flags[i % len(flags)],
+            "ssid": f'net-{i // 3}',
+            "id": i,
+            "update_idx": 1,
+            "age": 0,
+        })
+    return bss
+
+
+def make_networks(count: int) -> dict:
+    """
+    Synthetic configured networks, {network id: {key: value}}.
+    """
+    return {i: {'ssid': f'"saved-{i}"', 'key_mgmt': 'WPA-PSK', 'psk': f'"password-{i}"', 'flags': ''}
+            for i in range(count)}
+
+
+class FakeWpaSupplicant(object):
+    """
+    Stand-in for a wpa_supplicant control interface, answering the subset of
+    commands ifmanage uses from a thread. replies maps a command to a fixed
+    reply, to replay captured or oversized SCAN_RESULTS/LIST_NETWORKS
+    output.
+    """
+
+    def __init__(self, ifname='wlan0', bss=None, scan_delay=0.05, reply_size=4096, networks=None, replies=None):
+        self.ifname = ifname
+        self.ctrl_dir = tempfile.mkdtemp(prefix='ifmanage-wpa-')
+        self.path = os.path.join(self.ctrl_dir, ifname)
+        self.bss = bss if bss is not None else make_bss(6)
+        self.scan_delay = scan_delay
+        # like wpa_supplicant, BSS replies are cut at this size
+        self.reply_size = reply_size
+        self.networks = dict(networks or {})
+        self.replies = dict(replies or {})
+        self.monitors = set()
+        self.commands = []
+        self._next_id = max(self.networks, default=-1) + 1
+        self._sock = None
+        self._thread = None
+        self._running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
+        self._sock.bind(self.path)
+        self._sock.settimeout(0.1)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self._sock.close()
+        shutil.rmtree(self.ctrl_dir, ignore_errors=True)
+
+    def send_event(self, event: str, level=3):
+        for addr in list(self.monitors):
+            self._send(f'<{level}>{event}'.encode(), addr)
+
+    def _send(self, data, addr):
+        try:
+            self._sock.sendto(data, addr)
+        except OSError:
+            self.monitors.discard(addr)
+
+    def _serve(self):
+        while self._running:
+            try:
+                data, addr = self._sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            command = data.decode()
+            self.commands.append(command)
+            self._send(self.handle(command, addr).encode(), addr)
+
+    def _scan_done(self):
+        self.send_event('CTRL-EVENT-SCAN-RESULTS ')
+
+    def _bss(self, args: str) -> str:
+        mask = 0xffffffff
+        selector = args.split(' ')[0]
+        if 'MASK=' in args:
+            mask = int(args.split('MASK=')[1].split(' ')[0], 16)
+
+        entries = sorted(self.bss, key=lambda b: b['id'])
+        if selector.startswith('RANGE='):
+            if selector != 'RANGE=ALL':
+                first, last = selector[6:].split('-')
+                last = int(last) if last else float('inf')
+                entries = [b for b in entries if int(first) <= b['id'] <= last]
+        else:
+            entries = [b for b in entries if b['id'] == int(selector)]
+
+        fields = (('id', 1 << 0), ('bssid', 1 << 1), ('freq', 1 << 2), ('level', 1 << 7), ('age', 1 << 9),
+                  ('flags', 1 << 11), ('ssid', 1 << 12), ('update_idx', 1 << 22))
+        last_bss = max(self.bss, key=lambda b: b['id'], default=None)
+        reply = ''
+        for b in entries:
+            text = ''.join(f'{name}={b[name]}\n' for name, bit in fields if mask & bit)
+            if mask & 1 << 17:
+                text += '####\n' if b is last_bss else '====\n'
+            if len(reply) + len(text) > self.reply_size:
+                break
+            reply += text
+        return reply
+
+    def handle(self, command: str, addr) -> str:
+        if command in self.replies:
+            return self.replies[command]
+        name, _, args = command.partition(' ')
+        if name == 'PING':
+            return 'PONG\n'
+        if name == 'ATTACH':
+            self.monitors.add(addr)
+            return 'OK\n'
+        if name == 'DETACH':
+            self.monitors.discard(addr)
+            return 'OK\n'
+        if name == 'SCAN':
+            self.send_event('CTRL-EVENT-SCAN-STARTED ')
+            threading.Timer(self.scan_delay, self._scan_done).start()
+            return 'OK\n'
+        if name == 'SCAN_RESULTS':
+            lines = ['bssid / frequency / signal level / flags / ssid']
+            for b in self.bss:
+                lines.append(f'{b["bssid"]}\t{b["freq"]}\t{b["level"]}\t{b["flags"]}\t{b["ssid"]}')
+            return '\n'.join(lines) + '\n'
+        if name == 'BSS':
+            return self._bss(args)
+        if name == 'LIST_NETWORKS':
+            lines = ['network id / ssid / bssid / flags']
+            for nid, network in sorted(self.networks.items()):
+                lines.append(f'{nid}\t{network.get("ssid", "").strip(chr(34))}\tany\t{network.get("flags", "")}')
+            return '\n'.join(lines) + '\n'
+        if name == 'ADD_NETWORK':
+            nid = self._next_id
+            self._next_id += 1
+            self.networks[nid] = {}
+            return f'{nid}\n'
+        if name == 'SET_NETWORK':
+            nid, key, value = args.split(' ', 2)
+            if int(nid) not in self.networks:
+                return 'FAIL\n'
+            self.networks[int(nid)][key] = value
+            return 'OK\n'
+        if name == 'GET_NETWORK':
+            nid, key = args.split(' ')
+            value = self.networks.get(int(nid), {}).get(key)
+            if value is None:
+                return 'FAIL\n'
+            # like wpa_supplicant, keys are never shown
+            return '*' if key == 'psk' else value
+        if name in ('SELECT_NETWORK', 'ENABLE_NETWORK', 'DISABLE_NETWORK'):
+            if int(args) not in self.networks:
+                return 'FAIL\n'
+            if name == 'SELECT_NETWORK':
+                for nid, network in self.networks.items():
+                    network['flags'] = '[CURRENT]' if nid == int(args) else ''
+            return 'OK\n'
+        if name == 'REMOVE_NETWORK':
+            return 'OK\n' if self.networks.pop(int(args), None) is not None else 'FAIL\n'
+        if name in ('DISCONNECT', 'RECONNECT', 'SAVE_CONFIG'):
+            return 'OK\n'
+        return 'UNKNOWN COMMAND\n'
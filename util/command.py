@@ -1,5 +1,73 @@
+import os
+import shlex
+import signal
+import subprocess
+import time
 from subprocess import PIPE, Popen
 
+from util import trace
+
+# characters only a shell can make sense of, commands without them are run
+# directly
+SHELL_CHARS = frozenset('|&;<>()$`*?[]{}~#\n')
+
+# stands in for forking when set, test harnesses simulate commands with it:
+# runner(args, input) -> (returncode, stdout bytes, stderr bytes) where args
+# is an argv list, or a string for commands needing a shell
+runner = None
+
+
+def split_command(command):
+    """
+    Turn a command string into an argv list, or return None if it needs a
+    shell (pipes, redirections, globs, variables, ...). Lists and tuples
+    are taken as argv already.
+    """
+    if not isinstance(command, str):
+        return list(command)
+    if any(c in SHELL_CHARS for c in command):
+        return None
+    argv = shlex.split(command)
+    # 'VAR=value command' is a shell feature as well
+    if not argv or '=' in argv[0]:
+        return None
+    return argv
+
+
+def _prepare(command, shell):
+    """
+    Return the args for subprocess and whether they need a shell.
+    """
+    if shell:
+        return command if isinstance(command, str) else shlex.join(command), True
+    if shell is None:
+        argv = split_command(command)
+        if argv is None:
+            return command, True
+    else:
+        argv = shlex.split(command) if isinstance(command, str) else list(command)
+    return argv, False
+
+
+def _kill_group(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _output(data, wanted, decode: str) -> str:
+    if wanted != PIPE or not data:
+        return ''
+    return data.decode(decode).replace('\r\n', '\n').strip()
+
+
+def _simulate(command, args, input, started, stdout, stderr, decode):
+    code, out, err = runner(args, input)
+    if started is not None:
+        trace.emit(command, started, code, out, err)
+    return code, _output(out, stdout, decode), _output(err, stderr, decode),
+
 
 def popen(command, shell=None, input=None, timeout=None, env=None, stdout=PIPE, stderr=PIPE, decode='utf-8'):
     """
@@ -10,10 +78,13 @@ def popen(command, shell=None, input=None, timeout=None, env=None, stdout=PIPE,
 
     it can be affected by the following flags:
     shell:   do not try to auto-detect if a shell is required
-             for example if a pipe (|) or redirection (>, >>) is used
+             for example if a pipe (|) or redirection (>, >>) is used,
+             without one the command is split into arguments and run
+             directly, it can also be given as a list
+    timeout: time after which the command and everything it started is
+             killed and subprocess.TimeoutExpired raised
     input:   data to sent to the child process via STDIN
              the data should be bytes but string will be converted
-    timeout: time after which the command will be considered to have failed
     env:     mapping that defines the environment variables for the new process
     stdout:  define how the output of the program should be handled
               - PIPE (default), sends stdout to the output
@@ -31,34 +102,73 @@ def popen(command, shell=None, input=None, timeout=None, env=None, stdout=PIPE,
     discard stdout and get stderr: popen('command', stdout=DEVNUL, stderr=PIPE)
     """
 
-    use_shell = shell
-    stdin = None
-    if shell is None:
-        use_shell = False
-        if ' ' in command:
-            use_shell = True
-        if env:
-            use_shell = True
-
     if input:
-        stdin = PIPE
         input = input.encode() if type(input) is str else input
 
-    p = Popen(command, stdin=stdin, stdout=stdout, stderr=stderr, env=env, shell=use_shell)
+    args, use_shell = _prepare(command, shell)
+    started = time.perf_counter() if trace.tracers else None
+    if runner is not None:
+        return _simulate(command, args, input, started, stdout, stderr, decode)
+    # with a timeout the command gets its own process group, so whatever
+    # it started is killed along with it
+    p = Popen(args, stdin=PIPE if input else None, stdout=stdout, stderr=stderr, env=env, shell=use_shell,
+              start_new_session=timeout is not None)
+    try:
+        pipe = p.communicate(input, timeout)
+    except subprocess.TimeoutExpired:
+        _kill_group(p.pid)
+        p.communicate()
+        if started is not None:
+            trace.emit(command, started, None, b'', b'')
+        raise
 
-    pipe = p.communicate(input, timeout)
+    if started is not None:
+        trace.emit(command, started, p.returncode, pipe[0], pipe[1])
+    return p.returncode, _output(pipe[0], stdout, decode), _output(pipe[1], stderr, decode),
 
-    pipe_out = b''
-    if stdout == PIPE:
-        pipe_out = pipe[0]
 
-    pipe_err = b''
-    if stderr == PIPE:
-        pipe_err = pipe[1]
+async def async_popen(command, shell=None, input=None, timeout=None, env=None, stdout=PIPE, stderr=PIPE,
+                      decode='utf-8'):
+    """
+    popen for asyncio code, the event loop keeps running while the command
+    does. Takes the same arguments and returns the same (code, out, err)
+    tuple. On timeout the process group is killed and
+    subprocess.TimeoutExpired raised, the same happens if the calling task
+    is cancelled (re-raising CancelledError).
+    """
+    # most callers never touch asyncio, keep it out of their startup
+    import asyncio
 
-    str_out = pipe_out.decode(decode).replace('\r\n', '\n').strip()
-    str_err = pipe_err.decode(decode).replace('\r\n', '\n').strip()
-    return p.returncode, str_out, str_err,
+    if input:
+        input = input.encode() if type(input) is str else input
+
+    args, use_shell = _prepare(command, shell)
+    stdin = PIPE if input else None
+    started = time.perf_counter() if trace.tracers else None
+    if runner is not None:
+        return _simulate(command, args, input, started, stdout, stderr, decode)
+    if use_shell:
+        p = await asyncio.create_subprocess_shell(args, stdin=stdin, stdout=stdout, stderr=stderr, env=env,
+                                                  start_new_session=True)
+    else:
+        p = await asyncio.create_subprocess_exec(*args, stdin=stdin, stdout=stdout, stderr=stderr, env=env,
+                                                 start_new_session=True)
+    try:
+        pipe = await asyncio.wait_for(p.communicate(input), timeout)
+    except asyncio.TimeoutError:
+        _kill_group(p.pid)
+        await p.wait()
+        if started is not None:
+            trace.emit(command, started, None, b'', b'')
+        raise subprocess.TimeoutExpired(command, timeout)
+    except asyncio.CancelledError:
+        _kill_group(p.pid)
+        await p.wait()
+        raise
+
+    if started is not None:
+        trace.emit(command, started, p.returncode, pipe[0], pipe[1])
+    return p.returncode, _output(pipe[0], stdout, decode), _output(pipe[1], stderr, decode),
 
 
 def cmd(command, flag='', shell=None, input=None, timeout=None, env=None, stdout=PIPE, stderr=PIPE, decode='utf-8',
@@ -72,11 +182,27 @@ def cmd(command, flag='', shell=None, input=None, timeout=None, env=None, stdout
              (default is OSError) with the error code
     expect:  a list of error codes to consider as normal
     """
-    if expect is None:
-        expect = [0]
     code, decoded, _ = popen(command, stdout=stdout, stderr=stderr, input=input, timeout=timeout, env=env,
                              shell=shell, decode=decode, )
+    return _check(command, code, decoded, raising, message, expect)
+
+
+async def async_cmd(command, flag='', shell=None, input=None, timeout=None, env=None, stdout=PIPE, stderr=PIPE,
+                    decode='utf-8', raising=None, message='', expect=None):
+    """
+    cmd for asyncio code, see cmd and async_popen.
+    """
+    code, decoded, _ = await async_popen(command, stdout=stdout, stderr=stderr, input=input, timeout=timeout,
+                                         env=env, shell=shell, decode=decode)
+    return _check(command, code, decoded, raising, message, expect)
+
+
+def _check(command, code: int, decoded: str, raising, message: str, expect) -> str:
+    if expect is None:
+        expect = [0]
     if code not in expect:
+        if not isinstance(command, str):
+            command = shlex.join(command)
         feedback = message + '\n' if message else ''
         feedback += f'failed to run command: {command}\n'
         feedback += f'returned: {decoded}\n'
@@ -0,0 +1,50 @@
+import asyncio
+import subprocess
+import time
+import unittest
+
+from .command import async_cmd, async_popen, cmd, popen, split_command
+
+
+class TestCommand(unittest.TestCase):
+    def test_split_command(self):
+        self.assertEqual(split_command('ip link set dev eth0 alias \'a b\''),
+                         ['ip', 'link', 'set', 'dev', 'eth0', 'alias', 'a b'])
+        self.assertEqual(split_command(['echo', 'a|b']), ['echo', 'a|b'])
+        self.assertIsNone(split_command('echo a | cat'))
+        self.assertIsNone(split_command('echo $HOME'))
+        self.assertIsNone(split_command('FOO=bar env'))
+
+    def test_popen(self):
+        self.assertEqual(popen('echo "a  b"'), (0, 'a  b', ''))
+        self.assertEqual(popen(['echo', 'a|b']), (0, 'a|b', ''))
+        self.assertEqual(popen('echo abc | tr a x'), (0, 'xbc', ''))
+        self.assertEqual(popen('cat', input='data'), (0, 'data', ''))
+        with self.assertRaises(OSError) as e:
+            cmd('sh -c "exit 3"')
+        self.assertEqual(e.exception.errno, 3)
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            # the background sleep holds the pipe open, it has to be killed too
+            popen('sleep 5 & sleep 5', timeout=0.2)
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_async(self):
+        async def main():
+            outputs = await asyncio.gather(*(async_cmd(f'echo {i}') for i in range(5)))
+            self.assertEqual(outputs, [str(i) for i in range(5)])
+            self.assertEqual(await async_popen('echo a | tr a b'), (0, 'b', ''))
+            with self.assertRaises(subprocess.TimeoutExpired):
+                await async_popen('sleep 5 & sleep 5', timeout=0.2)
+            with self.assertRaises(OSError):
+                await async_cmd('false')
+
+        start = time.monotonic()
+        asyncio.run(main())
+        self.assertLess(time.monotonic() - start, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
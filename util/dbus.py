@@ -0,0 +1,440 @@
+import os
+import socket
+import struct
+import threading
+
+SYSTEM_BUS_ADDRESS = 'unix:path=/run/dbus/system_bus_socket'
+
+BUS_NAME = 'org.freedesktop.DBus'
+BUS_PATH = '/org/freedesktop/DBus'
+
+# message types
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+# message flags
+NO_REPLY_EXPECTED = 0x1
+
+# header fields
+FIELD_PATH = 1
+FIELD_INTERFACE = 2
+FIELD_MEMBER = 3
+FIELD_ERROR_NAME = 4
+FIELD_REPLY_SERIAL = 5
+FIELD_DESTINATION = 6
+FIELD_SENDER = 7
+FIELD_SIGNATURE = 8
+
+FIELD_NAMES = {
+    FIELD_PATH: 'path',
+    FIELD_INTERFACE: 'interface',
+    FIELD_MEMBER: 'member',
+    FIELD_ERROR_NAME: 'error_name',
+    FIELD_REPLY_SERIAL: 'reply_serial',
+    FIELD_DESTINATION: 'destination',
+    FIELD_SENDER: 'sender',
+    FIELD_SIGNATURE: 'signature',
+}
+FIELD_TYPES = {
+    FIELD_PATH: 'o',
+    FIELD_INTERFACE: 's',
+    FIELD_MEMBER: 's',
+    FIELD_ERROR_NAME: 's',
+    FIELD_REPLY_SERIAL: 'u',
+    FIELD_DESTINATION: 's',
+    FIELD_SENDER: 's',
+    FIELD_SIGNATURE: 'g',
+}
+
+# struct format and alignment of the fixed size types
+BASIC = {
+    'y': ('B', 1), 'b': ('I', 4), 'n': ('h', 2), 'q': ('H', 2), 'i': ('i', 4), 'u': ('I', 4),
+    'x': ('q', 8), 't': ('Q', 8), 'd': ('d', 8), 'h': ('I', 4),
+}
+ALIGNMENT = {'s': 4, 'o': 4, 'g': 1, 'a': 4, '(': 8, '{': 8, 'v': 1}
+
+DEFAULT_TIMEOUT = 25.0
+
+
+class DBusError(OSError):
+    """
+    An error reply, name is the D-Bus error name, e.g.
+    'org.freedesktop.systemd1.NoSuchUnit'.
+    """
+
+    def __init__(self, name: str, message=''):
+        super().__init__(f'{name}: {message}' if message else name)
+        self.name = name
+
+
+def _type_end(sig: str, i: int) -> int:
+    """
+    Index just past the complete type starting at sig[i].
+    """
+    c = sig[i]
+    if c == 'a':
+        return _type_end(sig, i + 1)
+    if c in '({':
+        close = ')' if c == '(' else '}'
+        i += 1
+        while sig[i] != close:
+            i = _type_end(sig, i)
+        return i + 1
+    return i + 1
+
+
+def split_signature(sig: str) -> list:
+    """
+    Split a signature into its complete types: 'sa{sv}u' -> ['s', 'a{sv}', 'u'].
+    """
+    types = []
+    i = 0
+    while i < len(sig):
+        end = _type_end(sig, i)
+        types.append(sig[i:end])
+        i = end
+    return types
+
+
+def _alignment(sig: str) -> int:
+    basic = BASIC.get(sig[0])
+    return basic[1] if basic else ALIGNMENT[sig[0]]
+
+
+def _pad(buf: bytearray, n: int):
+    buf.extend(b'\0' * (-len(buf) % n))
+
+
+def marshal(buf: bytearray, sig: str, value):
+    """
+    Append value of the complete type sig to buf, little endian. Arrays
+    take lists (dicts for a{..}), structs tuples and variants
+    (signature, value) pairs. Alignment is relative to the start of buf,
+    which must be the start of the message.
+    """
+    c = sig[0]
+    basic = BASIC.get(c)
+    if basic:
+        _pad(buf, basic[1])
+        buf.extend(struct.pack('<' + basic[0], value))
+    elif c in 'so':
+        data = value.encode('utf-8')
+        _pad(buf, 4)
+        buf.extend(struct.pack('<I', len(data)) + data + b'\0')
+    elif c == 'g':
+        data = value.encode('ascii')
+        buf.extend(struct.pack('<B', len(data)) + data + b'\0')
+    elif c == 'v':
+        marshal(buf, 'g', value[0])
+        marshal(buf, value[0], value[1])
+    elif c == 'a':
+        element = sig[1:]
+        _pad(buf, 4)
+        offset = len(buf)
+        buf.extend(b'\0\0\0\0')
+        _pad(buf, _alignment(element))
+        start = len(buf)
+        items = value.items() if element[0] == '{' else value
+        for item in items:
+            marshal(buf, element, item)
+        struct.pack_into('<I', buf, offset, len(buf) - start)
+    elif c in '({':
+        _pad(buf, 8)
+        for member, item in zip(split_signature(sig[1:-1]), value):
+            marshal(buf, member, item)
+    else:
+        raise ValueError(f'unsupported D-Bus type {sig!r}')
+
+
+class _Reader(object):
+    """
+    Unmarshal values out of a message. Variants are returned as their
+    value only.
+    """
+
+    def __init__(self, data, endian: str):
+        self.data = data
+        self.endian = endian
+        self.pos = 0
+
+    def align(self, n: int):
+        self.pos += -self.pos % n
+
+    def read(self, sig: str):
+        c = sig[0]
+        basic = BASIC.get(c)
+        if basic:
+            self.align(basic[1])
+            value = struct.unpack_from(self.endian + basic[0], self.data, self.pos)[0]
+            self.pos += basic[1]
+            return bool(value) if c == 'b' else value
+        if c in 'so':
+            self.align(4)
+            size = struct.unpack_from(self.endian + 'I', self.data, self.pos)[0]
+            value = bytes(self.data[self.pos + 4:self.pos + 4 + size]).decode('utf-8')
+            self.pos += 5 + size
+            return value
+        if c == 'g':
+            size = self.data[self.pos]
+            value = bytes(self.data[self.pos + 1:self.pos + 1 + size]).decode('ascii')
+            self.pos += 2 + size
+            return value
+        if c == 'v':
+            return self.read(self.read('g'))
+        if c == 'a':
+            element = sig[1:]
+            self.align(4)
+            size = struct.unpack_from(self.endian + 'I', self.data, self.pos)[0]
+            self.pos += 4
+            self.align(_alignment(element))
+            end = self.pos + size
+            items = []
+            while self.pos < end:
+                items.append(self.read(element))
+            return dict(items) if element[0] == '{' else items
+        if c in '({':
+            self.align(8)
+            return tuple(self.read(member) for member in split_signature(sig[1:-1]))
+        raise ValueError(f'unsupported D-Bus type {sig!r}')
+
+
+class Message(object):
+    def __init__(self, type: int, flags=0, serial=0, body=(), **fields):
+        self.type = type
+        self.flags = flags
+        self.serial = serial
+        self.body = list(body)
+        self.path = fields.get('path')
+        self.interface = fields.get('interface')
+        self.member = fields.get('member')
+        self.error_name = fields.get('error_name')
+        self.reply_serial = fields.get('reply_serial')
+        self.destination = fields.get('destination')
+        self.sender = fields.get('sender')
+        self.signature = fields.get('signature') or ''
+
+    def __repr__(self):
+        return f'<Message {self.type} {self.interface}.{self.member or self.error_name} {self.body!r}>'
+
+    def pack(self) -> bytes:
+        body = bytearray()
+        for sig, value in zip(split_signature(self.signature), self.body):
+            marshal(body, sig, value)
+
+        fields = []
+        for code, name in FIELD_NAMES.items():
+            value = getattr(self, name)
+            if value:
+                fields.append((code, (FIELD_TYPES[code], value)))
+        header = bytearray(b'l')
+        header.extend(struct.pack('<BBBII', self.type, self.flags, 1, len(body), self.serial))
+        marshal(header, 'a(yv)', fields)
+        _pad(header, 8)
+        return bytes(header + body)
+
+    @staticmethod
+    def size(data) -> int:
+        """
+        Total length of the message starting with data (at least 16 bytes).
+        """
+        endian = '<' if data[0:1] == b'l' else '>'
+        body_len, _, fields_len = struct.unpack_from(endian + 'III', data, 4)
+        return 16 + fields_len + (-fields_len % 8) + body_len
+
+    @classmethod
+    def unpack(cls, data) -> 'Message':
+        endian = '<' if data[0:1] == b'l' else '>'
+        reader = _Reader(data, endian)
+        _, type, flags, _, body_len, serial = struct.unpack_from(endian + 'BBBBII', data)
+        reader.pos = 12
+        fields = {}
+        for code, value in reader.read('a(yv)'):
+            if code in FIELD_NAMES:
+                fields[FIELD_NAMES[code]] = value
+        reader.align(8)
+        msg = cls(type, flags, serial, **fields)
+        # the body is aligned relative to its own start
+        reader.data = data[reader.pos:reader.pos + body_len]
+        reader.pos = 0
+        msg.body = [reader.read(sig) for sig in split_signature(msg.signature)]
+        return msg
+
+
+class _Pending(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.reply = None
+
+    def result(self, timeout=DEFAULT_TIMEOUT) -> list:
+        if not self.event.wait(timeout):
+            raise TimeoutError('no reply on the D-Bus connection')
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        if self.reply.type == ERROR:
+            raise DBusError(self.reply.error_name, self.reply.body[0] if self.reply.body else '')
+        return self.reply.body
+
+
+def _socket_address(address: str):
+    """
+    The first unix socket address out of a D-Bus address string.
+    """
+    for entry in address.split(';'):
+        transport, _, params = entry.partition(':')
+        if transport != 'unix':
+            continue
+        options = dict(p.split('=', 1) for p in params.split(',') if '=' in p)
+        if 'path' in options:
+            return options['path']
+        if 'abstract' in options:
+            return '\0' + options['abstract']
+    raise ValueError(f'no usable unix socket in D-Bus address {address!r}')
+
+
+class Connection(object):
+    """
+    A D-Bus connection over a unix socket. Messages are read by a thread:
+    replies wake up their caller, signals go to the handlers added with
+    add_signal_handler() and method calls to on_call.
+
+    usage:
+        bus = Connection()
+        state = bus.call('org.freedesktop.systemd1', path, 'org.freedesktop.DBus.Properties', 'Get', 'ss',
+                         ('org.freedesktop.systemd1.Unit', 'ActiveState'))[0]
+    """
+
+    def __init__(self, address=None, timeout=DEFAULT_TIMEOUT):
+        address = address or os.environ.get('DBUS_SYSTEM_BUS_ADDRESS', SYSTEM_BUS_ADDRESS)
+        self.timeout = timeout
+        self.on_call = None
+        self._handlers = []
+        self._pending = {}
+        self._serial = 0
+        self._lock = threading.Lock()
+        self.closed = False
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.settimeout(timeout)
+            self.sock.connect(_socket_address(address))
+            self._auth()
+            self.sock.settimeout(None)
+        except OSError:
+            self.sock.close()
+            raise
+
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+        self.unique_name = self.call(BUS_NAME, BUS_PATH, BUS_NAME, 'Hello')[0]
+
+    def _auth(self):
+        uid = str(os.getuid()).encode().hex()
+        self.sock.sendall(b'\0AUTH EXTERNAL ' + uid.encode() + b'\r\n')
+        line = b''
+        while not line.endswith(b'\r\n'):
+            data = self.sock.recv(256)
+            if not data:
+                raise ConnectionError('D-Bus connection closed during authentication')
+            line += data
+        if not line.startswith(b'OK '):
+            raise PermissionError(f'D-Bus authentication failed: {line.strip().decode()}')
+        self.sock.sendall(b'BEGIN\r\n')
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _read_loop(self):
+        buff = bytearray()
+        error = ConnectionError('D-Bus connection closed')
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                buff.extend(data)
+                while len(buff) >= 16:
+                    size = Message.size(buff)
+                    if len(buff) < size:
+                        break
+                    msg = Message.unpack(bytes(buff[:size]))
+                    del buff[:size]
+                    self._dispatch(msg)
+        except (OSError, ValueError, struct.error) as e:
+            error = e
+        self.closed = True
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for p in pending.values():
+            p.reply = error
+            p.event.set()
+
+    def _dispatch(self, msg: Message):
+        if msg.type in (METHOD_RETURN, ERROR):
+            with self._lock:
+                pending = self._pending.pop(msg.reply_serial, None)
+            if pending is not None:
+                pending.reply = msg
+                pending.event.set()
+        elif msg.type == SIGNAL:
+            for handler in list(self._handlers):
+                handler(msg)
+        elif msg.type == METHOD_CALL:
+            if self.on_call is not None:
+                self.on_call(msg)
+            elif not msg.flags & NO_REPLY_EXPECTED:
+                self.reply_error(msg, 'org.freedesktop.DBus.Error.UnknownMethod', 'no methods here')
+
+    def send(self, msg: Message, pending=None) -> int:
+        with self._lock:
+            self._serial += 1
+            msg.serial = self._serial
+            if pending is not None:
+                self._pending[msg.serial] = pending
+            self.sock.sendall(msg.pack())
+        return msg.serial
+
+    def send_call(self, destination: str, path: str, interface: str, member: str, signature='', args=()) -> _Pending:
+        """
+        Send a method call without waiting, the reply is collected with
+        .result() on the returned object. Lets many calls be in flight.
+        """
+        pending = _Pending()
+        self.send(Message(METHOD_CALL, body=args, destination=destination, path=path, interface=interface,
+                          member=member, signature=signature), pending)
+        return pending
+
+    def call(self, destination: str, path: str, interface: str, member: str, signature='', args=(),
+             timeout=None) -> list:
+        """
+        Call a method and return the reply body, raise DBusError on an
+        error reply.
+        """
+        pending = self.send_call(destination, path, interface, member, signature, args)
+        return pending.result(timeout or self.timeout)
+
+    def add_match(self, rule: str):
+        self.call(BUS_NAME, BUS_PATH, BUS_NAME, 'AddMatch', 's', (rule,))
+
+    def add_signal_handler(self, handler):
+        self._handlers.append(handler)
+
+    def request_name(self, name: str):
+        self.call(BUS_NAME, BUS_PATH, BUS_NAME, 'RequestName', 'su', (name, 0))
+
+    def reply(self, call: Message, signature='', args=()):
+        self.send(Message(METHOD_RETURN, body=args, reply_serial=call.serial, destination=call.sender,
+                          signature=signature))
+
+    def reply_error(self, call: Message, name: str, text=''):
+        self.send(Message(ERROR, body=(text,), reply_serial=call.serial, destination=call.sender,
+                          error_name=name, signature='s'))
+
+    def emit(self, path: str, interface: str, member: str, signature='', args=()):
+        self.send(Message(SIGNAL, body=args, path=path, interface=interface, member=member, signature=signature))
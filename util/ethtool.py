@@ -0,0 +1,218 @@
+"""
+In-process ethtool: SIOCETHTOOL requests on a datagram socket, covering
+link settings (speed, duplex, autoneg), the GRO/GSO/TSO offloads, ring
+buffer sizes and channel counts.
+"""
+import errno
+import fcntl
+import socket
+import struct
+import threading
+from collections import namedtuple
+
+SIOCETHTOOL = 0x8946
+IFNAMSIZ = 16
+# struct ifreq: the name and a pointer to the ethtool request, padded to
+# the size of the union
+IFREQ = struct.Struct('16sP')
+IFREQ_SIZE = 40
+
+ETHTOOL_GRINGPARAM = 0x10
+ETHTOOL_SRINGPARAM = 0x11
+ETHTOOL_GTSO = 0x1e
+ETHTOOL_STSO = 0x1f
+ETHTOOL_GGSO = 0x23
+ETHTOOL_SGSO = 0x24
+ETHTOOL_GGRO = 0x2b
+ETHTOOL_SGRO = 0x2c
+ETHTOOL_GCHANNELS = 0x3c
+ETHTOOL_SCHANNELS = 0x3d
+ETHTOOL_GLINKSETTINGS = 0x4c
+ETHTOOL_SLINKSETTINGS = 0x4d
+
+# get and set command of every offload, each a struct ethtool_value
+OFFLOADS = {
+    'gro': (ETHTOOL_GGRO, ETHTOOL_SGRO),
+    'gso': (ETHTOOL_GGSO, ETHTOOL_SGSO),
+    'tso': (ETHTOOL_GTSO, ETHTOOL_STSO),
+}
+
+DUPLEX_HALF = 0
+DUPLEX_FULL = 1
+DUPLEX_UNKNOWN = 0xff
+SPEED_UNKNOWN = 0xffffffff
+DUPLEX_NAMES = {DUPLEX_HALF: 'half', DUPLEX_FULL: 'full'}
+
+# ETHTOOL_LINK_MODE_Autoneg_BIT, set if the device can negotiate at all
+LINK_MODE_AUTONEG = 6
+
+# bit of every ETHTOOL_LINK_MODE_* with a speed, (speed, duplex)
+LINK_MODES = {
+    0: (10, 'half'), 1: (10, 'full'), 2: (100, 'half'), 3: (100, 'full'), 4: (1000, 'half'), 5: (1000, 'full'),
+    12: (10000, 'full'), 15: (2500, 'full'), 17: (1000, 'full'), 18: (10000, 'full'), 19: (10000, 'full'),
+    21: (20000, 'full'), 22: (20000, 'full'), 23: (40000, 'full'), 24: (40000, 'full'), 25: (40000, 'full'),
+    26: (40000, 'full'), 27: (56000, 'full'), 28: (56000, 'full'), 29: (56000, 'full'), 30: (56000, 'full'),
+    31: (25000, 'full'), 32: (25000, 'full'), 33: (25000, 'full'), 34: (50000, 'full'), 35: (50000, 'full'),
+    36: (100000, 'full'), 37: (100000, 'full'), 38: (100000, 'full'), 39: (100000, 'full'),
+    40: (50000, 'full'), 41: (1000, 'full'), 42: (10000, 'full'), 43: (10000, 'full'), 44: (10000, 'full'),
+    45: (10000, 'full'), 46: (10000, 'full'), 47: (2500, 'full'), 48: (5000, 'full'),
+}
+
+# struct ethtool_link_settings up to the link mode masks
+LINK_SETTINGS = struct.Struct('=IIBBBBBBBbBBBB28x')
+VALUE = struct.Struct('=II')
+# struct ethtool_ringparam and struct ethtool_channels, 8 counters each
+COUNTERS = struct.Struct('=I8I')
+
+
+class LinkSettings(namedtuple('LinkSettings', 'speed duplex autoneg port supported advertising nwords raw',
+                              defaults=(None,))):
+    """
+    speed in Mb/s (None if unknown), duplex 'half', 'full' or None,
+    autoneg a bool; supported and advertising are link mode bitmasks. raw
+    is the kernel's reply, the base of a set_link_settings() request.
+    """
+    __slots__ = ()
+
+    def modes(self) -> set:
+        """
+        (speed, duplex) pairs the device supports.
+        """
+        return {mode for bit, mode in LINK_MODES.items() if self.supported >> bit & 1}
+
+    @property
+    def can_autoneg(self) -> bool:
+        return bool(self.supported >> LINK_MODE_AUTONEG & 1)
+
+
+class Ring(namedtuple('Ring', 'rx_max rx_mini_max rx_jumbo_max tx_max rx rx_mini rx_jumbo tx')):
+    __slots__ = ()
+
+
+class Channels(namedtuple('Channels', 'max_rx max_tx max_other max_combined rx tx other combined')):
+    __slots__ = ()
+
+
+def _mask(words) -> int:
+    return sum(word << (32 * n) for n, word in enumerate(words))
+
+
+def _words(mask: int, nwords: int) -> list:
+    return [mask >> (32 * n) & 0xffffffff for n in range(nwords)]
+
+
+class Ethtool(object):
+    """
+    SIOCETHTOOL requests, all sent through one socket. Errors are raised
+    as OSError carrying the kernel errno, EOPNOTSUPP if the driver lacks
+    the operation.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.sock.close()
+
+    def request(self, ifname: str, data: bytes, context='') -> bytes:
+        """
+        Run one ethtool command, data starts with its number. Returns the
+        request structure as filled in by the kernel.
+        """
+        import ctypes
+
+        name = ifname.encode()
+        if not name or len(name) >= IFNAMSIZ:
+            raise ValueError(f'Invalid interface name "{ifname}"')
+        buf = ctypes.create_string_buffer(data, len(data))
+        ifreq = bytearray(IFREQ.pack(name, ctypes.addressof(buf)).ljust(IFREQ_SIZE, b'\0'))
+        with self._lock:
+            try:
+                fcntl.ioctl(self.sock, SIOCETHTOOL, ifreq)
+            except OSError as e:
+                raise OSError(e.errno, f'{context or "ethtool"} {ifname}: {e.strerror}') from None
+        return buf.raw
+
+    def get_link_settings(self, ifname: str, nwords=None) -> LinkSettings:
+        """
+        Read speed, duplex, autoneg and link modes. The number of mask
+        words is asked from the kernel first unless nwords is given, see
+        LinkSettings.nwords.
+        """
+        if nwords is None:
+            # the kernel answers a request without masks with -nwords
+            reply = self.request(ifname, LINK_SETTINGS.pack(ETHTOOL_GLINKSETTINGS, *[0] * 13), 'link settings')
+            nwords = -LINK_SETTINGS.unpack_from(reply)[9]
+            if nwords <= 0:
+                raise OSError(errno.EPROTO, f'link settings {ifname}: no link mode masks')
+        request = LINK_SETTINGS.pack(ETHTOOL_GLINKSETTINGS, *[0] * 8, nwords, 0, 0, 0, 0)
+        reply = self.request(ifname, request + bytes(12 * nwords), 'link settings')
+        fields = LINK_SETTINGS.unpack_from(reply)
+        words = struct.unpack_from(f'={3 * nwords}I', reply, LINK_SETTINGS.size)
+        return LinkSettings(
+            None if fields[1] in (0, SPEED_UNKNOWN) else fields[1],
+            DUPLEX_NAMES.get(fields[2]),
+            bool(fields[5]),
+            fields[3],
+            _mask(words[:nwords]),
+            _mask(words[nwords:2 * nwords]),
+            nwords,
+            reply,
+        )
+
+    def set_link_settings(self, ifname: str, speed=None, duplex=None, autoneg=True, advertising=None,
+                          current=None):
+        """
+        Enable autoneg advertising the given link modes (all supported ones
+        by default), or force speed and duplex with autoneg off. current is
+        the result of get_link_settings() if already known.
+        """
+        if current is None or current.raw is None:
+            current = self.get_link_settings(ifname, current and current.nwords)
+        # the fields not set here (phy address, MDI-X...) are sent back as read
+        request = bytearray(current.raw)
+        fields = list(LINK_SETTINGS.unpack_from(request))
+        fields[0] = ETHTOOL_SLINKSETTINGS
+        fields[5] = int(autoneg)
+        if autoneg:
+            advertising = current.supported if advertising is None else advertising
+            words = _words(advertising, current.nwords)
+            struct.pack_into(f'={current.nwords}I', request, LINK_SETTINGS.size + 4 * current.nwords, *words)
+        else:
+            fields[1] = int(speed)
+            fields[2] = DUPLEX_FULL if duplex == 'full' else DUPLEX_HALF
+        LINK_SETTINGS.pack_into(request, 0, *fields)
+        self.request(ifname, bytes(request), 'set link settings')
+
+    def get_offload(self, ifname: str, name: str) -> bool:
+        get, _ = OFFLOADS[name]
+        return bool(VALUE.unpack(self.request(ifname, VALUE.pack(get, 0), f'get {name}'))[1])
+
+    def set_offload(self, ifname: str, name: str, enable: bool):
+        _, set_ = OFFLOADS[name]
+        self.request(ifname, VALUE.pack(set_, int(enable)), f'set {name}')
+
+    def get_ring(self, ifname: str) -> Ring:
+        return Ring(*COUNTERS.unpack(self.request(ifname, COUNTERS.pack(ETHTOOL_GRINGPARAM, *[0] * 8),
+                                                  'ring parameters'))[1:])
+
+    def set_ring(self, ifname: str, ring: Ring):
+        self.request(ifname, COUNTERS.pack(ETHTOOL_SRINGPARAM, *ring), 'set ring parameters')
+
+    def get_channels(self, ifname: str) -> Channels:
+        return Channels(*COUNTERS.unpack(self.request(ifname, COUNTERS.pack(ETHTOOL_GCHANNELS, *[0] * 8),
+                                                      'channels'))[1:])
+
+    def set_channels(self, ifname: str, channels: Channels):
+        self.request(ifname, COUNTERS.pack(ETHTOOL_SCHANNELS, *channels), 'set channels')
+
+
+_ethtool = None
+
+
+def get_ethtool() -> Ethtool:
+    global _ethtool
+    if _ethtool is None:
+        _ethtool = Ethtool()
+    return _ethtool
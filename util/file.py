@@ -1,5 +1,8 @@
 import os
 
+# path -> (sha256 digest, (inode, size, mtime)) of files read by file_digest()
+_digests = {}
+
 
 def makedir(path, user=None, group=None):
     if os.path.exists(path):
@@ -31,4 +34,58 @@ def chmod(path, bitmask):
         return
     if bitmask is None:
         return
-    os.chmod(path, bitmask)
\ No newline at end of file
+    os.chmod(path, bitmask)
+
+
+def file_digest(path):
+    """
+    sha256 digest of a file's content, None if it does not exist. Digests
+    are remembered per path and only recomputed when the file's inode,
+    size or mtime changed.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _digests.pop(path, None)
+        return None
+    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    cached = _digests.get(path)
+    if cached is not None and cached[1] == key:
+        return cached[0]
+
+    import hashlib
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).digest()
+    _digests[path] = (digest, key)
+    return digest
+
+
+def write_file(path, data: bytes, permission=None, user=None, group=None):
+    """
+    Replace a file atomically: data goes to a temporary file in the same
+    directory which is then renamed over path, so readers see either the
+    old or the new content. Without permission the mode of the replaced
+    file is kept, new files get 0o644.
+    """
+    # not needed for reading files, keep them out of startup
+    import hashlib
+    import tempfile
+
+    if permission is None:
+        try:
+            permission = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            permission = 0o644
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(f.fileno(), permission)
+            chown(f.fileno(), user, group)
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    st = os.stat(path)
+    _digests[path] = (hashlib.sha256(data).digest(), (st.st_ino, st.st_size, st.st_mtime_ns))
@@ -0,0 +1,332 @@
+import os
+import socket
+import struct
+import threading
+
+NETLINK_ROUTE = 0
+NETLINK_GENERIC = 16
+
+# Message types
+NLMSG_NOOP = 1
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_SETLINK = 19
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+RTM_NEWSTATS = 92
+RTM_GETSTATS = 94
+
+# Message flags
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_ROOT = 0x100
+NLM_F_MATCH = 0x200
+NLM_F_DUMP = NLM_F_ROOT | NLM_F_MATCH
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+NLM_F_APPEND = 0x800
+
+# Link attributes
+IFLA_ADDRESS = 1
+IFLA_BROADCAST = 2
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_LINK = 5
+IFLA_MASTER = 10
+IFLA_OPERSTATE = 16
+IFLA_LINKINFO = 18
+IFLA_NET_NS_PID = 19
+IFLA_IFALIAS = 20
+IFLA_GROUP = 27
+IFLA_NET_NS_FD = 28
+
+# rtnl_link_stats64, in RTM_GETSTATS replies
+IFLA_STATS_LINK_64 = 1
+
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+
+VETH_INFO_PEER = 1
+IFLA_VLAN_ID = 1
+
+# Address attributes
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_BROADCAST = 4
+IFA_FLAGS = 8
+
+# Address flags, IFA_FLAGS carries the full 32 bit set
+IFA_F_PERMANENT = 0x80
+
+# Route attributes
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_TABLE = 15
+
+RT_TABLE_UNSPEC = 0
+RT_TABLE_MAIN = 254
+RTPROT_KERNEL = 2
+RTPROT_BOOT = 3
+RTPROT_STATIC = 4
+RTPROT_DHCP = 16
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RTN_UNICAST = 1
+
+# Neighbour attributes and states
+NDA_DST = 1
+NDA_LLADDR = 2
+NUD_PERMANENT = 0x80
+
+IFF_UP = 0x1
+
+# Multicast groups, as bitmask for bind()
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+NLMSG_HDR = struct.Struct('=IHHII')
+NLA_HDR = struct.Struct('=HH')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBi')
+NLMSGERR = struct.Struct('=i')
+IF_STATS_MSG = struct.Struct('=BxxxII')
+RTMSG = struct.Struct('=BBBBBBBBI')
+NDMSG = struct.Struct('=BxxxiHBB')
+
+NLA_TYPE_MASK = 0x3fff
+RECV_BUFF_SIZE = 65536
+
+SOL_NETLINK = 270
+NETLINK_CAP_ACK = 10
+
+# Requests sent per sendmsg in transact(), bounds the acks queued on our
+# receive buffer at any time
+TRANSACT_CHUNK = 256
+
+
+def align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def nla(attr_type: int, data: bytes) -> bytes:
+    """
+    Pack a single netlink attribute including its alignment padding.
+    """
+    length = NLA_HDR.size + len(data)
+    return NLA_HDR.pack(length, attr_type) + data + b'\0' * (align(length) - length)
+
+
+def nla_str(attr_type: int, value: str) -> bytes:
+    return nla(attr_type, value.encode() + b'\0')
+
+
+def nla_u32(attr_type: int, value: int) -> bytes:
+    return nla(attr_type, struct.pack('=I', value))
+
+
+def parse_attrs(data, offset=0, end=None) -> dict:
+    """
+    Parse a run of netlink attributes into a {type: bytes} dict. Nested
+    attributes are returned as raw bytes and can be parsed again.
+    """
+    attrs = {}
+    end = len(data) if end is None else end
+    while offset + NLA_HDR.size <= end:
+        length, attr_type = NLA_HDR.unpack_from(data, offset)
+        if length < NLA_HDR.size:
+            break
+        attrs[attr_type & NLA_TYPE_MASK] = bytes(data[offset + NLA_HDR.size:offset + length])
+        offset += align(length)
+    return attrs
+
+
+def attr_str(value: bytes) -> str:
+    return value.split(b'\0', 1)[0].decode()
+
+
+def attr_u32(value: bytes) -> int:
+    return struct.unpack_from('=I', value)[0]
+
+
+def attr_mac(value: bytes) -> str:
+    return ':'.join('%02x' % b for b in value)
+
+
+def pack_msg(msg_type: int, flags: int, seq: int, payload: bytes, pid=0) -> bytes:
+    return NLMSG_HDR.pack(NLMSG_HDR.size + len(payload), msg_type, flags, seq, pid) + payload
+
+
+def iter_msgs(data):
+    """
+    Iterate over (type, flags, seq, payload) for every message in a buffer.
+    """
+    offset = 0
+    end = len(data)
+    while offset + NLMSG_HDR.size <= end:
+        length, msg_type, flags, seq, _ = NLMSG_HDR.unpack_from(data, offset)
+        if length < NLMSG_HDR.size:
+            break
+        yield msg_type, flags, seq, data[offset + NLMSG_HDR.size:offset + length]
+        offset += align(length)
+
+
+def parse_addr_msg(payload):
+    """
+    Return (ifindex, family, packed, prefixlen) of a RTM_NEWADDR/RTM_DELADDR
+    message payload.
+    """
+    family, prefixlen, _, _, ifindex = IFADDRMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, IFADDRMSG.size)
+    packed = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+    return ifindex, family, packed, prefixlen
+
+
+def parse_addr_flags(payload) -> int:
+    """
+    Return the IFA_F_* flags of a RTM_NEWADDR message payload.
+    """
+    attrs = parse_attrs(payload, IFADDRMSG.size)
+    if IFA_FLAGS in attrs:
+        return attr_u32(attrs[IFA_FLAGS])
+    return IFADDRMSG.unpack_from(payload)[2]
+
+
+def netlink_error(code: int, context: str = '') -> OSError:
+    feedback = os.strerror(code)
+    if context:
+        feedback += f': {context}'
+    return OSError(code, feedback)
+
+
+class Netlink(object):
+    """
+    Minimal synchronous netlink socket. One instance may be shared by
+    several threads, requests are serialized with an internal lock.
+    """
+
+    def __init__(self, protocol=NETLINK_ROUTE, groups=0):
+        self.protocol = protocol
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC, protocol)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        # don't echo the whole request back in error acks
+        self.sock.setsockopt(SOL_NETLINK, NETLINK_CAP_ACK, 1)
+        self.sock.bind((0, groups))
+        self.pid = self.sock.getsockname()[0]
+        self._seq = 0
+        self._buff = bytearray(RECV_BUFF_SIZE)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xffffffff or 1
+        return self._seq
+
+    def _recv(self):
+        size = self.sock.recv_into(self._buff)
+        return memoryview(self._buff)[:size]
+
+    def request(self, msg_type: int, payload: bytes, flags=0, context=''):
+        """
+        Send a single request and wait for its acknowledgement. Raises
+        OSError carrying the kernel errno if the request was rejected.
+        """
+        error = self.transact([(msg_type, flags, payload)])[0]
+        if error:
+            raise netlink_error(error, context)
+
+    def transact(self, messages) -> list:
+        """
+        Send many (type, flags, payload) requests, TRANSACT_CHUNK per
+        sendmsg, and collect one acknowledgement per request. Returns a list of errno
+        values (0 on success) in the same order as the messages.
+        """
+        results = [None] * len(messages)
+        with self._lock:
+            for start in range(0, len(messages), TRANSACT_CHUNK):
+                self._transact(messages, start, min(start + TRANSACT_CHUNK, len(messages)), results)
+        return results
+
+    def _transact(self, messages, start, end, results):
+        seqs = {}
+        chunks = []
+        for index in range(start, end):
+            msg_type, flags, payload = messages[index]
+            seq = self._next_seq()
+            seqs[seq] = index
+            chunks.append(pack_msg(msg_type, flags | NLM_F_REQUEST | NLM_F_ACK, seq, payload))
+
+        self.sock.sendall(b''.join(chunks))
+
+        pending = end - start
+        while pending:
+            for msg_type, _, seq, payload in iter_msgs(self._recv()):
+                index = seqs.get(seq)
+                if index is None or msg_type != NLMSG_ERROR or results[index] is not None:
+                    continue
+                results[index] = -NLMSGERR.unpack_from(payload)[0]
+                pending -= 1
+
+    def dump(self, msg_type: int, payload: bytes) -> list:
+        """
+        Run a dump request and return the payload of every (type, payload)
+        message it produced.
+        """
+        with self._lock:
+            seq = self._next_seq()
+            self.sock.sendall(pack_msg(msg_type, NLM_F_REQUEST | NLM_F_DUMP, seq, payload))
+
+            out = []
+            while True:
+                for reply_type, _, reply_seq, data in iter_msgs(self._recv()):
+                    if reply_seq != seq:
+                        continue
+                    if reply_type == NLMSG_DONE:
+                        return out
+                    if reply_type == NLMSG_ERROR:
+                        error = -NLMSGERR.unpack_from(data)[0]
+                        if error:
+                            raise netlink_error(error, 'dump failed')
+                        return out
+                    out.append((reply_type, bytes(data)))
+
+    def get(self, msg_type: int, payload: bytes, context='') -> bytes:
+        """
+        Send a single get request and return the payload of its reply.
+        Raises OSError carrying the kernel errno if it was rejected.
+        """
+        with self._lock:
+            seq = self._next_seq()
+            self.sock.sendall(pack_msg(msg_type, NLM_F_REQUEST, seq, payload))
+            while True:
+                for reply_type, _, reply_seq, data in iter_msgs(self._recv()):
+                    if reply_seq != seq:
+                        continue
+                    if reply_type == NLMSG_ERROR:
+                        raise netlink_error(-NLMSGERR.unpack_from(data)[0], context)
+                    return bytes(data)
@@ -0,0 +1,22 @@
+import unittest
+
+from .netlink import nla, nla_str, nla_u32, parse_attrs, attr_str, attr_u32, pack_msg, iter_msgs
+
+
+class TestNetlink(unittest.TestCase):
+    def test_attrs(self):
+        data = nla_str(3, "eth0") + nla_u32(4, 1500) + nla(1, b'\x02\x00\x00\x00\x00\x01')
+        self.assertEqual(len(data) % 4, 0)
+        attrs = parse_attrs(data)
+        self.assertEqual(attr_str(attrs[3]), "eth0")
+        self.assertEqual(attr_u32(attrs[4]), 1500)
+        self.assertEqual(attrs[1], b'\x02\x00\x00\x00\x00\x01')
+
+    def test_msgs(self):
+        data = pack_msg(16, 1, 7, b'abc') + b'\0' + pack_msg(3, 2, 8, b'')
+        msgs = [(t, f, s, bytes(p)) for t, f, s, p in iter_msgs(data)]
+        self.assertEqual(msgs, [(16, 1, 7, b'abc'), (3, 2, 8, b'')])
+
+
+if __name__ == '__main__':
+    unittest.main()
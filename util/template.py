@@ -1,29 +1,117 @@
 import functools
+import hashlib
 import os
 
-from jinja2 import FileSystemLoader, Environment, ChainableUndefined
+from util.file import chmod, chown, file_digest, makedir, write_file
 
-from util.file import chmod, chown, makedir
+# templates shipped with ifmanage
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template')
+# precompiled TEMPLATE_DIR, written by compile_templates()
+COMPILED_DIR = os.path.join(TEMPLATE_DIR, '.compiled')
+
+ENVIRONMENT_OPTIONS = {
+    # Don't check if template files were modified upon re-rendering
+    'auto_reload': False,
+    # Cache up to this number of templates for quick re-rendering
+    'cache_size': 100,
+    'trim_blocks': True,
+}
+
+
+def vyos_defined(value, test_value=None, var_type=None):
+    """
+    Jinja test: value is defined and not None, and equal to test_value or
+    of type var_type ('str', 'int', 'float', 'list' or 'dict') if given.
+    """
+    from jinja2 import Undefined
+
+    if isinstance(value, Undefined) or value is None:
+        return False
+    if test_value is not None:
+        return value == test_value
+    if var_type is not None:
+        return type(value).__name__ == var_type
+    return True
+
+
+TESTS = {
+    'vyos_defined': vyos_defined,
+}
+FILTERS = {}
+
+
+def _environment(loader):
+    # jinja2 is only imported once a template is rendered
+    from jinja2 import ChainableUndefined, Environment
+
+    env = Environment(loader=loader, undefined=ChainableUndefined, **ENVIRONMENT_OPTIONS)
+    env.tests.update(TESTS)
+    env.filters.update(FILTERS)
+    return env
+
+
+def _bundle_loader(bundle, location):
+    """
+    A loader preferring the precompiled module of a template, falling back
+    to the source when it is missing or older than the template file.
+    """
+    from jinja2 import BaseLoader, FileSystemLoader, ModuleLoader
+
+    class BundleLoader(BaseLoader):
+        def __init__(self):
+            self.modules = ModuleLoader(bundle)
+            self.files = FileSystemLoader(location)
+
+        def load(self, environment, name, globals=None):
+            compiled = os.path.join(bundle, ModuleLoader.get_module_filename(name))
+            try:
+                fresh = os.stat(compiled).st_mtime_ns >= os.stat(os.path.join(location, name)).st_mtime_ns
+            except OSError:
+                fresh = False
+            loader = self.modules if fresh else self.files
+            return loader.load(environment, name, globals)
+
+    return BundleLoader()
 
 
 # reuse Environments with identical settings to improve performance
 @functools.lru_cache(maxsize=2)
 def get_environment(location=None):
-    loc_loader = FileSystemLoader(location)
-    env = Environment(
-        # Don't check if template files were modified upon re-rendering
-        auto_reload=False,
-        # Cache up to this number of templates for quick re-rendering
-        cache_size=100,
-        loader=loc_loader,
-        trim_blocks=True,
-        undefined=ChainableUndefined,
-    )
-    return env
+    """
+    The Environment for templates under location, TEMPLATE_DIR by default.
+    The default templates are loaded from COMPILED_DIR if it exists.
+    """
+    from jinja2 import FileSystemLoader
+
+    if location is None and os.path.isdir(COMPILED_DIR):
+        return _environment(_bundle_loader(COMPILED_DIR, TEMPLATE_DIR))
+    return _environment(FileSystemLoader(location or TEMPLATE_DIR))
+
+
+def compile_templates(target=COMPILED_DIR, location=TEMPLATE_DIR) -> int:
+    """
+    Precompile every template under location to Python modules in target,
+    which get_environment() picks up for the default templates. Run it
+    when installing, the templates then need no parsing at runtime.
+    Returns the number of templates compiled.
+    """
+    import compileall
+
+    env = get_environment(location)
+    names = env.list_templates(extensions=['j2'])
+    makedir(target)
+    env.compile_templates(target, zip=None, filter_func=lambda name: name in names, ignore_errors=False)
+    # byte-compile the modules as well, importing them then needs no compile step
+    compileall.compile_dir(target, quiet=1)
+    get_environment.cache_clear()
+    return len(names)
 
 
-def render(destination, template, content, formater=None, permission=None, user=None, group=None, location=None):
+def render(destination, template, content, formater=None, permission=None, user=None, group=None,
+           location=None) -> bool:
     """Render a template from the template directory to a file, raise on any errors.
+    The file is only rewritten, atomically, when the rendered content differs
+    from what is on disk. Returns True if it was written.
 
     :param destination: path to the file to save the rendered template in
     :param template: the path to the template relative to the template folder
@@ -40,15 +128,14 @@ def render(destination, template, content, formater=None, permission=None, user=
     folder = os.path.dirname(destination)
     makedir(folder, user, group)
 
-    # As we are opening the file with 'w', we are performing the rendering before
-    # calling open() to not accidentally erase the file if rendering fails
-    rendered = render_to_string(template, content, formater, location)
+    rendered = render_to_string(template, content, formater, location).encode()
+    if hashlib.sha256(rendered).digest() == file_digest(destination):
+        chmod(destination, permission)
+        chown(destination, user, group)
+        return False
 
-    # Write to file
-    with open(destination, "w") as file:
-        chmod(file.fileno(), permission)
-        chown(file.fileno(), user, group)
-        file.write(rendered)
+    write_file(destination, rendered, permission, user, group)
+    return True
 
 
 def render_to_string(template, content, formater=None, location=None):
@@ -60,11 +147,8 @@ def render_to_string(template, content, formater=None, location=None):
     :param location: the location of the template
 
     The parsed template files are cached, so rendering the same file multiple times
-    does not cause as too much overhead.
-    If used everywhere, it could be changed to load the template from Python
-    environment variables from an importable Python module generated when the Debian
-    package is build (recovering the load time and overhead caused by having the
-    file out of the code).
+    does not cause as too much overhead. Precompiling them with compile_templates()
+    saves the parsing of the first render as well.
     """
     template = get_environment(location).get_template(template)
     rendered = template.render(content)
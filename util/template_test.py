@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from .file import file_digest
+from .template import (TEMPLATE_DIR, _bundle_loader, _environment, compile_templates, render, render_to_string,
+                       vyos_defined)
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='ifmanage-template-')
+        with open(os.path.join(self.dir, 'test.j2'), 'w') as f:
+            f.write('interface "{{ ifname }}";\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_skip_unchanged(self):
+        path = os.path.join(self.dir, 'out', 'eth0.conf')
+        self.assertTrue(render(path, 'test.j2', {'ifname': 'eth0'}, location=self.dir))
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+        inode = os.stat(path).st_ino
+
+        self.assertFalse(render(path, 'test.j2', {'ifname': 'eth0'}, location=self.dir))
+        self.assertEqual(os.stat(path).st_ino, inode)
+
+        # replaced by a rename, keeping the mode
+        os.chmod(path, 0o600)
+        self.assertTrue(render(path, 'test.j2', {'ifname': 'eth1'}, location=self.dir))
+        self.assertNotEqual(os.stat(path).st_ino, inode)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        with open(path) as f:
+            self.assertEqual(f.read(), 'interface "eth1";')
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['eth0.conf'])
+
+    def test_changed_on_disk(self):
+        path = os.path.join(self.dir, 'eth0.conf')
+        render(path, 'test.j2', {'ifname': 'eth0'}, location=self.dir)
+        with open(path, 'a') as f:
+            f.write('# edited\n')
+        self.assertTrue(render(path, 'test.j2', {'ifname': 'eth0'}, location=self.dir))
+        os.remove(path)
+        self.assertIsNone(file_digest(path))
+        self.assertTrue(render(path, 'test.j2', {'ifname': 'eth0'}, location=self.dir))
+
+
+class TestTemplates(unittest.TestCase):
+    content = {'ifname': 'eth0', 'dhcp_options': {'host_name': 'router', 'client_id': 'client-1'}}
+
+    def test_vyos_defined(self):
+        rendered = render_to_string('dhcp-client/ipv4.j2', self.content)
+        self.assertIn('send dhcp-client-identifier "client-1";', rendered)
+        self.assertNotIn('vendor-class-identifier', rendered)
+        self.assertIn(' routers,', rendered)
+        self.assertTrue(vyos_defined('eth0', 'eth0'))
+        self.assertFalse(vyos_defined(None))
+        self.assertFalse(vyos_defined(3, var_type='str'))
+
+    def test_bundle(self):
+        bundle = tempfile.mkdtemp(prefix='ifmanage-bundle-')
+        try:
+            self.assertEqual(compile_templates(bundle), 2)
+            env = _environment(_bundle_loader(bundle, TEMPLATE_DIR))
+            self.assertEqual(env.get_template('dhcp-client/ipv4.j2').render(self.content),
+                             render_to_string('dhcp-client/ipv4.j2', self.content, location=TEMPLATE_DIR))
+            self.assertTrue(env.get_template('dhcp-client/ipv4.j2').filename.startswith(bundle))
+        finally:
+            shutil.rmtree(bundle)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import collections
+import os
+import shlex
+import sys
+import threading
+import time
+
+# histogram bucket bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# the running Tracers, util.command only pays for a truth test while empty
+tracers = []
+_tracers_lock = threading.Lock()
+
+
+def command_name(command) -> str:
+    """
+    Program and first non option argument, e.g. 'ip link' or 'systemctl
+    restart', used to aggregate commands.
+    """
+    if isinstance(command, str):
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            # unbalanced quotes, still worth a label
+            argv = command.split()
+    else:
+        argv = command
+    if not argv:
+        return ''
+    words = [os.path.basename(argv[0])]
+    for arg in argv[1:]:
+        if not arg.startswith('-'):
+            words.append(arg)
+            break
+    return ' '.join(words)
+
+
+def _caller():
+    """
+    The innermost ifmanage method running on behalf of an interface, as
+    ('Class.method', ifname), or (None, None).
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        obj = frame.f_locals.get('self')
+        if obj is not None and type(obj).__module__.startswith('ifmanage.') and hasattr(obj, 'ifname'):
+            return f'{type(obj).__name__}.{frame.f_code.co_name}', obj.ifname
+        frame = frame.f_back
+    return None, None
+
+
+def emit(command, started: float, code, stdout, stderr):
+    """
+    Report a finished command to every running Tracer. started is the
+    time.perf_counter() value from before the command was spawned, code
+    None means it was killed after a timeout.
+    """
+    wall = time.perf_counter() - started
+    caller, ifname = _caller()
+    record = Record(command, time.time() - wall, wall, code, len(stdout or b''), len(stderr or b''), caller, ifname)
+    for tracer in tuple(tracers):
+        tracer.add(record)
+
+
+def _label(value) -> str:
+    """
+    A label value escaped for the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Record(object):
+    """
+    One command run.
+    """
+    __slots__ = ('command', 'start', 'wall', 'code', 'stdout_bytes', 'stderr_bytes', 'caller', 'ifname')
+
+    def __init__(self, command, start, wall, code, stdout_bytes, stderr_bytes, caller=None, ifname=None):
+        self.command = command if isinstance(command, str) else shlex.join(command)
+        self.start = start
+        self.wall = wall
+        self.code = code
+        self.stdout_bytes = stdout_bytes
+        self.stderr_bytes = stderr_bytes
+        self.caller = caller
+        self.ifname = ifname
+
+    @property
+    def name(self) -> str:
+        return command_name(self.command)
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class Histogram(object):
+    """
+    Cumulative wall time histogram over BUCKETS, Prometheus style.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.failures = 0
+        self.output_bytes = 0
+
+    def observe(self, record: Record):
+        for i, bound in enumerate(self.buckets):
+            if record.wall <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += record.wall
+        self.count += 1
+        self.output_bytes += record.stdout_bytes + record.stderr_bytes
+        if record.code != 0:
+            self.failures += 1
+
+    def cumulative(self) -> list:
+        """
+        (upper bound, count) pairs, the last bound being '+Inf'.
+        """
+        total = 0
+        res = []
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            res.append((bound, total))
+        return res
+
+
+class Tracer(object):
+    """
+    Collect every command run through util.command while started: the raw
+    records (the newest max_records of them) and a Histogram per command
+    name and calling method.
+
+    usage:
+        with Tracer() as tracer:
+            interface.apply()
+        print(tracer.prometheus())
+    """
+
+    def __init__(self, max_records=10000, buckets=BUCKETS):
+        self.buckets = buckets
+        self.records = collections.deque(maxlen=max_records)
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        with _tracers_lock:
+            if self not in tracers:
+                tracers.append(self)
+
+    def stop(self):
+        with _tracers_lock:
+            if self in tracers:
+                tracers.remove(self)
+
+    def add(self, record: Record):
+        key = (record.name, record.caller or '')
+        with self._lock:
+            self.records.append(record)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(record)
+
+    def write_jsonl(self, f):
+        """
+        Write the records to a file object, one JSON object per line.
+        """
+        import json
+
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            f.write(json.dumps(record.to_dict()) + '\n')
+
+    def prometheus(self, prefix='ifmanage_command') -> str:
+        """
+        The histograms in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+
+        labels = {key: f'command="{_label(key[0])}",caller="{_label(key[1])}"' for key, _ in histograms}
+        lines = [f'# TYPE {prefix}_duration_seconds histogram']
+        for key, histogram in histograms:
+            for bound, count in histogram.cumulative():
+                lines.append(f'{prefix}_duration_seconds_bucket{{{labels[key]},le="{bound}"}} {count}')
+            lines.append(f'{prefix}_duration_seconds_sum{{{labels[key]}}} {histogram.sum:.6f}')
+            lines.append(f'{prefix}_duration_seconds_count{{{labels[key]}}} {histogram.count}')
+
+        lines.append(f'# TYPE {prefix}_failures_total counter')
+        for key, histogram in histograms:
+            lines.append(f'{prefix}_failures_total{{{labels[key]}}} {histogram.failures}')
+
+        lines.append(f'# TYPE {prefix}_output_bytes_total counter')
+        for key, histogram in histograms:
+            lines.append(f'{prefix}_output_bytes_total{{{labels[key]}}} {histogram.output_bytes}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,70 @@
+import io
+import json
+import unittest
+
+from .command import cmd, popen
+from .trace import Tracer, command_name, tracers
+
+
+class Probe(object):
+    """
+    Stands in for an ifmanage Interface.
+    """
+    __module__ = 'ifmanage.probe'
+
+    def __init__(self):
+        self.ifname = 'eth7'
+
+    def set_thing(self):
+        return cmd('echo hello')
+
+
+class TestTrace(unittest.TestCase):
+    def test_command_name(self):
+        self.assertEqual(command_name('ip -json link show'), 'ip link')
+        self.assertEqual(command_name(['/bin/systemctl', 'restart', 'x']), 'systemctl restart')
+        self.assertEqual(command_name(''), '')
+        self.assertEqual(command_name('sh -c "exit 3"'), 'sh exit 3')
+        # unbalanced quotes fall back to splitting on whitespace
+        self.assertEqual(command_name('echo "unbalanced'), 'echo "unbalanced')
+
+    def test_tracer(self):
+        with Tracer() as tracer:
+            Probe().set_thing()
+            popen('false')
+        self.assertEqual(tracers, [])
+        popen('true')
+
+        self.assertEqual(len(tracer.records), 2)
+        first = tracer.records[0]
+        self.assertEqual((first.command, first.code, first.stdout_bytes), ('echo hello', 0, 6))
+        self.assertEqual((first.caller, first.ifname), ('Probe.set_thing', 'eth7'))
+        self.assertIsNone(tracer.records[1].caller)
+
+        out = io.StringIO()
+        tracer.write_jsonl(out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line["code"] for line in lines], [0, 1])
+
+        text = tracer.prometheus()
+        self.assertIn('ifmanage_command_duration_seconds_count{command="echo hello",caller="Probe.set_thing"} 1',
+                      text)
+        self.assertIn('ifmanage_command_duration_seconds_bucket{command="false",caller="",le="+Inf"} 1', text)
+        self.assertIn('ifmanage_command_failures_total{command="false",caller=""} 1', text)
+
+    def test_prometheus_escaping(self):
+        with Tracer() as tracer:
+            popen('sh -c "exit 3"')
+            popen('printf \'"\\\\\'')
+        text = tracer.prometheus()
+        self.assertIn('ifmanage_command_failures_total{command="sh exit 3",caller=""} 1', text)
+        self.assertIn('ifmanage_command_failures_total{command="printf \\"\\\\\\\\",caller=""} 0', text)
+        # every sample line is name{labels} value, quotes balanced
+        for line in text.splitlines():
+            if not line.startswith('#'):
+                labels = line[line.index('{') + 1:line.rindex('}')]
+                self.assertEqual(labels.replace('\\\\', '').replace('\\"', '').count('"') % 2, 0, line)
+
+
+if __name__ == '__main__':
+    unittest.main()
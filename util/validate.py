@@ -1,63 +1,190 @@
-def is_interface_addr_assigned(ifname: str, address: str) -> bool:
-    import netifaces
-    from netifaces import AF_INET, AF_INET6
+import socket
+from socket import AF_INET, AF_INET6, inet_pton
 
-    netmask = None
-    if '/' in address:
-        address, netmask = address.split('/')
+from util import netlink as nl
 
-    try:
-        ifaces = netifaces.ifaddresses(ifname)
-    except ValueError:
-        return False
+# netlink socket shared by all AddressTable refreshes, opened on first use
+_netlink = None
+
+# optional in-memory provider of assigned addresses, see set_address_source()
+_address_source = None
 
-    addr_type = AF_INET if is_ipv4(address) else AF_INET6
 
-    for ip in ifaces.get(addr_type, []):
-        # ip can have the interface name in the 'addr' field, we need to remove it
-        # {'addr': 'fe80::f84f:28ff:fee7:4400%enp1s0', 'netmask': 'ffff:ffff:ffff:ffff::'}
-        ip_addr = ip['addr'].split('%')[0]
+def set_address_source(source):
+    """
+    Answer is_interface_addr_assigned() from source.is_assigned(ifname,
+    address) instead of querying the kernel. Pass None to go back.
+    """
+    global _address_source
+    _address_source = source
 
-        if not are_same_address(address, ip_addr):
-            continue
 
-        if not netmask:
-            return True
+def parse_address(address: str):
+    """
+    Parse an address with optional prefix length and IPv6 scope into
+    (packed, prefixlen). prefixlen is None if the address had none.
+    Raises ValueError on anything that is not an IP address.
+    """
+    prefixlen = None
+    if '/' in address:
+        address, netmask = address.split('/', 1)
+        prefixlen = int(netmask)
+    address = address.split('%', 1)[0]
 
-        if is_ipv4(ip_addr):
-            prefix = sum([bin(int(_)).count('1') for _ in ip['netmask'].split('.')])
+    try:
+        return inet_pton(AF_INET, address), prefixlen
+    except OSError:
+        pass
+    try:
+        return inet_pton(AF_INET6, address), prefixlen
+    except OSError:
+        raise ValueError(f'"{address}" is not a valid IP address')
+
+
+class AddressTable(object):
+    """
+    Addresses assigned to each interface, stored as sets of packed
+    (address, prefixlen) tuples so lookups need no parsing of kernel data.
+    Addresses with a lifetime (DHCP leases, SLAAC) are also kept apart in
+    dynamic(). refresh() reloads every interface from a single netlink
+    dump.
+    """
+
+    def __init__(self):
+        self._addrs = {}
+        self._dynamic = {}
+
+    def refresh(self, ifname=None):
+        """
+        Reload all interfaces, or only ifname, from one address dump.
+        """
+        if ifname is None:
+            names = dict(socket.if_nameindex())
+        else:
+            try:
+                names = {socket.if_nametoindex(ifname): ifname}
+            except OSError:
+                names = {}
+        global _netlink
+        if _netlink is None:
+            _netlink = nl.Netlink()
+
+        self._addrs = {}
+        self._dynamic = {}
+        for _, payload in _netlink.dump(nl.RTM_GETADDR, nl.IFADDRMSG.pack(0, 0, 0, 0, 0)):
+            ifindex, _, packed, prefixlen = nl.parse_addr_msg(payload)
+            if ifindex in names:
+                self.add(names[ifindex], packed, prefixlen, nl.parse_addr_flags(payload) & nl.IFA_F_PERMANENT)
+
+    def get(self, ifname: str) -> set:
+        return self._addrs.get(ifname, set())
+
+    def dynamic(self, ifname: str) -> set:
+        """
+        The addresses of ifname that are not permanent, as get().
+        """
+        return self._dynamic.get(ifname, set())
+
+    def add(self, ifname: str, packed: bytes, prefixlen: int, permanent=True):
+        self._addrs.setdefault(ifname, set()).add((packed, prefixlen))
+        if permanent:
+            self._dynamic.get(ifname, set()).discard((packed, prefixlen))
         else:
-            prefix = sum([bin(int(_, 16)).count('1') for _ in ip['netmask'].split('/')[0].split(':') if _])
+            self._dynamic.setdefault(ifname, set()).add((packed, prefixlen))
+
+    def discard(self, ifname: str, packed: bytes, prefixlen: int):
+        self._addrs.get(ifname, set()).discard((packed, prefixlen))
+        self._dynamic.get(ifname, set()).discard((packed, prefixlen))
+
+    def pop(self, ifname: str) -> set:
+        self._dynamic.pop(ifname, None)
+        return self._addrs.pop(ifname, set())
+
+    def rename(self, old: str, new: str):
+        if old in self._addrs:
+            self._addrs[new] = self._addrs.pop(old)
+        if old in self._dynamic:
+            self._dynamic[new] = self._dynamic.pop(old)
+
+    def is_assigned(self, ifname: str, address: str) -> bool:
+        return self.are_assigned(ifname, [address])[0]
+
+    def are_assigned(self, ifname: str, addresses) -> list:
+        """
+        Check many addresses against one interface, an address without a
+        prefix length matches the address with any prefix length.
+        """
+        assigned = self.get(ifname)
+        packed_only = {packed for packed, _ in assigned}
+
+        result = []
+        for address in addresses:
+            packed, prefixlen = parse_address(address)
+            if prefixlen is None:
+                result.append(packed in packed_only)
+            else:
+                result.append((packed, prefixlen) in assigned)
+        return result
+
+
+def _current_addresses(ifname: str) -> AddressTable:
+    if _address_source is not None:
+        return _address_source
+    table = AddressTable()
+    table.refresh(ifname)
+    return table
 
-        if prefix == int(netmask):
-            return True
 
-    return False
+def is_interface_addr_assigned(ifname: str, address: str) -> bool:
+    return _current_addresses(ifname).is_assigned(ifname, address)
 
 
-def is_ipv4(address: str) -> bool:
-    import IPy
+def are_addrs_assigned(ifname: str, addresses) -> list:
+    """
+    Vectorised is_interface_addr_assigned(), returns one bool per address
+    while reading the kernel state only once.
+    """
+    return _current_addresses(ifname).are_assigned(ifname, addresses)
 
-    netmask = None
-    if '/' in address:
-        address, netmask = address.split('/')
 
+def is_ipv4(address: str) -> bool:
     try:
-        ip = IPy.IP(address)
-
-        if netmask and int(netmask) > 24:
-            return False
-        return ip.version() == 4
+        return len(parse_address(address)[0]) == 4
     except ValueError:
         return False
 
 
 def are_same_address(addr1: str, addr2: str) -> bool:
-    from socket import AF_INET
-    from socket import AF_INET6
-    from socket import inet_pton
-
     # compare the binary representation of the IP
-    addr1_type = AF_INET if is_ipv4(addr1) else AF_INET6
-    addr2_type = AF_INET if is_ipv4(addr2) else AF_INET6
-    return inet_pton(addr1_type, addr1) == inet_pton(addr2_type, addr2)
+    return parse_address(addr1)[0] == parse_address(addr2)[0]
+
+
+def assert_mac(mac: str):
+    """
+    Raise ValueError if mac is not a valid unicast MAC address.
+    """
+    split = mac.split(':')
+    size = len(split)
+
+    # a mac address consits out of 6 octets
+    if size != 6:
+        raise ValueError(f'wrong number of MAC octets ({size}): {mac}')
+
+    octets = []
+    try:
+        for octet in split:
+            octets.append(int(octet, 16))
+    except ValueError:
+        raise ValueError(f'invalid hex number "{octet}" in : {mac}')
+
+    # validate against the first mac address byte if it's a multicast
+    # address
+    if octets[0] & 1:
+        raise ValueError(f'{mac} is a multicast MAC address')
+
+    # overall mac address is not allowed to be 00:00:00:00:00:00
+    if sum(octets) == 0:
+        raise ValueError('00:00:00:00:00:00 is not a valid MAC address')
+
+    if octets[:5] == [0, 0, 94, 0, 1]:
+        raise ValueError(f'{mac} is a VRRP MAC address')
@@ -1,6 +1,6 @@
 import unittest
 
-from .validate import is_ipv4, is_interface_addr_assigned
+from .validate import is_ipv4, is_interface_addr_assigned, are_addrs_assigned, parse_address, AddressTable
 
 
 class TestValidate(unittest.TestCase):
@@ -13,6 +13,27 @@ class TestValidate(unittest.TestCase):
         self.assertEqual(is_interface_addr_assigned("lo", "127.0.0.1"), True)
         self.assertEqual(is_interface_addr_assigned("enp1s0", "fe80::a00:27ff:fec5:f821"), True)
 
+    def test_are_addrs_assigned(self):
+        self.assertEqual(are_addrs_assigned("lo", ["127.0.0.1/8", "127.0.0.1", "127.0.0.1/24", "::1/128"]),
+                         [True, True, False, True])
+        self.assertEqual(are_addrs_assigned("esfd", ["127.0.0.1"]), [False])
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("10.0.0.1/24"), (b'\x0a\x00\x00\x01', 24))
+        self.assertEqual(parse_address("fe80::1%eth0"), (b'\xfe\x80' + b'\x00' * 13 + b'\x01', None))
+        with self.assertRaises(ValueError):
+            parse_address("192.168.0.999")
+
+    def test_address_table(self):
+        table = AddressTable()
+        table.add("eth0", b'\x0a\x00\x00\x01', 24)
+        self.assertTrue(table.is_assigned("eth0", "10.0.0.1"))
+        self.assertTrue(table.is_assigned("eth0", "10.0.0.1/24"))
+        self.assertFalse(table.is_assigned("eth0", "10.0.0.1/32"))
+        table.rename("eth0", "lan0")
+        self.assertTrue(table.is_assigned("lan0", "10.0.0.1"))
+        self.assertFalse(table.is_assigned("eth0", "10.0.0.1"))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,229 @@
+import atexit
+import itertools
+import os
+import socket
+import stat
+import threading
+import time
+
+# initial size of the receive buffer, it grows to fit the largest reply seen
+BUFF_SIZE = 4096
+
+# seconds to wait for a reply
+REQUEST_TIMEOUT = 10.0
+# seconds to wait for the PONG when (re)connecting or checking an idle connection
+PING_TIMEOUT = 1.0
+# connection attempts before giving up, wpa_supplicant may be restarting
+PING_RETRIES = 3
+RETRY_DELAY = 0.1
+# requests in flight when pipelining, wpa_supplicant drops replies that do
+# not fit the receive queue (net.unix.max_dgram_qlen, 10 by default)
+PIPELINE_DEPTH = 8
+# connections idle for longer are PINGed before being handed out again
+IDLE_CHECK = 5.0
+
+_client_ids = itertools.count()
+
+
+def remove_socket(path: str):
+    """
+    Remove a stale unix socket file, anything else is left alone.
+    """
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.remove(path)
+
+
+def client_path(ifname: str, tmp_dir='/tmp') -> str:
+    """
+    Reply socket path unique to this process and connection, so clients of
+    the same interface never clobber each other.
+    """
+    return f'{tmp_dir}/ifmanage_{ifname}_{os.getpid()}_{next(_client_ids)}'
+
+
+class WpaCtrl(object):
+    """
+    Datagram connection to a wpa_supplicant control interface.
+
+    Replies are received into a reusable buffer which is grown whenever a
+    datagram does not fit, so large SCAN_RESULTS or BSS replies are never
+    truncated. Requests from several threads are serialized.
+    """
+
+    def __init__(self, local_path: str, control_path: str, timeout=None):
+        self.local_path = local_path
+        self.control_path = control_path
+        self.timeout = timeout
+        # set once a request failed, its reply might still show up as the
+        # answer to the next one
+        self.broken = False
+        self.last_used = 0.0
+        self._buff = bytearray(BUFF_SIZE)
+        self._lock = threading.Lock()
+        remove_socket(local_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            self.sock.bind(local_path)
+            self.sock.connect(control_path)
+            self.sock.settimeout(timeout)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        self.broken = True
+        self.sock.close()
+        remove_socket(self.local_path)
+
+    def send(self, cmd: str):
+        self.sock.send(cmd.encode('utf-8'))
+
+    def recv(self) -> bytes:
+        """
+        Receive one complete datagram.
+        """
+        # peek with MSG_TRUNC reports the real datagram size without consuming it
+        size = self.sock.recv_into(self._buff, 0, socket.MSG_PEEK | socket.MSG_TRUNC)
+        if size > len(self._buff):
+            self._buff = bytearray(1 << (size - 1).bit_length())
+        size = self.sock.recv_into(self._buff)
+        return bytes(memoryview(self._buff)[:size])
+
+    def request(self, cmd: str, timeout=None) -> bytes:
+        with self._lock:
+            if timeout is not None:
+                self.sock.settimeout(timeout)
+            try:
+                self.send(cmd)
+                reply = self.recv()
+            except OSError:
+                self.broken = True
+                raise
+            finally:
+                if timeout is not None and not self.broken:
+                    self.sock.settimeout(self.timeout)
+            self.last_used = time.monotonic()
+            return reply
+
+    def pipeline(self, cmds, depth=PIPELINE_DEPTH) -> list[bytes]:
+        """
+        Send several commands without waiting for each reply and return the
+        replies in order. wpa_supplicant handles commands one after the
+        other, so replies arrive in the order the commands were sent.
+        """
+        replies = []
+        with self._lock:
+            try:
+                sent = 0
+                for cmd in cmds:
+                    if sent - len(replies) >= depth:
+                        replies.append(self.recv())
+                    self.send(cmd)
+                    sent += 1
+                while len(replies) < sent:
+                    replies.append(self.recv())
+            except OSError:
+                self.broken = True
+                raise
+            self.last_used = time.monotonic()
+        return replies
+
+    def ping(self, timeout=PING_TIMEOUT) -> bool:
+        try:
+            return self.request('PING', timeout).startswith(b'PONG')
+        except OSError:
+            return False
+
+
+class WpaCtrlPool(object):
+    """
+    Control connections shared per interface. A connection used within the
+    last idle_check seconds is handed out as is, an idle one is PINGed
+    first and replaced if it does not answer.
+    """
+
+    def __init__(self, timeout=REQUEST_TIMEOUT, ping_timeout=PING_TIMEOUT, retries=PING_RETRIES,
+                 idle_check=IDLE_CHECK):
+        self.timeout = timeout
+        self.ping_timeout = ping_timeout
+        self.retries = retries
+        self.idle_check = idle_check
+        self._conns = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def __len__(self):
+        return len(self._conns)
+
+    def get(self, ifname: str, ctrl_dir: str) -> WpaCtrl:
+        key = (ctrl_dir, ifname)
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked: the sockets and reply paths belong to the parent
+                self._conns = {}
+                self._pid = os.getpid()
+            ctrl = self._conns.get(key)
+
+        if ctrl is not None and self._healthy(ctrl):
+            return ctrl
+
+        new = self._connect(ifname, ctrl_dir)
+        with self._lock:
+            current = self._conns.get(key)
+            if current is not None and current is not ctrl and not current.broken:
+                # another thread reconnected meanwhile
+                new.close()
+                return current
+            self._conns[key] = new
+        if ctrl is not None:
+            ctrl.close()
+        return new
+
+    def _healthy(self, ctrl: WpaCtrl) -> bool:
+        if ctrl.broken:
+            return False
+        if time.monotonic() - ctrl.last_used < self.idle_check:
+            return True
+        return ctrl.ping(self.ping_timeout)
+
+    def _connect(self, ifname: str, ctrl_dir: str) -> WpaCtrl:
+        control_path = f'{ctrl_dir}/{ifname}'
+        for attempt in range(self.retries):
+            if attempt:
+                time.sleep(RETRY_DELAY * attempt)
+            try:
+                ctrl = WpaCtrl(client_path(ifname), control_path, self.timeout)
+            except OSError:
+                continue
+            # a fresh socket per attempt, a late PONG can not be mistaken
+            # for the reply to a later request
+            if ctrl.ping(self.ping_timeout):
+                return ctrl
+            ctrl.close()
+        raise ConnectionError(f"Connection to '{control_path}' is broken!")
+
+    def close(self, ifname: str, ctrl_dir: str):
+        with self._lock:
+            ctrl = self._conns.pop((ctrl_dir, ifname), None)
+        if ctrl is not None:
+            ctrl.close()
+
+    def close_all(self):
+        with self._lock:
+            conns, self._conns = self._conns, {}
+        if self._pid == os.getpid():
+            for ctrl in conns.values():
+                ctrl.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WpaCtrlPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WpaCtrlPool()
+            atexit.register(_pool.close_all)
+        return _pool